@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Fall alert delivery off the frame loop.
+
+The detectors hand their "fall_start"/"fall_end" events (and "track_lost"
+for a fallen person the tracker gave up on) to an AlertDispatcher and
+return immediately; it delivers them to the configured sinks (ALERT_SINKS,
+comma separated):
+
+    sound    play assets/Efek suara jatuh.mp3 in a loop while someone is down (pygame)
+    webhook  POST the alert as JSON to ALERT_WEBHOOK (nurse call, pager gateway, chat bot)
+    log      append the alert as a JSON line to ALERT_LOG
+
+Every sink has its own bounded queue and worker thread, so a webhook that
+hangs or retries never delays the sound. A failed delivery is retried
+ALERT_RETRIES times with exponential backoff (ALERT_BACKOFF, doubling up to
+ALERT_BACKOFF_MAX seconds); alerts of one sink stay in order, so a recovery
+never overtakes its fall. If a queue is full, new alerts for that sink are
+dropped and counted rather than blocking detection.
+
+Alerts are grouped into incidents per camera. A fall_start while the
+camera already has an open incident younger than ALERT_DEDUPE seconds (the
+tracker lost and re-found the person, or the alert flickered) is not sent
+again; a later fall_start opens a new incident that takes over everyone
+still down in the old one. fall_end is sent once everyone in the incident
+is back up. A fallen person the tracker drops without seeing them get up
+(track_lost) is not a recovery: track_lost is sent, but the incident and
+the sound stay open until someone acknowledges it (acknowledge(), POST
+/alerts/acknowledge/<camera>), which sends "acknowledged" and closes it.
+Delivery latency (detection to delivered) is reported per sink in stats()
+and /metrics.
+
+Try it against a local stand-in webhook that fails the first requests:
+
+    python alerts.py --demo
+"""
+
+import argparse
+import collections
+import json
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+import metrics
+
+ALERT_SINKS = os.environ.get("ALERT_SINKS", "log,webhook")  # webhook only if ALERT_WEBHOOK is set
+ALERT_WEBHOOK = os.environ.get("ALERT_WEBHOOK", "")
+ALERT_LOG = os.environ.get("ALERT_LOG", "alerts.log")
+ALERT_SOUND = os.path.join("assets", "Efek suara jatuh.mp3")
+ALERT_QUEUE = 1000  # alerts waiting per sink before new ones are dropped
+ALERT_RETRIES = 5  # retries after the first failed attempt
+ALERT_BACKOFF = 0.5  # seconds before the first retry, doubled every retry
+ALERT_BACKOFF_MAX = 30.0
+ALERT_TIMEOUT = 5.0  # seconds per webhook request
+ALERT_DEDUPE = 120.0  # seconds a camera's open incident swallows new fall_start events
+ALERT_EVENTS = ("fall_start", "fall_end", "track_lost")
+CLOSING_EVENTS = ("fall_end", "acknowledged")  # alerts that close a camera's incident
+LATENCY_SAMPLES = 1000  # delivery latencies kept per sink for stats()
+
+
+class PermanentError(Exception):
+    """Delivery failed in a way retrying cannot fix (e.g. HTTP 400)."""
+
+
+class LogSink:
+    """Appends every alert as one JSON line."""
+
+    name = 'log'
+
+    def __init__(self, path=ALERT_LOG):
+        self.path = path
+
+    def deliver(self, alert):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(alert) + "\n")
+
+
+class WebhookSink:
+    """POSTs every alert as JSON; 5xx, 408, 429 and network errors are retried."""
+
+    name = 'webhook'
+
+    def __init__(self, url=ALERT_WEBHOOK, timeout=ALERT_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, alert):
+        request = urllib.request.Request(self.url, data=json.dumps(alert).encode(), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            if e.code < 500 and e.code not in (408, 429):
+                raise PermanentError(f"HTTP {e.code}") from e
+            raise
+
+
+class SoundSink:
+    """Loops the alert sound while any camera has an open incident (pygame mixer).
+
+    track_lost keeps it playing: only fall_end or an acknowledgement closes
+    an incident.
+    """
+
+    name = 'sound'
+
+    def __init__(self, path=ALERT_SOUND, music=None):
+        if music is None:
+            import pygame
+
+            if not os.path.exists(path):
+                raise RuntimeError(f"File audio tidak ditemukan: {path}")
+            pygame.mixer.init()
+            pygame.mixer.music.load(path)
+            music = pygame.mixer.music
+        self._music = music
+        self._open = set()
+
+    @property
+    def playing(self):
+        return bool(self._open)
+
+    def deliver(self, alert):
+        if alert['event'] == "fall_start":
+            if not self._open:
+                self._music.play(loops=-1)
+            self._open.add(alert['camera'])
+        elif alert['event'] in CLOSING_EVENTS and alert['camera'] in self._open:
+            self._open.discard(alert['camera'])
+            if not self._open:
+                self._music.stop()
+
+
+SINKS = {'log': LogSink, 'webhook': WebhookSink, 'sound': SoundSink}
+
+
+def create_dispatcher(names=ALERT_SINKS, webhook=ALERT_WEBHOOK):
+    """AlertDispatcher with the sinks named in names that can be set up, or None if there are none."""
+    sinks = []
+    for name in filter(None, (n.strip() for n in names.split(','))):
+        if name not in SINKS:
+            print(f"[!] Sink alert tidak dikenal: {name} (pilih {', '.join(SINKS)})")
+        elif name == 'webhook' and not webhook:
+            continue
+        else:
+            try:
+                sinks.append(WebhookSink(webhook) if name == 'webhook' else SINKS[name]())
+            except Exception as e:
+                print(f"[!] Sink alert {name} tidak aktif: {e}")
+    return AlertDispatcher(sinks) if sinks else None
+
+
+class AlertDispatcher:
+    """Non-blocking fan-out of fall alerts to sinks, with retries and deduplication."""
+
+    def __init__(self, sinks, max_queue=ALERT_QUEUE, retries=ALERT_RETRIES, backoff=ALERT_BACKOFF,
+                 dedupe=ALERT_DEDUPE):
+        self.sinks = list(sinks)
+        self.retries = retries
+        self.backoff = backoff
+        self.dedupe = dedupe
+        self.sent = 0
+        self.deduplicated = 0
+        self._incidents = {}  # camera: {'id', 'ts', 'tracks', 'lost'}; lost tracks stay until acknowledged
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._stats = {}
+        self._queues = {}
+        self._threads = []
+        for sink in self.sinks:
+            self._queues[sink.name] = queue.Queue(maxsize=max_queue)
+            self._stats[sink.name] = {'delivered': 0, 'failed': 0, 'dropped': 0, 'retries': 0,
+                                      'latency': collections.deque(maxlen=LATENCY_SAMPLES)}
+            metrics.ALERTS_DROPPED.labels(sink.name).set_function(
+                lambda stats=self._stats[sink.name]: stats['dropped'])
+            thread = threading.Thread(target=self._deliver_loop, args=(sink,), name=f"alert-{sink.name}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        metrics.ALERTS_DEDUPLICATED.labels().set_function(lambda: self.deduplicated)
+
+    def send(self, camera, event, ts=None, track=None, **data):
+        """Queue a detector event for delivery; never blocks. Returns True if it was queued.
+
+        Events other than fall_start/fall_end/track_lost are ignored;
+        duplicates of an open incident are counted and dropped. fall_end
+        takes track out of the camera's incident and is only sent once
+        nobody in it is down any more. track_lost is always sent for a track
+        of the incident, but keeps the incident open until acknowledge().
+        """
+        if event not in ALERT_EVENTS:
+            return False
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            incident = self._incidents.get(camera)
+            if event == "fall_start":
+                if incident is not None and ts - incident['ts'] < self.dedupe:
+                    incident['tracks'].add(track)
+                    self.deduplicated += 1
+                    return False
+                # after the dedupe window a fall is alerted again, as a new incident that takes
+                # over everyone still down (tracks the tracker dropped have sent track_lost)
+                tracks, lost = {track}, set()
+                if incident is not None:
+                    data['replaces'] = incident['id']  # the receiver can close the old incident
+                    tracks |= incident['tracks']
+                    lost = incident['lost']
+                incident = self._incidents[camera] = {'id': f"{camera}-{int(ts * 1000)}", 'ts': ts,
+                                                      'tracks': tracks, 'lost': lost}
+            else:
+                if incident is None or track not in incident['tracks']:
+                    if event == "fall_end":
+                        self.deduplicated += 1
+                    return False
+                if event == "track_lost":
+                    if track in incident['lost']:
+                        return False
+                    # not a recovery: nobody saw them get up, so the incident stays open
+                    incident['lost'].add(track)
+                else:
+                    incident['tracks'].discard(track)
+                    if incident['tracks']:
+                        return False  # someone else in this incident is still down (or lost from view)
+                    del self._incidents[camera]
+            self.sent += 1
+
+        self._queue(dict(data, incident=incident['id'], event=event, camera=camera, track=track, ts=ts))
+        return True
+
+    def _queue(self, alert):
+        for sink in self.sinks:
+            try:
+                self._queues[sink.name].put_nowait(alert)
+            except queue.Full:
+                self._stats[sink.name]['dropped'] += 1
+
+    def acknowledge(self, camera, ts=None, **data):
+        """Close camera's open incident by hand (a nurse checked the room); returns False if none is open.
+
+        The only way to close an incident whose fallen person was lost from
+        view (track_lost); the sinks get an "acknowledged" alert.
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            incident = self._incidents.pop(camera, None)
+            if incident is None:
+                return False
+            self.sent += 1
+        self._queue(dict(data, incident=incident['id'], event="acknowledged", camera=camera, track=None, ts=ts))
+        return True
+
+    def open_incidents(self):
+        """{camera: incident id, open tracks and tracks lost from view} of every open incident."""
+        with self._lock:
+            return {camera: {'incident': incident['id'], 'tracks': sorted(incident['tracks'] - incident['lost']),
+                             'lost': sorted(incident['lost'])}
+                    for camera, incident in self._incidents.items()}
+
+    def stats(self):
+        sinks = {}
+        for name, stats in self._stats.items():
+            latency = np.asarray(stats['latency'])
+            sinks[name] = {key: value for key, value in stats.items() if key != 'latency'}
+            sinks[name]['queued'] = self._queues[name].qsize()
+            if len(latency):
+                sinks[name]['latency_p50_ms'] = round(float(np.percentile(latency, 50)) * 1000, 1)
+                sinks[name]['latency_p95_ms'] = round(float(np.percentile(latency, 95)) * 1000, 1)
+        return {'alerts_sent': self.sent, 'alerts_deduplicated': self.deduplicated, 'sinks': sinks}
+
+    def close(self, timeout=5.0):
+        """Deliver what is queued and stop the workers; after timeout, remaining alerts get no more retries."""
+        deadline = time.monotonic() + timeout
+        for q in self._queues.values():
+            try:
+                q.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self._closing.set()
+        for thread in self._threads:
+            thread.join(1.0)
+
+    def _deliver_loop(self, sink):
+        q = self._queues[sink.name]
+        stats = self._stats[sink.name]
+        delivered = metrics.ALERTS_DELIVERED.labels(sink.name)
+        failed = metrics.ALERTS_FAILED.labels(sink.name)
+        latency = metrics.ALERT_DELIVERY_SECONDS.labels(sink.name)
+        while True:
+            alert = q.get()
+            if alert is None:
+                return
+            delay = self.backoff
+            attempt = 0
+            while True:
+                try:
+                    sink.deliver(alert)
+                except Exception as e:
+                    retry = not isinstance(e, PermanentError) and attempt < self.retries
+                    # while closing, wait for nothing: give up instead of backing off
+                    if retry and not self._closing.wait(delay):
+                        attempt += 1
+                        stats['retries'] += 1
+                        delay = min(delay * 2, ALERT_BACKOFF_MAX)
+                        continue
+                    stats['failed'] += 1
+                    failed.inc()
+                    print(f"[!] Alert {alert['event']} {alert['camera']} gagal dikirim ke {sink.name}: {e}")
+                else:
+                    seconds = time.time() - alert['ts']
+                    stats['delivered'] += 1
+                    stats['latency'].append(seconds)
+                    delivered.inc()
+                    latency.observe(seconds)
+                break
+
+
+def stand_in_webhook(fail_first=0):
+    """Local webhook (http.server) answering 503 to its first fail_first requests.
+
+    Returns (server, url, received): received lists every alert POSTed, the
+    failed ones included. Stop it with server.shutdown().
+    """
+    import http.server
+
+    received = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            alert = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            received.append(alert)
+            if len(received) <= fail_first:
+                self.send_response(503)
+                self.end_headers()
+                print("  webhook: 503 (gagal disengaja)")
+                return
+            self.send_response(200)
+            self.end_headers()
+            print(f"  webhook: terima {alert['event']} {alert['camera']} incident {alert['incident']}")
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/alert", received
+
+
+def run_demo(fail_first=2):
+    """Send a fall, a duplicate, a recovery and a lost fallen track to a local webhook that fails its first requests."""
+    server, url, _ = stand_in_webhook(fail_first)
+    log_path = os.path.join(os.environ.get("TMPDIR", "/tmp"), "alerts_demo.log")
+    print(f"Webhook lokal: {url}, log: {log_path}")
+
+    dispatcher = AlertDispatcher([WebhookSink(url), LogSink(log_path)], backoff=0.1)
+    steps = [("fall_start", 1, "Jatuh"),
+             ("fall_start", 2, "Jatuh"),  # same person re-found as track 2: deduplicated
+             ("posture_change", 2, "Jatuh"),  # not an alert
+             ("fall_end", 1, "Berdiri"),  # track 2 still down: incident stays open
+             ("fall_end", 2, "Berdiri"),  # everyone up: recovery is sent
+             ("fall_start", 3, "Jatuh"),
+             ("track_lost", 3, "Jatuh")]  # tracker dropped the fallen track 3: still open
+    for event, track, posture in steps:
+        queued = dispatcher.send("kamar1", event, track=track, posture=posture)
+        print(f"{event} track {track}: {'dikirim' if queued else 'tidak dikirim'}")
+        time.sleep(0.3)
+    closed = dispatcher.acknowledge("kamar1")  # a nurse checked the room
+    print(f"acknowledged: {'dikirim' if closed else 'tidak dikirim'}")
+    dispatcher.close()
+    server.shutdown()
+    print(json.dumps(dispatcher.stats(), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pengiriman alert jatuh ke sound/webhook/log.")
+    parser.add_argument("--demo", action="store_true", help="demo dengan webhook lokal (http.server)")
+    parser.add_argument("--fail-first", type=int, default=2, help="request webhook pertama yang dijawab 503")
+    args = parser.parse_args()
+    if args.demo:
+        run_demo(args.fail_first)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,253 +1,258 @@
-from flask import Flask, render_template, Response, jsonify
-from ultralytics import YOLO
-import cv2
 import time
+
+startup_began = time.perf_counter()  # before the heavy imports, so the startup time includes them
+
+from flask import Flask, render_template, Response, jsonify, abort, request
+import filecmp
 import os
-import warnings
 import shutil
-import numpy as np
+import threading
+import warnings
 
-warnings.filterwarnings('ignore')
+import metrics
+from alerts import create_dispatcher
+from event_store import EVENT_DB, EventStore, parse_time
+from models import POSE_MODEL_PATHS, SEG_MODEL_PATH, ModelLoad, load_model, warm_up
+from pipeline import Ward, parse_sources
+from stream import DEFAULT_PROFILE, QUALITY_PROFILES
+from workers import INFERENCE_WORKERS, PoseWorkerPool, workers_supported
 
-app = Flask(__name__)
+warnings.filterwarnings('ignore')
 
-# Load Pose Detection Model
-try:
-    if os.path.exists("models/yolov8n-pose.pt"):
-        pose_model = YOLO("models/yolov8n-pose.pt")
-    elif os.path.exists("yolov8n-pose.pt"):
-        pose_model = YOLO("yolov8n-pose.pt")
-    else:
-        pose_model = YOLO("yolov8n-pose")
-    print(" Pose Detection Model loaded")
-except Exception as e:
-    print(f" Error loading pose model: {e}")
-    import traceback
-    traceback.print_exc()
-    exit(1)
-
-# Load Segmentation Model for detecting bed, chair, etc
-try:
-    seg_model_path = os.path.join("datasets", "coco8seg_test", "weights", "best.pt")
-    if os.path.exists(seg_model_path):
-        seg_model = YOLO(seg_model_path)
-        print(" Segmentation Model (bed/chair detection) loaded")
+# INFERENCE_WORKERS=N runs the pose model in N worker processes (see workers.py).
+# The pool forks here, before any model is loaded in this process.
+pose_pool = None
+if INFERENCE_WORKERS > 0:
+    if workers_supported():
+        pose_pool = PoseWorkerPool(INFERENCE_WORKERS)
     else:
-        seg_model = None
-        print(" Segmentation model not found, will use pose detection only")
-except Exception as e:
-    print(f" Error loading segmentation model: {e}")
-    seg_model = None
+        print(" Inference worker tidak didukung di sistem ini, pakai inferensi di proses utama")
+
+app = Flask(__name__)
 
 # Setup audio file
 alert_sound_source = os.path.join("assets", "Efek suara jatuh.mp3")
 alert_sound_dest = os.path.join("static", "alert.mp3")
 audio_active = False
 
-# Copy audio file to static folder if it exists
+# Copy audio file to static folder if it exists and changed
 if os.path.exists(alert_sound_source):
-    os.makedirs("static", exist_ok=True)
-    shutil.copy(alert_sound_source, alert_sound_dest)
+    if not (os.path.exists(alert_sound_dest) and filecmp.cmp(alert_sound_source, alert_sound_dest)):
+        os.makedirs("static", exist_ok=True)
+        shutil.copy2(alert_sound_source, alert_sound_dest)
+        print(" Audio file setup berhasil")
     audio_active = True
-    print(" Audio file setup berhasil")
 else:
     print(" File audio tidak ditemukan di assets")
 
-alert_playing = False
-last_pose = None
-pose_start_time = time.time()
-fall_start_time = None
-recover_start_time = None
-FALL_CONFIRM = 0.5
-RECOVER_CONFIRM = 0.5
-fall_detected = False
-sleep_detected = False
-current_posture = "Berdiri"  # Track current posture: Berdiri, Duduk, Jatuh
-current_furniture = ""  # Track furniture name if duduk/tidur
-activity_duration = 0  # Track duration of current activity
-warning_triggered = False  # Track if warning already triggered for long activity
-last_frame = None  # store latest encoded JPEG frame for snapshot endpoint
-
-def gen_frames():
-    global alert_playing, last_pose, pose_start_time, fall_start_time, recover_start_time, fall_detected, sleep_detected, current_posture, current_furniture, activity_duration, warning_triggered, last_frame
-    cap = cv2.VideoCapture(0)
-    
-    BED_LIKE_CLASSES = {
-        56: 'chair',
-        57: 'couch',
-        59: 'bed',
-        60: 'dining_table'
+# One shared pipeline per camera, all cameras batched through the same models.
+# CAMERA_SOURCES example: "0" or "kamar1=0,kamar2=rtsp://10.0.0.12/stream"
+camera_sources = parse_sources(os.environ.get("CAMERA_SOURCES", "0"))
+event_store = EventStore(EVENT_DB)
+# fall alerts to ALERT_SINKS (log, webhook with ALERT_WEBHOOK=..., sound), off the frame loop
+alerts = create_dispatcher()
+ward = Ward(sources=camera_sources, event_store=event_store, alerts=alerts)
+
+
+def load_pose_model():
+    """Pose model with MODEL_BACKEND=torch|onnx|openvino (see models.py), in the worker pool if there is one."""
+    pose_path = next((p for p in POSE_MODEL_PATHS if os.path.exists(p)), "yolov8n-pose")
+    if pose_pool is not None:
+        return pose_pool.load(pose_path)
+    return load_model(pose_path, task="pose")
+
+
+# Both models load and warm up in the background, in parallel, and are handed
+# to the ward when ready; the web server answers meanwhile and /readyz tells
+# when detection runs. The segmentation model (bed/chair detection) is optional.
+model_loads = {
+    'pose': ModelLoad('pose', load_pose_model, warm=lambda model: warm_up(model, batch=len(camera_sources)),
+                      on_ready=ward.set_pose_model),
+    'segmentation': ModelLoad('segmentation', lambda: load_model(SEG_MODEL_PATH, task="segment"),
+                              on_ready=ward.set_seg_model, required=False, enabled=os.path.exists(SEG_MODEL_PATH))
+}
+if model_loads['segmentation'].state == 'disabled':
+    print(" Segmentation model not found, will use pose detection only")
+for name, load in model_loads.items():
+    load.start()
+    metrics.MODEL_READY.labels(name).set_function(lambda load=load: int(load.state == 'ready'))
+startup_seconds = None  # process start until every model is ready
+metrics.STARTUP_SECONDS.labels().set_function(lambda: startup_seconds or 0)
+
+
+def report_startup():
+    global startup_seconds
+    for load in model_loads.values():
+        load.wait()
+    if all(load.usable for load in model_loads.values()):
+        startup_seconds = time.perf_counter() - startup_began
+        print(f" Deteksi siap {startup_seconds:.1f} s setelah start")
+
+
+threading.Thread(target=report_startup, name="startup-report", daemon=True).start()
+
+
+def health():
+    """(payload, healthy, ready) for /healthz and /readyz.
+
+    Unhealthy means a required model failed to load or the inference loop
+    died, so a restart is needed; not ready just means still starting.
+    """
+    failed = any(load.required and load.state == 'failed' for load in model_loads.values())
+    healthy = not failed and not ward.crashed
+    ready = healthy and ward.running and all(load.usable for load in model_loads.values())
+    payload = {
+        'status': 'ready' if ready else 'starting' if healthy else 'failed',
+        'models': {name: load.as_dict() for name, load in model_loads.items()},
+        'inference_running': ward.running,
+        'frame_errors': {name: dict(cam.errors) for name, cam in ward.cameras.items()},
+        'uptime_seconds': round(time.perf_counter() - startup_began, 1),
+        'startup_seconds': None if startup_seconds is None else round(startup_seconds, 2),
+        'alerts': None if alerts is None else alerts.stats()
     }
+    return payload, healthy, ready
 
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-        else:
-            pose_results = pose_model(frame, verbose=False)
-            annotated_frame = pose_results[0].plot()
-
-            if len(pose_results[0].keypoints) > 0:
-                person = pose_results[0].keypoints.xy[0].cpu().numpy()
-                y_points = person[:, 1]
-
-                head_y = y_points[0]
-                foot_y = y_points[-1]
-                frame_height = frame.shape[0]
-                ratio = (foot_y - head_y) / frame_height
-
-                if ratio > 0.45:
-                    body_position = "Berdiri"
-                elif 0.25 <= ratio <= 0.45:
-                    body_position = "Duduk"
-                else:
-                    body_position = "Jatuh"
-
-                on_furniture = False
-                furniture_name = None
-                person_center_x = np.mean(person[:, 0])
-                person_center_y = np.mean(person[:, 1])
-
-                if seg_model is not None:
-                    try:
-                        seg_results = seg_model(frame, conf=0.3, verbose=False)
-                        
-                        if len(seg_results[0].boxes) > 0:
-                            for idx, box in enumerate(seg_results[0].boxes):
-                                class_id = int(box.cls[0])
-                                conf = float(box.conf[0])
-                                
-                                if class_id in BED_LIKE_CLASSES:
-                                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                    
-                                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                    cv2.putText(annotated_frame, f"{BED_LIKE_CLASSES[class_id]} ({conf:.2f})", 
-                                              (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                                    
-                                    if x1 <= person_center_x <= x2 and y1 <= person_center_y <= y2:
-                                        on_furniture = True
-                                        furniture_name = BED_LIKE_CLASSES[class_id]
-                                        break
-                    except Exception as e:
-                        pass
-
-                if body_position == "Jatuh" and on_furniture:
-                    current_pose = f"Tidur di {furniture_name}"
-                    current_posture = "Tidur"
-                    current_furniture = furniture_name
-                    sleep_detected = True
-                elif body_position == "Jatuh" and not on_furniture:
-                    current_pose = "Jatuh"
-                    current_posture = "Jatuh"
-                    current_furniture = ""
-                    sleep_detected = False
-                elif body_position == "Duduk" and on_furniture:
-                    current_pose = f"Duduk di {furniture_name}"
-                    current_posture = "Duduk"
-                    current_furniture = furniture_name
-                    sleep_detected = False
-                else:
-                    current_pose = body_position
-                    current_posture = body_position
-                    current_furniture = ""
-                    sleep_detected = False
-
-                if current_pose == "Jatuh":
-                    cv2.putText(annotated_frame, "JATUH!", (50, 100),
-                              cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 5)
-
-                    if last_pose != "Jatuh":
-                        fall_start_time = time.time()
-                        recover_start_time = None
-
-                    if fall_start_time and (time.time() - fall_start_time) >= FALL_CONFIRM:
-                        if not alert_playing:
-                            alert_playing = True
-                            fall_detected = True
-
-                elif "Tidur" in current_pose:
-                    cv2.putText(annotated_frame, "TIDUR", (50, 100),
-                              cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 255), 5)
-                    
-                    if alert_playing:
-                        alert_playing = False
-                        fall_detected = False
-                    
-                    sleep_detected = True
-                    
-                else:
-                    if current_pose == last_pose:
-                        duration = time.time() - pose_start_time
-                        activity_duration = int(duration)
-                        
-                        if duration >= 10:
-                            if "Duduk" in current_pose:
-                                cv2.putText(annotated_frame, f"Sudah {int(duration)} detik duduk", (50, 150), 
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 165, 255), 3)
-                            elif current_pose == "Berdiri":
-                                cv2.putText(annotated_frame, f"Sudah {int(duration)} detik berdiri", (50, 150),
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 165, 255), 3)
-                    else:
-                        pose_start_time = time.time()
-                        activity_duration = 0
-                        warning_triggered = False
-
-                    if last_pose == "Jatuh" and current_pose != "Jatuh":
-                        recover_start_time = time.time()
-
-                    if recover_start_time and (time.time() - recover_start_time) >= RECOVER_CONFIRM:
-                        if alert_playing:
-                            alert_playing = False
-                            fall_detected = False
-
-                    cv2.putText(annotated_frame, f"{current_pose}", (50, 100),
-                              cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 5)
-
-                last_pose = current_pose
-
-            ret, buffer = cv2.imencode('.jpg', annotated_frame)
-            frame = buffer.tobytes()
-            # update last_frame for snapshot endpoint (thread-safe enough for this simple app)
-            try:
-                last_frame = frame
-            except Exception:
-                pass
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-
-    cap.release()
+
+print(f" Server siap {time.perf_counter() - startup_began:.1f} s setelah start, model dimuat di background")
 
 @app.route('/')
 def index():
     return render_template('index.html', audio_active=audio_active)
 
+def get_camera(cam):
+    ward.start()
+    if cam is None:
+        return ward.default
+    camera = ward.get(cam)
+    if camera is None:
+        abort(404, description=f"Kamera tidak dikenal: {cam}")
+    return camera
+
+def get_profile():
+    """Quality profile from ?quality= (full, half, thumb)."""
+    profile = request.args.get('quality', DEFAULT_PROFILE)
+    if profile not in QUALITY_PROFILES:
+        abort(400, description=f"Kualitas tidak dikenal: {profile} (pilih {', '.join(QUALITY_PROFILES)})")
+    return profile
+
 @app.route('/video_feed')
-def video_feed():
-    return Response(gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/video_feed/<cam>')
+def video_feed(cam=None):
+    """MJPEG stream; ?quality=half or ?quality=thumb for tablets on Wi-Fi."""
+    camera = get_camera(cam)
+    return Response(camera.frames(get_profile()), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/fall_status')
-def fall_status():
+@app.route('/fall_status/<cam>')
+def fall_status(cam=None):
+    return jsonify(get_camera(cam).status())
+
+
+@app.route('/status_stream')
+@app.route('/status_stream/<cam>')
+def status_stream(cam=None):
+    """Server-Sent Events stream of status changes (replaces /fall_status polling)."""
+    camera = get_camera(cam)
+    return Response(camera.status_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/ward_status')
+def ward_status():
+    """Aggregate status of every camera for the ward dashboard."""
+    ward.start()
+    cameras = ward.status()
     return jsonify({
-        'fall_detected': fall_detected, 
-        'alert_playing': alert_playing,
-        'sleep_detected': sleep_detected,
-        'current_posture': current_posture,
-        'current_furniture': current_furniture,
-        'activity_duration': activity_duration
+        'cameras': cameras,
+        'falls': [name for name, status in cameras.items() if status['fall_detected']]
     })
 
 
+@app.route('/healthz')
+def healthz():
+    """Liveness: 503 only if a restart is needed (required model failed, inference loop died)."""
+    payload, healthy, _ = health()
+    return jsonify(payload), 200 if healthy else 503
+
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: 200 once the models are loaded and warm and the inference loop runs."""
+    ward.start()
+    payload, _, ready = health()
+    return jsonify(payload), 200 if ready else 503
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text-format metrics from the frame loop."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def event_filters(cam):
+    if cam is not None and ward.get(cam) is None:
+        abort(404, description=f"Kamera tidak dikenal: {cam}")
+    types = request.args.get('type')
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+    except ValueError:
+        abort(400, description="Waktu tidak valid (detik unix atau ISO 8601)")
+    return {
+        'camera': cam,
+        'events': types.split(',') if types else None,
+        'since': since,
+        'until': until
+    }
+
+
+@app.route('/events')
+@app.route('/events/<cam>')
+def events(cam=None):
+    """Event history. Query: type=fall_start,sleep_start since= until= limit= cursor= order=asc|desc"""
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        abort(400, description="limit harus angka")
+    try:
+        rows, next_cursor = event_store.query(limit=limit, cursor=request.args.get('cursor'),
+                                              descending=request.args.get('order') == 'desc', **event_filters(cam))
+    except ValueError:
+        abort(400, description="cursor tidak valid")
+    return jsonify({'events': rows, 'next_cursor': next_cursor})
+
+
+@app.route('/events/counts')
+def event_counts():
+    """Number of events per camera and type in a time range (shift report)."""
+    filters = event_filters(request.args.get('camera'))
+    return jsonify({'counts': event_store.counts(**filters), 'generated_at': time.time()})
+
+
+@app.route('/alerts/acknowledge', methods=['POST'])
+@app.route('/alerts/acknowledge/<cam>', methods=['POST'])
+def acknowledge(cam=None):
+    """Close the camera's open fall incident and stop the alert sound (also after track_lost)."""
+    camera = get_camera(cam)
+    return jsonify({'acknowledged': camera.acknowledge(),
+                    'open': {} if alerts is None else alerts.open_incidents()})
+
+
 @app.route('/snapshot')
-def snapshot():
-    """Return the latest encoded JPEG frame captured by the streaming loop.
+@app.route('/snapshot/<cam>')
+def snapshot(cam=None):
+    """Return the latest encoded JPEG frame produced by the shared pipeline.
     This avoids opening a second VideoCapture which can freeze the camera.
+    Served from the same per-quality cache as /video_feed (?quality=).
     """
-    global last_frame
-    if last_frame is None:
+    frame = get_camera(cam).latest_frame(get_profile())
+    if frame is None:
         return ("No frame available yet", 404)
-    return Response(last_frame, mimetype='image/jpeg')
+    return Response(frame, mimetype='image/jpeg')
 
 if __name__ == '__main__':
     print("Sistem deteksi jatuh dimulai")
     print("Akses: http://localhost:9000")
+    print(f"Kamera: {', '.join(ward.cameras)}")
+    ward.start()
     app.run(host='0.0.0.0', port=9000, debug=False)
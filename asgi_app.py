@@ -0,0 +1,312 @@
+"""
+Production serving mode on asyncio (Starlette + uvicorn).
+
+The Flask development server parks one thread in a blocking generator for
+every MJPEG viewer and SSE client. Here every stream is a coroutine: the
+frame loop of each camera wakes one asyncio.Event per camera when it
+publishes a frame or a status (CameraPipeline.add_listener), and all
+viewers of that camera await that same event. Hundreds of connections are
+served by one process and one event loop, without a thread per client.
+
+Work that could stall the loop never runs on it: a JPEG that is not yet in
+the encode-once cache is encoded once in the thread pool and shared by every
+viewer waiting for it, and snapshots, event queries and metrics run as sync
+endpoints (also in the thread pool). Status reads use the status the
+pipeline already published instead of taking the frame loop's lock.
+
+Models, cameras and the event store are the ones set up by app.py (models
+still loading in the background, see /readyz), so both servers behave the
+same; only the web layer differs.
+
+    pip install starlette uvicorn
+    python asgi_app.py                          # port 9000 (PORT=...)
+    uvicorn asgi_app:app --host 0.0.0.0 --port 9000
+
+Measure how it scales with loadtest.py.
+"""
+
+import asyncio
+import contextlib
+import os
+import time
+
+try:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.exceptions import HTTPException
+    from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+    from starlette.routing import Mount, Route
+    from starlette.staticfiles import StaticFiles
+    from starlette.templating import Jinja2Templates
+except ImportError as e:
+    raise SystemExit(f"Mode ASGI butuh starlette dan uvicorn: pip install starlette uvicorn ({e})")
+
+import metrics
+from app import alerts, audio_active, event_store, health, ward
+from event_store import parse_time
+from stream import DEFAULT_PROFILE, QUALITY_PROFILES, mjpeg_part, sse_message
+
+HEARTBEAT = 15.0  # seconds between SSE heartbeats
+PORT = int(os.environ.get("PORT", "9000"))
+
+
+class CameraFeed:
+    """Wakes the coroutines watching one camera whenever its pipeline publishes."""
+
+    def __init__(self, camera, loop):
+        self.camera = camera
+        self._loop = loop
+        self._events = {'frame': asyncio.Event(), 'status': asyncio.Event()}
+        self._encoding = {}  # (frame seq, profile): task encoding that JPEG
+        camera.add_listener(self._notify)
+
+    async def wait(self, kind, timeout):
+        """Wait for the next publish of kind ('frame' or 'status'); False on timeout."""
+        event = self._events[kind]
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def jpeg(self, seq, frame, profile):
+        """JPEG of frame, encoded at most once in the thread pool however many viewers ask."""
+        jpeg = frame.cached(profile)
+        if jpeg is not None:
+            return jpeg
+        key = (seq, profile)
+        task = self._encoding.get(key)
+        if task is None:
+            task = self._encoding[key] = asyncio.ensure_future(run_in_threadpool(frame.jpeg, profile))
+            task.add_done_callback(lambda _: self._encoding.pop(key, None))
+        # a viewer disconnecting must not cancel the encode the others are waiting for
+        return await asyncio.shield(task)
+
+    def _notify(self, kind):
+        # called on the inference thread
+        try:
+            self._loop.call_soon_threadsafe(self._wake, kind)
+        except RuntimeError:
+            pass  # event loop already closed (shutdown)
+
+    def _wake(self, kind):
+        event = self._events[kind]
+        self._events[kind] = asyncio.Event()
+        event.set()
+
+
+feeds = {}
+templates = Jinja2Templates(directory="templates")
+
+
+def flask_url_for(endpoint, **values):
+    """url_for with Flask's signature, so templates/index.html is shared with app.py."""
+    if endpoint == 'static':
+        return '/static/' + values['filename']
+    return '/' + endpoint
+
+
+def get_feed(request):
+    cam = request.path_params.get('cam')
+    if cam is None:
+        return feeds[ward.default.name]
+    if cam not in feeds:
+        raise HTTPException(404, f"Kamera tidak dikenal: {cam}")
+    return feeds[cam]
+
+
+def get_profile(request):
+    """Quality profile from ?quality= (full, half, thumb)."""
+    profile = request.query_params.get('quality', DEFAULT_PROFILE)
+    if profile not in QUALITY_PROFILES:
+        raise HTTPException(400, f"Kualitas tidak dikenal: {profile} (pilih {', '.join(QUALITY_PROFILES)})")
+    return profile
+
+
+async def current_status(camera):
+    _, status, _ = camera.newest_status()
+    if status is None:
+        status = await run_in_threadpool(camera.status)
+    return status
+
+
+async def index(request):
+    return templates.TemplateResponse(request, 'index.html', {'audio_active': audio_active,
+                                                              'url_for': flask_url_for})
+
+
+async def mjpeg(feed, profile):
+    camera = feed.camera
+    last_seq = camera.viewer_joined()
+    try:
+        while camera.running:
+            seq, frame = camera.newest_frame()
+            if seq == last_seq or frame is None:
+                await feed.wait('frame', 1.0)
+                continue
+            last_seq = seq
+            jpeg = await feed.jpeg(seq, frame, profile)
+            if jpeg is not None:
+                yield mjpeg_part(jpeg)
+    finally:
+        camera.viewer_left()
+
+
+async def video_feed(request):
+    """MJPEG stream; ?quality=half or ?quality=thumb for tablets on Wi-Fi."""
+    feed = get_feed(request)
+    return StreamingResponse(mjpeg(feed, get_profile(request)),
+                             media_type='multipart/x-mixed-replace; boundary=frame')
+
+
+async def status_events(feed):
+    """Same stream as CameraPipeline.status_events(), but awaiting instead of blocking."""
+    camera = feed.camera
+    last_seq, current, _ = camera.newest_status()
+    if current is None:
+        current = await run_in_threadpool(camera.status)
+    yield sse_message('status', dict(current, events=[]), retry=2000)
+
+    while camera.running:
+        seq, status, events = camera.newest_status()
+        if seq != last_seq:
+            last_seq = seq
+            yield sse_message('status', dict(status, events=events))
+        elif not await feed.wait('status', HEARTBEAT):
+            yield sse_message('heartbeat', {})
+
+
+async def status_stream(request):
+    """Server-Sent Events stream of status changes."""
+    return StreamingResponse(status_events(get_feed(request)), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def fall_status(request):
+    return JSONResponse(await current_status(get_feed(request).camera))
+
+
+async def ward_status(request):
+    """Aggregate status of every camera for the ward dashboard."""
+    cameras = {name: await current_status(feed.camera) for name, feed in feeds.items()}
+    return JSONResponse({
+        'cameras': cameras,
+        'falls': [name for name, status in cameras.items() if status['fall_detected']]
+    })
+
+
+def snapshot(request):
+    """Latest JPEG; rendered on demand when nobody watches, so it runs in the thread pool."""
+    frame = get_feed(request).camera.latest_frame(get_profile(request))
+    if frame is None:
+        return PlainTextResponse("No frame available yet", 404)
+    return Response(frame, media_type='image/jpeg')
+
+
+async def healthz(request):
+    """Liveness: 503 only if a restart is needed (required model failed, inference loop died)."""
+    payload, healthy, _ = health()
+    return JSONResponse(payload, 200 if healthy else 503)
+
+
+async def readyz(request):
+    """Readiness: 200 once the models are loaded and warm and the inference loop runs."""
+    payload, _, ready = health()
+    return JSONResponse(payload, 200 if ready else 503)
+
+
+def metrics_endpoint(request):
+    """Prometheus text-format metrics from the frame loop."""
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+def event_filters(request, cam):
+    if cam is not None and cam not in feeds:
+        raise HTTPException(404, f"Kamera tidak dikenal: {cam}")
+    args = request.query_params
+    try:
+        since, until = parse_time(args.get('since')), parse_time(args.get('until'))
+    except ValueError:
+        raise HTTPException(400, "Waktu tidak valid (detik unix atau ISO 8601)")
+    return {
+        'camera': cam,
+        'events': args['type'].split(',') if args.get('type') else None,
+        'since': since,
+        'until': until
+    }
+
+
+def events(request):
+    """Event history. Query: type=fall_start,sleep_start since= until= limit= cursor= order=asc|desc"""
+    args = request.query_params
+    filters = event_filters(request, request.path_params.get('cam'))
+    try:
+        limit = int(args.get('limit', 100))
+    except ValueError:
+        raise HTTPException(400, "limit harus angka")
+    try:
+        rows, next_cursor = event_store.query(limit=limit, cursor=args.get('cursor'),
+                                              descending=args.get('order') == 'desc', **filters)
+    except ValueError:
+        raise HTTPException(400, "cursor tidak valid")
+    return JSONResponse({'events': rows, 'next_cursor': next_cursor})
+
+
+def event_counts(request):
+    """Number of events per camera and type in a time range (shift report)."""
+    filters = event_filters(request, request.query_params.get('camera'))
+    return JSONResponse({'counts': event_store.counts(**filters), 'generated_at': time.time()})
+
+
+def acknowledge(request):
+    """Close the camera's open fall incident and stop the alert sound (also after track_lost)."""
+    camera = get_feed(request).camera
+    return JSONResponse({'acknowledged': camera.acknowledge(),
+                         'open': {} if alerts is None else alerts.open_incidents()})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    loop = asyncio.get_running_loop()
+    for name, camera in ward.cameras.items():
+        feeds[name] = CameraFeed(camera, loop)
+    ward.start()
+    yield
+    ward.stop()
+    event_store.close()
+    if alerts is not None:
+        alerts.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/video_feed', video_feed),
+        Route('/video_feed/{cam}', video_feed),
+        Route('/status_stream', status_stream),
+        Route('/status_stream/{cam}', status_stream),
+        Route('/fall_status', fall_status),
+        Route('/fall_status/{cam}', fall_status),
+        Route('/ward_status', ward_status),
+        Route('/snapshot', snapshot),
+        Route('/snapshot/{cam}', snapshot),
+        Route('/healthz', healthz),
+        Route('/readyz', readyz),
+        Route('/metrics', metrics_endpoint),
+        Route('/events', events),
+        Route('/events/counts', event_counts),
+        Route('/events/{cam}', events),
+        Route('/alerts/acknowledge', acknowledge, methods=['POST']),
+        Route('/alerts/acknowledge/{cam}', acknowledge, methods=['POST']),
+        Mount('/static', StaticFiles(directory='static'), name='static'),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    print("Sistem deteksi jatuh dimulai (ASGI)")
+    print(f"Akses: http://localhost:{PORT}")
+    print(f"Kamera: {', '.join(ward.cameras)}")
+    uvicorn.run(app, host='0.0.0.0', port=PORT, log_level='warning')
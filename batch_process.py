@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Offline batch processing untuk rekaman video.
+
+Runs the same posture/furniture/fall logic as the web app over recorded
+files as fast as the CPU allows (no real-time replay) and writes one JSONL
+event stream per file, optionally with an annotated copy of the video.
+
+    python batch_process.py rekaman/ --out runs/batch --video
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from detection import draw_furniture, draw_state, furniture_under, pose_arrays
+from furniture import FurnitureCache
+from models import BACKEND, BACKENDS, SEG_MODEL_PATH, load_model
+from posture import POSTURE_NAMES, classify_postures
+from tracker import PersonTracker
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v')
+
+
+def find_videos(paths):
+    """Expand files and directories into a sorted list of video files."""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(os.path.join(path, name))
+        else:
+            videos.append(path)
+    return videos
+
+
+def decode_batches(cap, batch_size, stride, out_queue):
+    """Decode frames on a background thread and queue them in batches.
+
+    Skipped frames (stride > 1) are only grabbed, not decoded.
+    """
+    batch = []
+    index = 0
+    try:
+        while True:
+            if index % stride:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            batch.append((index, frame))
+            index += 1
+            if len(batch) == batch_size:
+                out_queue.put(batch)
+                batch = []
+        if batch:
+            out_queue.put(batch)
+    finally:
+        out_queue.put(None)
+
+
+def process_video(path, pose_model, seg_model, out_dir, batch_size=16, stride=1, write_video=False):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"[!] Gagal membuka video: {path}")
+        return None
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    writer = None
+    if write_video:
+        writer = cv2.VideoWriter(os.path.join(out_dir, f"{stem}_annotated.mp4"),
+                                 cv2.VideoWriter_fourcc(*'mp4v'), fps / stride, (width, height))
+
+    tracker = PersonTracker()
+    # the furniture cache runs on video time (now=timestamp below)
+    furniture_cache = FurnitureCache(seg_model) if seg_model is not None else None
+
+    batches = queue.Queue(maxsize=4)
+    decoder = threading.Thread(target=decode_batches, args=(cap, batch_size, stride, batches), daemon=True)
+    decoder.start()
+
+    frames = 0
+    events = 0
+    started = time.time()
+    with open(os.path.join(out_dir, f"{stem}.jsonl"), "w") as log:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+
+            pose_results = pose_model([frame for _, frame in batch], verbose=False)
+            for (index, frame), pose_result in zip(batch, pose_results):
+                timestamp = index / fps
+                boxes, keypoints = pose_arrays(pose_result)
+                codes, _ = classify_postures(keypoints, frame.shape)
+
+                furniture = None
+                if furniture_cache is not None:
+                    furniture = furniture_cache.get(frame, boxes, now=timestamp)
+                furniture_names = furniture_under(keypoints, furniture)
+
+                matches, lost = tracker.update(boxes, keypoints[..., :2], timestamp)
+                changes = [(track, "track_lost") for track in lost if track.state.fall_detected]
+                for track, d in matches:
+                    body_position = POSTURE_NAMES[int(codes[d])]
+                    if body_position is None:
+                        continue
+                    changes.extend((track, event) for event in track.state.update(
+                        body_position, furniture_names[d], timestamp, keypoints[d], frame.shape[0]))
+                for track, event in changes:
+                    state = track.state
+                    log.write(json.dumps({
+                        'timestamp': round(timestamp, 3),
+                        'frame': index,
+                        'track': track.id,
+                        'event': event,
+                        'pose': state.last_pose,
+                        'posture': state.current_posture,
+                        'furniture': state.current_furniture,
+                        'fall_detected': state.fall_detected
+                    }) + "\n")
+                    events += 1
+
+                if writer is not None:
+                    annotated_frame = pose_result.plot()
+                    if furniture is not None:
+                        draw_furniture(annotated_frame, furniture)
+                    primary = tracker.primary()
+                    if primary is not None and len(boxes):
+                        draw_state(annotated_frame, primary.state)
+                    writer.write(annotated_frame)
+                frames += 1
+
+    decoder.join()
+    cap.release()
+    if writer is not None:
+        writer.release()
+
+    elapsed = time.time() - started
+    summary = {
+        'file': path,
+        'frames': frames,
+        'events': events,
+        'seconds': round(elapsed, 2),
+        'fps': round(frames / elapsed, 1) if elapsed > 0 else 0.0
+    }
+    if furniture_cache is not None:
+        summary.update(furniture_cache.stats())
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proses rekaman video secara offline (tanpa webcam).")
+    parser.add_argument("inputs", nargs="+", help="file video atau folder berisi video")
+    parser.add_argument("--out", default=os.path.join("runs", "batch"), help="folder output JSONL/video")
+    parser.add_argument("--batch", type=int, default=16, help="jumlah frame per batch inferensi")
+    parser.add_argument("--stride", type=int, default=1, help="proses setiap N frame")
+    parser.add_argument("--video", action="store_true", help="simpan juga video beranotasi")
+    parser.add_argument("--pose-model", default="yolov8n-pose.pt")
+    parser.add_argument("--seg-model", default=SEG_MODEL_PATH)
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND, help="backend inferensi (default: MODEL_BACKEND)")
+    args = parser.parse_args()
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("Tidak ada video ditemukan")
+        return
+
+    pose_model = load_model(args.pose_model, args.backend, task="pose")
+    seg_model = load_model(args.seg_model, args.backend, task="segment") if os.path.exists(args.seg_model) else None
+    if seg_model is None:
+        print("Peringatan: Segmentation model not found, furniture tidak dideteksi")
+
+    os.makedirs(args.out, exist_ok=True)
+    for path in videos:
+        summary = process_video(path, pose_model, seg_model, args.out,
+                                batch_size=args.batch, stride=max(args.stride, 1), write_video=args.video)
+        if summary is not None:
+            print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Per-stage benchmark for the app.py frame pipeline.
+
+Feeds fixed clips (or deterministic synthetic frames) through the same stages
+as CameraPipeline and reports FPS and p50/p95/p99 latency per stage for each
+input resolution and thread count. Runs on a CPU-only box without a camera.
+
+Frames are pre-encoded as JPEG so the decode stage measures the same work as
+an MJPEG webcam. Results are written as JSON so two commits can be compared:
+
+    python benchmark.py --json bench_before.json
+    python benchmark.py --json bench_after.json --compare bench_before.json
+
+Several inference backends (see models.py) can be measured in one run; the
+speedup of each over PyTorch is printed at the end. A backend whose export
+failed (models.py then loads the .pt weights) is skipped and listed under
+"skipped" instead of being measured as torch under its name:
+
+    python benchmark.py --backends torch,onnx,openvino
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from detection import furniture_under, pose_arrays
+from furniture import FurnitureMap
+from models import BACKENDS, SEG_MODEL_PATH, backend_of, resolve_model
+from posture import classify_postures
+
+STAGES = ('decode', 'pose', 'seg', 'plot', 'containment', 'encode')
+
+
+def percentiles(samples):
+    """Summarise a list of durations (seconds) in milliseconds."""
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000.0
+    mean = float(ms.mean())
+    return {
+        'mean_ms': round(mean, 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'fps': round(1000.0 / mean, 2) if mean > 0 else None
+    }
+
+
+def synthetic_frames(width, height, count, seed=0):
+    """Deterministic frames: a noisy room with a moving person-sized block."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(30, 90, size=(height, width, 3), dtype=np.uint8)
+    cv2.rectangle(base, (width // 10, height // 2), (width // 2, height - 10), (90, 60, 40), -1)
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        x = (i * 7) % max(width - width // 6, 1)
+        cv2.rectangle(frame, (x, height // 5), (x + width // 6, height - 20), (160, 170, 190), -1)
+        frames.append(frame)
+    return frames
+
+
+def clip_frames(path, width, height, count):
+    """Read up to count frames from a clip (looping), resized to width x height."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            if not frames:
+                break
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            continue
+        frames.append(cv2.resize(frame, (width, height)))
+    cap.release()
+    return frames
+
+
+def set_threads(threads):
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def run_case(pose_model, seg_model, jpegs, warmup=5):
+    """Run every frame through the pipeline stages and collect per-stage timings."""
+    timings = {stage: [] for stage in STAGES}
+    totals = []
+    fallback_person = None
+
+    for i, jpeg in enumerate(jpegs):
+        record = i >= warmup
+        t_frame = time.perf_counter()
+
+        t = time.perf_counter()
+        frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+        decode = time.perf_counter() - t
+
+        t = time.perf_counter()
+        pose_result = pose_model(frame, verbose=False)[0]
+        pose = time.perf_counter() - t
+
+        seg = None
+        furniture = FurnitureMap.empty()
+        if seg_model is not None:
+            t = time.perf_counter()
+            furniture = FurnitureMap.from_results(seg_model(frame, conf=0.3, verbose=False)[0])
+            seg = time.perf_counter() - t
+
+        t = time.perf_counter()
+        annotated_frame = pose_result.plot()
+        plot = time.perf_counter() - t
+
+        # keep the containment stage measured even if the model finds nobody
+        t = time.perf_counter()
+        _, keypoints = pose_arrays(pose_result)
+        if len(keypoints) == 0:
+            if fallback_person is None:
+                h, w = frame.shape[:2]
+                fallback_person = np.column_stack([np.full(17, w / 2), np.linspace(h * 0.2, h * 0.9, 17),
+                                                   np.ones(17)]).astype(np.float32)[None]
+            keypoints = fallback_person
+        classify_postures(keypoints, frame.shape)
+        furniture_under(keypoints, furniture)
+        containment = time.perf_counter() - t
+
+        t = time.perf_counter()
+        cv2.imencode('.jpg', annotated_frame)
+        encode = time.perf_counter() - t
+
+        if record:
+            for stage, value in zip(STAGES, (decode, pose, seg, plot, containment, encode)):
+                if value is not None:
+                    timings[stage].append(value)
+            totals.append(time.perf_counter() - t_frame)
+
+    stages = {stage: percentiles(values) for stage, values in timings.items() if values}
+    return stages, percentiles(totals)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def environment():
+    info = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__
+    }
+    try:
+        import torch
+        info['torch'] = torch.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def compare(current, baseline):
+    """Print the mean latency change per stage against a previous run."""
+    old = {(r['resolution'], r['threads'], r.get('backend', 'torch')): r for r in baseline['results']}
+    for result in current['results']:
+        key = (result['resolution'], result['threads'], result['backend'])
+        if key not in old:
+            continue
+        print(f"\n{key[0]} threads={key[1]} backend={key[2]} (vs {baseline['environment'].get('commit')})")
+        for stage, stats in list(result['stages'].items()) + [('total', result['total'])]:
+            before = old[key]['total'] if stage == 'total' else old[key]['stages'].get(stage)
+            if before is None or stats is None:
+                continue
+            change = (stats['mean_ms'] - before['mean_ms']) / before['mean_ms'] * 100 if before['mean_ms'] else 0.0
+            print(f"  {stage:12s} {before['mean_ms']:9.2f} -> {stats['mean_ms']:9.2f} ms  ({change:+.1f}%)")
+
+
+def backend_speedup(results):
+    """Print the mean-latency speedup of every backend over torch for the model stages and the total."""
+    torch_runs = {(r['resolution'], r['threads']): r for r in results if r['backend'] == 'torch'}
+    for result in results:
+        base = torch_runs.get((result['resolution'], result['threads']))
+        if result['backend'] == 'torch' or base is None:
+            continue
+        speedups = []
+        for stage in ('pose', 'seg', 'total'):
+            before = base['total'] if stage == 'total' else base['stages'].get(stage)
+            after = result['total'] if stage == 'total' else result['stages'].get(stage)
+            if before and after and after['mean_ms']:
+                speedups.append(f"{stage} x{before['mean_ms'] / after['mean_ms']:.2f}")
+        print(f"  {result['backend']:9s} {result['resolution']} threads={result['threads']}: {', '.join(speedups)}")
+
+
+def parse_resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per tahap pipeline deteksi jatuh.")
+    parser.add_argument("--clip", action="append", default=[], help="clip video (boleh lebih dari satu); default frame sintetis")
+    parser.add_argument("--resolutions", default="640x480,1280x720")
+    parser.add_argument("--threads", default="1,%d" % (os.cpu_count() or 1))
+    parser.add_argument("--frames", type=int, default=100, help="frame terukur per kasus")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--pose-model", default="yolov8n-pose.pt")
+    parser.add_argument("--seg-model", default=SEG_MODEL_PATH)
+    parser.add_argument("--backends", default="torch", help="backend dipisah koma: " + ",".join(BACKENDS))
+    parser.add_argument("--no-seg", action="store_true", help="lewati tahap segmentasi")
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    parser.add_argument("--compare", help="bandingkan dengan hasil JSON sebelumnya")
+    args = parser.parse_args()
+
+    report = {'environment': environment(), 'config': vars(args), 'results': [], 'skipped': []}
+    count = args.frames + args.warmup
+    for backend in args.backends.split(','):
+        # resolve_model falls back to the .pt weights when an export fails; such a run would
+        # only measure torch again under another name, so it is skipped and listed as such
+        paths = {'pose': resolve_model(args.pose_model, backend, task="pose")}
+        if not args.no_seg and (os.path.exists(args.seg_model) or args.seg_model.endswith('.yaml')):
+            paths['seg'] = resolve_model(args.seg_model, backend, task="segment")
+        loaded = {stage: backend_of(path) for stage, path in paths.items()}
+        if any(b != backend for b in loaded.values()):
+            print(f"\n[!] Backend {backend} dilewati: model dimuat sebagai "
+                  f"{', '.join(f'{stage}={b}' for stage, b in loaded.items())} (export gagal, fallback ke PyTorch)")
+            report['skipped'].append({'backend': backend, 'loaded': loaded})
+            continue
+        pose_model = YOLO(paths['pose'], task="pose")
+        seg_model = YOLO(paths['seg'], task="segment") if 'seg' in paths else None
+
+        for resolution in args.resolutions.split(','):
+            width, height = parse_resolution(resolution)
+            frames = []
+            for clip in args.clip:
+                frames += clip_frames(clip, width, height, count)
+            if not frames:
+                frames = synthetic_frames(width, height, count)
+            jpegs = [cv2.imencode('.jpg', frame)[1] for frame in frames[:count]]
+
+            for threads in (int(n) for n in args.threads.split(',')):
+                set_threads(threads)
+                stages, total = run_case(pose_model, seg_model, jpegs, warmup=args.warmup)
+                report['results'].append({
+                    'backend': backend,
+                    'resolution': resolution,
+                    'threads': threads,
+                    'frames': len(jpegs) - args.warmup,
+                    'stages': stages,
+                    'total': total
+                })
+
+                print(f"\n{resolution} threads={threads} backend={backend}")
+                for stage, stats in stages.items():
+                    print(f"  {stage:12s} p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f} ms  ({stats['fps']} fps)")
+                if total:
+                    print(f"  {'total':12s} p50 {total['p50_ms']:8.2f}  p95 {total['p95_ms']:8.2f}  p99 {total['p99_ms']:8.2f} ms  ({total['fps']} fps)")
+
+    if len({r['backend'] for r in report['results']}) > 1:
+        print("\nSpeedup vs torch (mean latency)")
+        backend_speedup(report['results'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nHasil disimpan ke {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
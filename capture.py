@@ -0,0 +1,131 @@
+"""
+Camera capture decoupled from inference.
+
+A FrameGrabber thread reads the camera as fast as the driver delivers and
+stores only the newest frame in a LatestFrameBuffer. Inference always picks
+up the freshest frame, so when the models fall behind we drop old frames
+instead of queueing them and deciding on stale images.
+"""
+
+import threading
+import time
+
+import cv2
+
+
+class LatestFrameBuffer:
+    """Single-slot buffer where a new frame replaces the unread one."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = None
+        self._seq = 0
+        self._read_seq = 0
+        self.frames_in = 0
+        self.frames_dropped = 0
+
+    def put(self, frame, timestamp):
+        with self._cond:
+            if self._seq != self._read_seq:
+                # previous frame was never consumed
+                self.frames_dropped += 1
+            self._frame = frame
+            self._timestamp = timestamp
+            self._seq += 1
+            self.frames_in += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Wait for a frame newer than the last one returned.
+
+        Returns (frame, timestamp), or (None, None) on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != self._read_seq, timeout=timeout):
+                return None, None
+            self._read_seq = self._seq
+            return self._frame, self._timestamp
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class FrameGrabber:
+    """Background thread that keeps a LatestFrameBuffer filled from a camera.
+
+    A camera that stops delivering is reopened every reopen_delay seconds.
+    With max_failures set, the grabber gives up after that many reopens in a
+    row without a frame: running turns False and failed True, so a consumer
+    can stop instead of waiting on a dead device forever.
+    """
+
+    def __init__(self, source=0, reopen_delay=1.0, on_frame=None, max_failures=None):
+        self.source = source
+        self.reopen_delay = reopen_delay
+        self.on_frame = on_frame  # called after every new frame, e.g. to wake a consumer
+        self.max_failures = max_failures  # None: keep reopening forever (the web app)
+        self.buffer = LatestFrameBuffer()
+        self.running = False
+        self.failed = False
+        self._thread = None
+
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f"grab-{self.source}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.buffer.wake()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def read(self, timeout=1.0):
+        """Return (frame, captured_at) for the freshest unread frame.
+
+        frame is None if nothing new arrived within timeout.
+        """
+        return self.buffer.get(timeout=timeout)
+
+    def stats(self):
+        return {
+            'frames_captured': self.buffer.frames_in,
+            'frames_dropped': self.buffer.frames_dropped
+        }
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        # keep the driver queue short as well, we only want the newest frame
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _run(self):
+        cap = self._open()
+        failures = 0
+        try:
+            while self.running:
+                success, frame = cap.read()
+                if not success:
+                    failures += 1
+                    if self.max_failures is not None and failures > self.max_failures:
+                        print(f"[!] Kamera {self.source} gagal dibuka {self.max_failures}x berturut-turut, berhenti")
+                        self.failed = True
+                        self.running = False
+                        self.buffer.wake()
+                        break
+                    # camera unplugged or busy: reopen instead of giving up
+                    cap.release()
+                    time.sleep(self.reopen_delay)
+                    cap = self._open()
+                    continue
+                failures = 0
+                self.buffer.put(frame, time.time())
+                if self.on_frame is not None:
+                    self.on_frame()
+        finally:
+            cap.release()
@@ -0,0 +1,245 @@
+"""
+Posture, furniture and fall logic shared by the live pipeline and offline tools.
+
+Nothing here touches the camera or the models: callers pass keypoints, the
+furniture map and a timestamp, so the same state machine runs on wall-clock
+time in the web app and on video time in batch_process.py.
+
+Given each observation's keypoints, FallState also keeps a short
+KeypointHistory (history.py). A fall in which hips and head came down fast
+and then stopped is confirmed after FAST_FALL_CONFIRM instead of
+FALL_CONFIRM; slow slides keep the full hold, and lying down on furniture is
+still "Tidur", never an alert. FALL_VELOCITY=0 turns this off.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from history import KeypointHistory
+from posture import MIN_KEYPOINT_CONF
+
+FALL_CONFIRM = 0.5  # seconds in "Jatuh" before the alert fires
+FAST_FALL_CONFIRM = 0.15  # the same after a sudden descent
+FAST_FALL_VELOCITY = 0.6  # frame heights per second hips and head must both reach
+LANDED_FRACTION = 0.5  # descent counts as over once velocity is below this share of its peak
+FALL_IMPACT = 3.0  # frame heights/s² of deceleration after the peak (a hard stop, not easing down)
+FALL_VELOCITY = os.environ.get("FALL_VELOCITY", "1") != "0"  # use keypoint velocity at all
+RECOVER_CONFIRM = 0.5  # seconds out of "Jatuh" before the alert clears
+LONG_ACTIVITY = 10  # seconds of the same pose before the on-screen warning
+ON_FURNITURE = 0.5  # share of the torso on a furniture mask that counts as sitting/lying on it
+TORSO_KEYPOINTS = [5, 6, 11, 12]  # COCO shoulders and hips
+
+
+def pose_arrays(pose_result):
+    """Copy boxes (N, 4) and keypoints (N, 17, 3) of one pose Results to the host in one go."""
+    if len(pose_result.keypoints) == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0, 17, 3), dtype=np.float32)
+    return pose_result.boxes.xyxy.cpu().numpy(), pose_result.keypoints.data.cpu().numpy()
+
+
+def torso_regions(keypoints, min_conf=MIN_KEYPOINT_CONF):
+    """(N, 4) xyxy box around each person's shoulders and hips.
+
+    This is the part of the body that rests on a chair or bed. People with
+    fewer than two confident torso keypoints fall back to all their
+    confident keypoints; people with none get an empty box.
+    """
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if keypoints.shape[-1] >= 3:
+        valid = keypoints[..., 2] >= min_conf
+    else:
+        valid = (keypoints[..., :2] != 0).any(-1)
+    torso = np.zeros_like(valid)
+    torso[:, TORSO_KEYPOINTS] = valid[:, TORSO_KEYPOINTS]
+    use = np.where((torso.sum(1) >= 2)[:, None], torso, valid)
+
+    xy = keypoints[..., :2]
+    lo = np.where(use[..., None], xy, np.inf).min(1)
+    hi = np.where(use[..., None], xy, -np.inf).max(1)
+    regions = np.concatenate([lo, hi], axis=1)
+    regions[~use.any(1)] = 0
+    return regions
+
+
+def furniture_overlap(keypoints, furniture):
+    """(N, F) fraction of each person's torso covered by each furniture instance."""
+    if furniture is None:
+        return np.zeros((len(keypoints), 0), dtype=np.float32)
+    return furniture.overlap(torso_regions(keypoints))
+
+
+def furniture_under(keypoints, furniture, min_overlap=ON_FURNITURE):
+    """For (N, 17, 3) keypoints, the furniture name each person rests on, or None."""
+    overlap = furniture_overlap(keypoints, furniture)
+    if overlap.shape[1] == 0:
+        return [None] * len(overlap)
+    names = furniture.names()
+    best = overlap.argmax(1)
+    return [names[b] if overlap[i, b] >= min_overlap else None for i, b in enumerate(best)]
+
+
+class FallState:
+    """Posture/fall state machine for one camera (or one tracked person)."""
+
+    def __init__(self, now=None, velocity=FALL_VELOCITY):
+        self.alert_playing = False
+        self.last_pose = None
+        self.pose_start_time = time.time() if now is None else now
+        self.fall_start_time = None
+        self.recover_start_time = None
+        self.fall_detected = False
+        self.sleep_detected = False
+        self.current_posture = "Berdiri"  # Berdiri, Duduk, Jatuh, Tidur
+        self.current_furniture = ""  # furniture name if duduk/tidur
+        self.activity_duration = 0  # duration of current activity
+        self.warning_triggered = False  # warning already triggered for long activity
+        self.history = KeypointHistory() if velocity else None
+        self.sudden_fall = False  # current fall was confirmed on the fast path
+
+    def as_dict(self):
+        return {
+            'fall_detected': self.fall_detected,
+            'alert_playing': self.alert_playing,
+            'sleep_detected': self.sleep_detected,
+            'current_posture': self.current_posture,
+            'current_furniture': self.current_furniture,
+            'activity_duration': self.activity_duration
+        }
+
+    def update(self, body_position, furniture_name=None, now=None, keypoints=None, frame_height=None):
+        """Advance the state machine by one observation.
+
+        keypoints, the (17, 3) keypoints of this person, and frame_height
+        enable the fast path for sudden falls. Returns the list of events this observation caused, any of
+        "posture_change", "fall_start", "fall_end", "sleep_start",
+        "sleep_end" and "long_activity" (same sitting/standing pose for
+        LONG_ACTIVITY seconds).
+        """
+        now = time.time() if now is None else now
+        events = []
+        if self.history is not None and keypoints is not None:
+            self.history.push(keypoints, now)
+        was_fallen = self.fall_detected
+        was_sleeping = self.sleep_detected
+
+        if body_position == "Jatuh" and furniture_name:
+            current_pose = f"Tidur di {furniture_name}"
+            self.current_posture = "Tidur"
+            self.current_furniture = furniture_name
+            self.sleep_detected = True
+        elif body_position == "Jatuh":
+            current_pose = "Jatuh"
+            self.current_posture = "Jatuh"
+            self.current_furniture = ""
+            self.sleep_detected = False
+        elif body_position == "Duduk" and furniture_name:
+            current_pose = f"Duduk di {furniture_name}"
+            self.current_posture = "Duduk"
+            self.current_furniture = furniture_name
+            self.sleep_detected = False
+        else:
+            current_pose = body_position
+            self.current_posture = body_position
+            self.current_furniture = ""
+            self.sleep_detected = False
+
+        if current_pose == "Jatuh":
+            if self.last_pose != "Jatuh":
+                self.fall_start_time = now
+                self.recover_start_time = None
+                self.sudden_fall = False
+
+            if not self.alert_playing and not self.sudden_fall and frame_height:
+                self.sudden_fall = self._sudden_descent(now, frame_height)
+            confirm = FAST_FALL_CONFIRM if self.sudden_fall else FALL_CONFIRM
+            if self.fall_start_time is not None and (now - self.fall_start_time) >= confirm:
+                if not self.alert_playing:
+                    self.alert_playing = True
+                    self.fall_detected = True
+
+        elif "Tidur" in current_pose:
+            if self.alert_playing:
+                self.alert_playing = False
+                self.fall_detected = False
+
+            self.sleep_detected = True
+
+        else:
+            if current_pose == self.last_pose:
+                self.activity_duration = int(now - self.pose_start_time)
+            else:
+                self.pose_start_time = now
+                self.activity_duration = 0
+                self.warning_triggered = False
+
+            if self.last_pose == "Jatuh" and current_pose != "Jatuh":
+                self.recover_start_time = now
+
+            if self.recover_start_time is not None and (now - self.recover_start_time) >= RECOVER_CONFIRM:
+                if self.alert_playing:
+                    self.alert_playing = False
+                    self.fall_detected = False
+
+        if current_pose != self.last_pose:
+            events.append("posture_change")
+        if self.fall_detected and not was_fallen:
+            events.append("fall_start")
+        elif was_fallen and not self.fall_detected:
+            events.append("fall_end")
+        if self.sleep_detected and not was_sleeping:
+            events.append("sleep_start")
+        elif was_sleeping and not self.sleep_detected:
+            events.append("sleep_end")
+        if self.activity_duration >= LONG_ACTIVITY and not self.warning_triggered:
+            self.warning_triggered = True
+            events.append("long_activity")
+
+        self.last_pose = current_pose
+        return events
+
+    def _sudden_descent(self, now, frame_height):
+        """Hips and head dropped at FAST_FALL_VELOCITY or faster, then stopped hard."""
+        if self.history is None:
+            return False
+        peak, current, impact = self.history.descent(now, frame_height)
+        return peak >= FAST_FALL_VELOCITY and current <= peak * LANDED_FRACTION and impact >= FALL_IMPACT
+
+
+def draw_furniture(annotated_frame, furniture):
+    """Draw the furniture boxes of a FurnitureMap onto the frame."""
+    for name, conf, box in zip(furniture.names(), furniture.confs, furniture.boxes):
+        x1, y1, x2, y2 = map(int, box)
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(annotated_frame, f"{name} ({conf:.2f})",
+                    (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+
+def draw_state(annotated_frame, state):
+    """Draw the current pose label and long-activity warning for a FallState."""
+    current_pose = state.last_pose
+    if current_pose is None:
+        return
+
+    if current_pose == "Jatuh":
+        cv2.putText(annotated_frame, "JATUH!", (50, 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 5)
+
+    elif "Tidur" in current_pose:
+        cv2.putText(annotated_frame, "TIDUR", (50, 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 255), 5)
+
+    else:
+        duration = state.activity_duration
+        if duration >= LONG_ACTIVITY:
+            if "Duduk" in current_pose:
+                cv2.putText(annotated_frame, f"Sudah {duration} detik duduk", (50, 150),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 165, 255), 3)
+            elif current_pose == "Berdiri":
+                cv2.putText(annotated_frame, f"Sudah {duration} detik berdiri", (50, 150),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 165, 255), 3)
+
+        cv2.putText(annotated_frame, f"{current_pose}", (50, 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 5)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Time-to-alert of the velocity-aware fall logic against the posture-only one.
+
+Runs the same keypoint sequences through two FallStates, one with the
+keypoint history (detection.FAST_FALL_CONFIRM after a sudden descent) and
+one without (always FALL_CONFIRM), and reports per scenario and frame rate
+when each one raised fall_start, measured from the start of the descent and
+in frames after the posture first read "Jatuh".
+
+By default the sequences are synthetic and deterministic: a sudden fall, a
+slow slide to the floor, lying down on a bed (slowly and flopping onto it),
+sitting down and bending over. Only the first two should alert; an alert
+in the others is counted as a false alert. Real clips can be run through
+the pose model as well, reporting every alert per track:
+
+    python evaluate_falls.py
+    python evaluate_falls.py --fps 10,30 --json falls.json
+    python evaluate_falls.py --clip jatuh.mp4 --pose-model yolov8n-pose.pt
+"""
+
+import argparse
+import json
+
+import cv2
+import numpy as np
+
+from detection import FallState, pose_arrays
+from posture import POSTURE_NAMES, classify_postures
+from tracker import PersonTracker
+
+FRAME_SHAPE = (480, 640, 3)
+
+# (y, x) of the 17 COCO keypoints as fractions of the frame height/width
+POSES = {
+    'berdiri': ([0.15, 0.14, 0.14, 0.15, 0.15, 0.27, 0.27, 0.38, 0.38, 0.47, 0.47, 0.5, 0.5, 0.7, 0.7, 0.9, 0.9],
+                [0.5, 0.51, 0.49, 0.52, 0.48, 0.55, 0.45, 0.57, 0.43, 0.57, 0.43, 0.53, 0.47, 0.53, 0.47, 0.53, 0.47]),
+    'duduk': ([0.5, 0.49, 0.49, 0.5, 0.5, 0.58, 0.58, 0.65, 0.65, 0.7, 0.7, 0.72, 0.72, 0.72, 0.72, 0.88, 0.88],
+              [0.5, 0.51, 0.49, 0.52, 0.48, 0.55, 0.45, 0.57, 0.43, 0.6, 0.4, 0.53, 0.47, 0.62, 0.56, 0.62, 0.56]),
+    'membungkuk': ([0.55, 0.54, 0.54, 0.55, 0.55, 0.5, 0.5, 0.62, 0.62, 0.72, 0.72, 0.52, 0.52, 0.7, 0.7, 0.9, 0.9],
+                   [0.62, 0.63, 0.61, 0.64, 0.6, 0.58, 0.54, 0.6, 0.56, 0.62, 0.58, 0.5, 0.46, 0.52, 0.46, 0.53, 0.47]),
+    'lantai': ([0.83, 0.82, 0.82, 0.83, 0.83, 0.84, 0.85, 0.84, 0.86, 0.84, 0.86, 0.85, 0.86, 0.86, 0.87, 0.87, 0.87],
+               [0.25, 0.24, 0.24, 0.26, 0.24, 0.33, 0.33, 0.38, 0.38, 0.43, 0.43, 0.5, 0.5, 0.6, 0.6, 0.72, 0.72]),
+    'kasur': ([0.58, 0.57, 0.57, 0.58, 0.58, 0.59, 0.6, 0.59, 0.61, 0.59, 0.61, 0.6, 0.61, 0.61, 0.62, 0.62, 0.62],
+              [0.25, 0.24, 0.24, 0.26, 0.24, 0.33, 0.33, 0.38, 0.38, 0.43, 0.43, 0.5, 0.5, 0.6, 0.6, 0.72, 0.72]),
+}
+
+EASING = {
+    'jatuh': lambda p: p * p,  # accelerating like free fall, stops on impact
+    'halus': lambda p: (1 - np.cos(np.pi * p)) / 2,  # eases in and out
+}
+
+# name: (is a fall, furniture under a person lying down, phases of (pose, seconds, easing))
+# the descent under test is the phase right after the first one
+SCENARIOS = {
+    'jatuh_cepat': (True, None, [('berdiri', 1.0, None), ('lantai', 0.6, 'jatuh'), ('lantai', 3.0, None)]),
+    'jatuh_lambat': (True, None, [('berdiri', 1.0, None), ('duduk', 1.5, 'halus'), ('lantai', 2.0, 'halus'),
+                                  ('lantai', 3.0, None)]),
+    'tidur_di_kasur': (False, 'bed', [('berdiri', 1.0, None), ('kasur', 1.2, 'halus'), ('kasur', 4.0, None)]),
+    'rebah_ke_kasur': (False, 'bed', [('berdiri', 1.0, None), ('kasur', 0.5, 'jatuh'), ('kasur', 3.0, None)]),
+    'duduk': (False, None, [('berdiri', 1.0, None), ('duduk', 0.8, 'halus'), ('duduk', 3.0, None)]),
+    'membungkuk': (False, None, [('berdiri', 1.0, None), ('membungkuk', 0.5, 'jatuh'), ('membungkuk', 1.0, None),
+                                 ('berdiri', 0.6, 'halus'), ('berdiri', 2.0, None)]),
+}
+
+
+def pose_keypoints(name):
+    y, x = POSES[name]
+    height, width = FRAME_SHAPE[:2]
+    return np.stack([np.asarray(x) * width, np.asarray(y) * height, np.full(17, 0.9)], axis=-1)
+
+
+def synthetic_sequence(phases, fps, noise=0.004, seed=0):
+    """(frames, 17, 3) keypoints and timestamps for a list of phases, with keypoint jitter."""
+    rng = np.random.default_rng(seed)
+    current = pose_keypoints(phases[0][0])
+    frames = []
+    for pose, seconds, easing in phases:
+        target = pose_keypoints(pose)
+        count = int(round(seconds * fps))
+        for i in range(1, count + 1):
+            p = EASING[easing](i / count) if easing else 1.0
+            frames.append(current + (target - current) * p)
+        current = target
+    keypoints = np.asarray(frames, dtype=np.float32)
+    keypoints[..., :2] += rng.normal(0, noise * FRAME_SHAPE[0], keypoints[..., :2].shape)
+    return keypoints, np.arange(len(keypoints)) / fps
+
+
+def run_sequence(keypoints, times, furniture, velocity):
+    """Feed one person's keypoints to a FallState; returns (alert time, frame of first Jatuh, alert frame)."""
+    state = FallState(now=times[0], velocity=velocity)
+    codes, _ = classify_postures(keypoints, FRAME_SHAPE)
+    first_jatuh = alert = None
+    for frame, (code, kps, t) in enumerate(zip(codes, keypoints, times)):
+        body_position = POSTURE_NAMES[int(code)]
+        if body_position is None:
+            continue
+        if body_position == "Jatuh" and first_jatuh is None:
+            first_jatuh = frame
+        events = state.update(body_position, furniture if body_position == "Jatuh" else None, t,
+                              kps, FRAME_SHAPE[0])
+        if "fall_start" in events and alert is None:
+            alert = frame
+    return (None if alert is None else float(times[alert])), first_jatuh, alert
+
+
+def evaluate_synthetic(rates):
+    rows = []
+    for fps in rates:
+        for name, (is_fall, furniture, phases) in SCENARIOS.items():
+            keypoints, times = synthetic_sequence(phases, fps)
+            onset = phases[0][1]
+            row = {'scenario': name, 'fps': fps, 'is_fall': is_fall}
+            for label, velocity in (('posture', False), ('velocity', True)):
+                alert_at, first_jatuh, alert = run_sequence(keypoints, times, furniture, velocity)
+                row[label] = {
+                    'alert': alert_at is not None,
+                    'time_to_alert': None if alert_at is None else round(alert_at - onset, 3),
+                    'frames_after_jatuh': None if alert is None else alert - first_jatuh
+                }
+            rows.append(row)
+    return rows
+
+
+def evaluate_clip(path, pose_model):
+    """Alert times (video seconds) of both logics for every track in a clip."""
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    tracker = PersonTracker()
+    states = {}  # track id: {'posture': FallState, 'velocity': FallState}
+    alerts = {'posture': [], 'velocity': []}
+    index = 0
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        timestamp = index / fps
+        index += 1
+        boxes, keypoints = pose_arrays(pose_model(frame, verbose=False)[0])
+        codes, _ = classify_postures(keypoints, frame.shape)
+        for track, d in tracker.update(boxes, keypoints[..., :2], timestamp)[0]:
+            body_position = POSTURE_NAMES[int(codes[d])]
+            if body_position is None:
+                continue
+            pair = states.setdefault(track.id, {label: FallState(now=timestamp, velocity=label == 'velocity')
+                                                for label in alerts})
+            for label, state in pair.items():
+                if "fall_start" in state.update(body_position, None, timestamp, keypoints[d], frame.shape[0]):
+                    alerts[label].append({'track': track.id, 'time': round(timestamp, 3)})
+    capture.release()
+    return {'clip': path, 'frames': index, 'fps': fps, 'alerts': alerts}
+
+
+def print_synthetic(rows):
+    print(f"{'skenario':<16} {'fps':>4} {'jatuh':>6} {'posture (s)':>12} {'velocity (s)':>13} "
+          f"{'frame posture':>14} {'frame velocity':>15}")
+    for row in rows:
+        cells = []
+        for label in ('posture', 'velocity'):
+            tta = row[label]['time_to_alert']
+            cells.append('-' if tta is None else f"{tta:.2f}")
+        frames = [row[label]['frames_after_jatuh'] for label in ('posture', 'velocity')]
+        print(f"{row['scenario']:<16} {row['fps']:>4} {'ya' if row['is_fall'] else 'tidak':>6} {cells[0]:>12} "
+              f"{cells[1]:>13} {'-' if frames[0] is None else frames[0]:>14} "
+              f"{'-' if frames[1] is None else frames[1]:>15}")
+
+
+def summary(rows):
+    result = {}
+    for label in ('posture', 'velocity'):
+        falls = [row[label] for row in rows if row['is_fall']]
+        detected = [r['time_to_alert'] for r in falls if r['alert']]
+        result[label] = {
+            'falls_detected': f"{len(detected)}/{len(falls)}",
+            'mean_time_to_alert': round(float(np.mean(detected)), 3) if detected else None,
+            'false_alerts': sum(row[label]['alert'] for row in rows if not row['is_fall'])
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bandingkan waktu sampai alarm: logika postur vs kecepatan keypoint.")
+    parser.add_argument("--fps", default="10,15,30", help="frame rate skenario sintetis, dipisah koma")
+    parser.add_argument("--clip", action="append", default=[], help="clip video (boleh lebih dari satu)")
+    parser.add_argument("--pose-model", default="yolov8n-pose.pt")
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    rows = evaluate_synthetic([float(v) for v in args.fps.split(',')])
+    print_synthetic(rows)
+    report = {'synthetic': rows, 'summary': summary(rows), 'clips': []}
+    print()
+    for label, result in report['summary'].items():
+        print(f"{label:<9} jatuh terdeteksi {result['falls_detected']}, rata-rata waktu sampai alarm "
+              f"{result['mean_time_to_alert']} s, alarm palsu {result['false_alerts']}")
+
+    if args.clip:
+        from models import load_model
+        pose_model = load_model(args.pose_model)
+        for path in args.clip:
+            clip = evaluate_clip(path, pose_model)
+            report['clips'].append(clip)
+            print(f"\n{path} ({clip['frames']} frame)")
+            for label, alerts in clip['alerts'].items():
+                times = ", ".join(f"#{a['track']} {a['time']:.2f}s" for a in alerts) or "tidak ada"
+                print(f"  {label:<9} alarm: {times}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nHasil disimpan ke {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Persistent event history in SQLite.
+
+Posture changes, falls, sleep and long-activity events used to live only in
+the in-memory state, so a restart lost everything and shift reports had no
+history. EventStore appends them to an SQLite table indexed on (camera, ts).
+
+record() only puts the event on a bounded queue; a single writer thread
+commits them in batches (one transaction per EVENT_BATCH events or
+EVENT_FLUSH seconds), so the frame loops of many cameras never wait on the
+disk. If the writer cannot keep up, new events are dropped and counted
+rather than blocking detection. Readers use their own connections and
+WAL mode, so /events queries do not block the writer either.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+EVENT_DB = os.environ.get("EVENT_DB", "events.db")
+EVENT_BATCH = 200  # events per transaction
+EVENT_FLUSH = 1.0  # seconds before a partial batch is committed
+EVENT_QUEUE = 10000  # events waiting for the writer before new ones are dropped
+MAX_PAGE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    event TEXT NOT NULL,
+    track INTEGER,
+    posture TEXT,
+    furniture TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events (camera, ts);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+"""
+
+
+def parse_time(value):
+    """Unix seconds or ISO 8601 ("2024-05-01T22:00") from a query parameter; ValueError if neither."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class EventStore:
+    """Append-only event table with batched asynchronous writes."""
+
+    def __init__(self, path=EVENT_DB, batch_size=EVENT_BATCH, flush_interval=EVENT_FLUSH, max_queue=EVENT_QUEUE):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name="event-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, camera, event, ts=None, track=None, posture=None, furniture=None, **data):
+        """Queue one event for writing; never blocks."""
+        row = (time.time() if ts is None else ts, camera, event, track, posture, furniture,
+               json.dumps(data) if data else None)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5.0):
+        """Write everything still queued and stop the writer."""
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def query(self, camera=None, events=None, since=None, until=None, limit=100, cursor=None, descending=False):
+        """Return (rows, next_cursor) for a time-range/type query, oldest first unless descending.
+
+        events is a list of event types. cursor is the next_cursor of the
+        previous page; next_cursor is None on the last page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE))
+        where, params = self._filters(camera, events, since, until)
+        if cursor:
+            ts, row_id = cursor.split(":")
+            op = "<" if descending else ">"
+            where.append(f"(ts {op} ? OR (ts = ? AND id {op} ?))")
+            params += [float(ts), float(ts), int(row_id)]
+        order = "DESC" if descending else "ASC"
+        sql = ("SELECT id, ts, camera, event, track, posture, furniture, data FROM events"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + f" ORDER BY ts {order}, id {order} LIMIT ?")
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+        next_cursor = f"{rows[limit - 1][1]!r}:{rows[limit - 1][0]}" if len(rows) > limit else None
+        return [self._as_dict(row) for row in rows[:limit]], next_cursor
+
+    def counts(self, camera=None, events=None, since=None, until=None):
+        """Number of events per camera and type, e.g. for a shift report."""
+        where, params = self._filters(camera, events, since, until)
+        sql = ("SELECT camera, event, COUNT(*) FROM events"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + " GROUP BY camera, event")
+        counts = {}
+        with self._connect() as conn:
+            for cam, event, count in conn.execute(sql, params):
+                counts.setdefault(cam, {})[event] = count
+        return counts
+
+    def stats(self):
+        return {
+            'events_written': self.written,
+            'events_dropped': self.dropped,
+            'events_queued': self._queue.qsize()
+        }
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def _filters(camera, events, since, until):
+        where, params = [], []
+        if camera is not None:
+            where.append("camera = ?")
+            params.append(camera)
+        if events:
+            where.append(f"event IN ({', '.join('?' * len(events))})")
+            params += list(events)
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        return where, params
+
+    @staticmethod
+    def _as_dict(row):
+        row_id, ts, camera, event, track, posture, furniture, data = row
+        result = {'id': row_id, 'ts': ts, 'camera': camera, 'event': event, 'track': track,
+                  'posture': posture, 'furniture': furniture}
+        if data:
+            result.update(json.loads(data))
+        return result
+
+    def _write_loop(self):
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, far fewer fsyncs per batch
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if not batch:
+                continue
+            try:
+                with conn:
+                    conn.executemany("INSERT INTO events (ts, camera, event, track, posture, furniture, data) "
+                                     "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                self.written += len(batch)
+            except sqlite3.Error as e:
+                self.dropped += len(batch)
+                print(f"[!] Gagal menyimpan {len(batch)} event: {e}")
+        conn.close()
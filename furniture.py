@@ -0,0 +1,208 @@
+"""
+Cached furniture map for the segmentation model.
+
+Chairs, couches, beds and tables barely move in a patient room, so instead of
+running seg_model on every frame we keep the last furniture map and only
+refresh it at a low cadence or when a cheap scene-change check (thumbnail
+differencing outside the person's box) says the room layout changed.
+
+Each map keeps its instance masks at 1/MASK_SCALE of the frame resolution
+with one summed-area table per instance, so the overlap of every person
+with every piece of furniture is a handful of array lookups.
+
+Segmentation masks only cover what is visible: a bed segmented while the
+patient lies on it has a hole (or a bite out of its edge) exactly where
+the body is. Every mask is therefore filled to its convex hull, so a
+person lying on the furniture still counts as covered by it.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+
+BED_LIKE_CLASSES = {
+    56: 'chair',
+    57: 'couch',
+    59: 'bed',
+    60: 'dining_table'
+}
+
+THUMB_SIZE = (64, 48)  # (w, h) of the scene-change thumbnail
+PIXEL_DIFF = 25  # grey-level difference that counts as a changed pixel
+MASK_SCALE = 8  # furniture masks are kept at 1/MASK_SCALE of the frame resolution
+
+
+class FurnitureMap:
+    """Furniture instances found by one segmentation pass."""
+
+    def __init__(self, class_ids, confs, boxes, masks=None):
+        self.class_ids = class_ids  # (N,) int
+        self.confs = confs  # (N,) float
+        self.boxes = boxes  # (N, 4) xyxy in frame pixels
+        self.masks = None if masks is None else _convex_fill(masks)  # (N, h, w) bool at 1/MASK_SCALE, or None
+        self._integral = None
+
+    def __len__(self):
+        return len(self.class_ids)
+
+    def names(self):
+        return [BED_LIKE_CLASSES[int(c)] for c in self.class_ids]
+
+    def overlap(self, regions):
+        """Fraction of each (P, 4) xyxy region covered by each instance, as a (P, N) array.
+
+        Uses the instance masks when there are any, the boxes otherwise.
+        """
+        regions = np.asarray(regions, dtype=np.float32).reshape(-1, 4)
+        if len(self) == 0 or len(regions) == 0:
+            return np.zeros((len(regions), len(self)), dtype=np.float32)
+        if self.masks is None:
+            return self._box_overlap(regions)
+
+        if self._integral is None:
+            n, h, w = self.masks.shape
+            self._integral = np.zeros((n, h + 1, w + 1), dtype=np.int32)
+            self._integral[:, 1:, 1:] = self.masks.cumsum(1, dtype=np.int32).cumsum(2)
+        h, w = self.masks.shape[1:]
+
+        # regions in mask cells, at least one cell each
+        x1 = np.clip(np.floor(regions[:, 0] / MASK_SCALE), 0, w - 1).astype(int)
+        y1 = np.clip(np.floor(regions[:, 1] / MASK_SCALE), 0, h - 1).astype(int)
+        x2 = np.clip(np.ceil(regions[:, 2] / MASK_SCALE), x1 + 1, w).astype(int)
+        y2 = np.clip(np.ceil(regions[:, 3] / MASK_SCALE), y1 + 1, h).astype(int)
+
+        ii = self._integral
+        covered = ii[:, y2, x2] - ii[:, y1, x2] - ii[:, y2, x1] + ii[:, y1, x1]  # (N, P)
+        return (covered / ((x2 - x1) * (y2 - y1))).T.astype(np.float32)
+
+    def _box_overlap(self, regions):
+        top_left = np.maximum(regions[:, None, :2], self.boxes[None, :, :2])
+        bottom_right = np.minimum(regions[:, None, 2:], self.boxes[None, :, 2:])
+        inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+        area = np.prod(np.clip(regions[:, 2:] - regions[:, :2], 1e-6, None), axis=1)
+        return (inter / area[:, None]).astype(np.float32)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=int), np.zeros(0, dtype=np.float32), np.zeros((0, 4), dtype=np.float32))
+
+    @classmethod
+    def from_results(cls, result):
+        """Build a map from one ultralytics Results, keeping only BED_LIKE_CLASSES.
+
+        The masks are rasterised from the mask polygons, which are already in
+        frame coordinates, so letterbox padding of the model input does not
+        shift them. Instances without a polygon fall back to their box.
+        """
+        if result.boxes is None or len(result.boxes) == 0:
+            return cls.empty()
+        class_ids = result.boxes.cls.cpu().numpy().astype(int)
+        keep = np.isin(class_ids, list(BED_LIKE_CLASSES))
+        boxes = result.boxes.xyxy.cpu().numpy()[keep]
+
+        h, w = result.orig_shape[:2]
+        masks = np.zeros((len(boxes), -(-h // MASK_SCALE), -(-w // MASK_SCALE)), dtype=np.uint8)
+        polygons = [result.masks.xy[i] for i in np.flatnonzero(keep)] if result.masks is not None else []
+        for i, (x1, y1, x2, y2) in enumerate(boxes):
+            if i < len(polygons) and len(polygons[i]) >= 3:
+                cv2.fillPoly(masks[i], [np.round(polygons[i] / MASK_SCALE).astype(np.int32)], 1)
+            else:
+                masks[i, int(y1) // MASK_SCALE:-(-int(y2) // MASK_SCALE),
+                      int(x1) // MASK_SCALE:-(-int(x2) // MASK_SCALE)] = 1
+
+        return cls(class_ids[keep],
+                   result.boxes.conf.cpu().numpy()[keep],
+                   boxes,
+                   masks.astype(bool))
+
+
+def _convex_fill(masks):
+    """(N, h, w) bool masks, each filled to the convex hull of its pixels (closes occlusion holes)."""
+    filled = np.zeros(masks.shape, dtype=np.uint8)
+    for i, mask in enumerate(masks):
+        points = cv2.findNonZero(mask.astype(np.uint8))
+        if points is not None:
+            cv2.fillConvexPoly(filled[i], cv2.convexHull(points), 1)
+    return filled.astype(bool)
+
+
+class FurnitureCache:
+    """Serve the furniture map from cache and refresh it only when needed."""
+
+    def __init__(self, seg_model, conf=0.3, refresh_interval=60.0, change_fraction=0.15):
+        self.seg_model = seg_model
+        self.conf = conf
+        self.refresh_interval = refresh_interval  # seconds, low-cadence refresh
+        self.change_fraction = change_fraction  # share of changed pixels that invalidates the map
+        self.furniture = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+        self._ref_thumb = None
+        self._ref_person_boxes = ()
+        self._updated_at = 0.0
+        self._seg_seconds = metrics.SEG_SECONDS.labels()
+
+    def get(self, frame, person_boxes=(), now=None):
+        """Return the FurnitureMap for frame, running segmentation only if stale.
+
+        person_boxes ((N, 4) xyxy) are excluded from the scene-change check so
+        people moving around do not invalidate the map.
+        """
+        now = time.time() if now is None else now
+        thumb = self._thumbnail(frame)
+
+        if self.furniture is None:
+            self.misses += 1
+        elif now - self._updated_at >= self.refresh_interval or self._scene_changed(thumb, frame.shape, person_boxes):
+            self.refreshes += 1
+        else:
+            self.hits += 1
+            return self.furniture
+
+        self.furniture = self._segment(frame)
+        self._ref_thumb = thumb
+        self._ref_person_boxes = person_boxes
+        self._updated_at = now
+        return self.furniture
+
+    def invalidate(self):
+        self.furniture = None
+
+    def stats(self):
+        return {
+            'furniture_cache_hits': self.hits,
+            'furniture_cache_misses': self.misses,
+            'furniture_cache_refreshes': self.refreshes
+        }
+
+    def _segment(self, frame):
+        started = time.perf_counter()
+        try:
+            seg_results = self.seg_model(frame, conf=self.conf, verbose=False)
+            return FurnitureMap.from_results(seg_results[0])
+        except Exception:
+            return FurnitureMap.empty()
+        finally:
+            self._seg_seconds.observe(time.perf_counter() - started)
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _scene_changed(self, thumb, frame_shape, person_boxes):
+        changed = cv2.absdiff(thumb, self._ref_thumb) > PIXEL_DIFF
+        valid = np.ones_like(changed)
+        sx = THUMB_SIZE[0] / frame_shape[1]
+        sy = THUMB_SIZE[1] / frame_shape[0]
+        for boxes in (person_boxes, self._ref_person_boxes):
+            for x1, y1, x2, y2 in boxes:
+                valid[max(int(y1 * sy), 0):int(np.ceil(y2 * sy)), max(int(x1 * sx), 0):int(np.ceil(x2 * sx))] = False
+        n_valid = valid.sum()
+        if n_valid == 0:
+            return False
+        return np.count_nonzero(changed & valid) / n_valid > self.change_fraction
@@ -0,0 +1,86 @@
+"""
+Short keypoint history per tracked person, for motion-aware fall detection.
+
+The posture ratio only looks at one frame, so a sudden fall and a slow
+slide to the floor look the same to it. KeypointHistory keeps the last
+HISTORY_SIZE keypoint sets of one person with their timestamps in
+preallocated arrays (push() copies into the next slot, nothing is allocated
+per frame) and measures how fast the hips and head went down:
+
+    velocity     = d(y / frame_height) / dt     frame heights per second, down positive
+    acceleration = d(velocity) / dt
+
+A real fall shows both hips and head dropping fast and then stopping
+(strong deceleration on impact); sitting down, bending over or lying down
+carefully do not.
+"""
+
+import numpy as np
+
+from posture import HEAD_KEYPOINTS, MIN_KEYPOINT_CONF
+
+HISTORY_SIZE = 32  # keypoint sets kept per person (about 1 s at 30 fps, longer at lower rates)
+DESCENT_WINDOW = 1.0  # seconds of history a descent is looked for in
+HIP_KEYPOINTS = np.array([11, 12])
+
+
+class KeypointHistory:
+    """Ring buffer of (17, 3) keypoints and timestamps for one person."""
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.keypoints = np.zeros((size, 17, 3), dtype=np.float32)
+        self.times = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self._next = 0
+
+    def push(self, keypoints, timestamp):
+        """Store one (17, 3) keypoint set (x, y, confidence) seen at timestamp."""
+        self.keypoints[self._next] = keypoints
+        self.times[self._next] = timestamp
+        self._next = (self._next + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def descent(self, now, frame_height, window=DESCENT_WINDOW):
+        """How fast hips and head went down over the last window seconds.
+
+        Returns (peak_velocity, current_velocity, impact), where the
+        velocities are the slower of hips and head (both must fall) in frame
+        heights per second, and impact is the strongest deceleration after
+        the peak (frame heights/s², positive). All zero with fewer than three
+        usable samples.
+        """
+        if self.count < 3:
+            return 0.0, 0.0, 0.0
+        # chronological slot order, oldest first
+        order = (self._next - self.count + np.arange(self.count)) % len(self.times)
+        order = order[self.times[order] >= now - window]
+        if len(order) < 3:
+            return 0.0, 0.0, 0.0
+
+        keypoints = self.keypoints[order]
+        times = self.times[order]
+        hips = _mean_y(keypoints, HIP_KEYPOINTS) / frame_height
+        head = _mean_y(keypoints, HEAD_KEYPOINTS) / frame_height
+        usable = ~(np.isnan(hips) | np.isnan(head))
+        usable[usable] &= np.diff(times[usable], prepend=-np.inf) > 0  # drop repeated timestamps
+        if usable.sum() < 3:
+            return 0.0, 0.0, 0.0
+
+        times = times[usable]
+        velocity = np.minimum(np.gradient(hips[usable], times), np.gradient(head[usable], times))
+        peak = int(np.argmax(velocity))
+        acceleration = np.gradient(velocity, times)
+        impact = -float(acceleration[peak:].min())
+        return float(velocity[peak]), float(velocity[-1]), max(impact, 0.0)
+
+    def clear(self):
+        self.count = 0
+        self._next = 0
+
+
+def _mean_y(keypoints, indices, min_conf=MIN_KEYPOINT_CONF):
+    """(T,) mean y of the confident keypoints in indices, NaN where none is confident."""
+    y = keypoints[:, indices, 1]
+    ok = keypoints[:, indices, 2] >= min_conf
+    count = ok.sum(1)
+    return np.where(count > 0, (y * ok).sum(1) / np.maximum(count, 1), np.nan)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Load test for the web server: many MJPEG viewers plus status clients.
+
+For every viewer count it opens that many /video_feed streams at once,
+together with SSE /status_stream clients and tabs polling /fall_status
+every 600 ms like the old dashboard, and reports per step:
+
+- frames per second received by each viewer (mean and worst viewer)
+- gap between frames p50/p95/p99 (ms) and time to the first frame
+- /fall_status latency p50/p95/p99 (ms) under that load
+- connections that failed or were cut
+
+Works against both servers, so they can be compared on the same box:
+
+    python app.py                     # Flask, then:
+    python loadtest.py --viewers 1,10,50,100 --json flask.json
+    python asgi_app.py                # ASGI, then:
+    python loadtest.py --viewers 1,10,50,100,200,400 --json asgi.json
+
+Uses plain asyncio sockets, so it needs nothing beyond the standard
+library and numpy. Several hundred connections may need `ulimit -n 4096`.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+BOUNDARY = b'--frame\r\n'
+POLL_INTERVAL = 0.6  # the dashboard's old /fall_status polling period
+
+
+def percentiles(samples):
+    """p50/p95/p99 of durations (seconds) in milliseconds."""
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000.0
+    return {
+        'p50_ms': round(float(np.percentile(ms, 50)), 1),
+        'p95_ms': round(float(np.percentile(ms, 95)), 1),
+        'p99_ms': round(float(np.percentile(ms, 99)), 1)
+    }
+
+
+async def open_get(host, port, path):
+    """Send a GET and return (reader, writer, status code) after the response headers."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    headers = await reader.readuntil(b'\r\n\r\n')
+    return reader, writer, int(headers.split(b' ', 2)[1])
+
+
+async def viewer(host, port, path, stop_at, result):
+    """Read one MJPEG stream until stop_at, recording when each frame starts."""
+    started = time.perf_counter()
+    arrivals = []
+    writer = None
+    try:
+        reader, writer, status = await open_get(host, port, path)
+        if status != 200:
+            raise ConnectionError(f"HTTP {status}")
+        tail = b''
+        while time.perf_counter() < stop_at:
+            chunk = await asyncio.wait_for(reader.read(65536), max(stop_at - time.perf_counter(), 0.01))
+            if not chunk:
+                raise ConnectionError("stream closed")
+            data = tail + chunk
+            now = time.perf_counter()
+            arrivals.extend([now] * data.count(BOUNDARY))
+            # a boundary split over two reads is counted once, on the second read
+            tail = data[-(len(BOUNDARY) - 1):]
+    except asyncio.TimeoutError:
+        pass
+    except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+        result['errors'] += 1
+    finally:
+        if writer is not None:
+            writer.close()
+    if arrivals:
+        result['first_frame'].append(arrivals[0] - started)
+        result['gaps'].extend(np.diff(arrivals).tolist())
+    result['fps'].append(len(arrivals) / max(stop_at - started, 1e-6))
+
+
+async def sse_client(host, port, path, stop_at, result):
+    """Hold one status stream open and count its events."""
+    writer = None
+    try:
+        reader, writer, status = await open_get(host, port, path)
+        if status != 200:
+            raise ConnectionError(f"HTTP {status}")
+        while time.perf_counter() < stop_at:
+            chunk = await asyncio.wait_for(reader.read(65536), max(stop_at - time.perf_counter(), 0.01))
+            if not chunk:
+                raise ConnectionError("stream closed")
+            result['sse_events'] += chunk.count(b'event: ')
+    except asyncio.TimeoutError:
+        pass
+    except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+        result['errors'] += 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def poller(host, port, path, stop_at, result):
+    """Poll /fall_status like a dashboard tab and record each request's latency."""
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        writer = None
+        try:
+            reader, writer, status = await asyncio.wait_for(open_get(host, port, path), 10)
+            await asyncio.wait_for(reader.read(), 10)
+            if status != 200:
+                raise ConnectionError(f"HTTP {status}")
+            result['poll_latency'].append(time.perf_counter() - started)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            result['errors'] += 1
+        finally:
+            if writer is not None:
+                writer.close()
+        await asyncio.sleep(max(POLL_INTERVAL - (time.perf_counter() - started), 0))
+
+
+async def run_step(args, host, port, viewers):
+    result = {'fps': [], 'gaps': [], 'first_frame': [], 'poll_latency': [], 'sse_events': 0, 'errors': 0}
+    suffix = f"/{args.camera}" if args.camera else ""
+    stop_at = time.perf_counter() + args.duration
+    tasks = [viewer(host, port, f"/video_feed{suffix}?quality={args.quality}", stop_at, result)
+             for _ in range(viewers)]
+    tasks += [sse_client(host, port, f"/status_stream{suffix}", stop_at, result)
+              for _ in range(int(viewers * args.sse_ratio))]
+    tasks += [poller(host, port, f"/fall_status{suffix}", stop_at, result)
+              for _ in range(max(int(viewers * args.poll_ratio), 1))]
+    await asyncio.gather(*tasks)
+
+    fps = np.asarray(result['fps']) if result['fps'] else np.zeros(1)
+    return {
+        'viewers': viewers,
+        'fps_mean': round(float(fps.mean()), 2),
+        'fps_min': round(float(fps.min()), 2),
+        'frame_gap': percentiles(result['gaps']),
+        'first_frame': percentiles(result['first_frame']),
+        'status_latency': percentiles(result['poll_latency']),
+        'status_polls': len(result['poll_latency']),
+        'sse_events': result['sse_events'],
+        'errors': result['errors']
+    }
+
+
+def print_step(step):
+    gap = step['frame_gap'] or {}
+    status = step['status_latency'] or {}
+    print(f"{step['viewers']:>7} {step['fps_mean']:>8.2f} {step['fps_min']:>8.2f} "
+          f"{gap.get('p95_ms', '-'):>10} {status.get('p50_ms', '-'):>10} {status.get('p95_ms', '-'):>10} "
+          f"{step['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test stream dan status server deteksi jatuh.")
+    parser.add_argument("--url", default="http://localhost:9000")
+    parser.add_argument("--viewers", default="1,10,50,100", help="jumlah viewer per tahap, dipisah koma")
+    parser.add_argument("--duration", type=float, default=10.0, help="detik per tahap")
+    parser.add_argument("--camera", help="nama kamera (default kamera pertama)")
+    parser.add_argument("--quality", default="half", help="full, half atau thumb")
+    parser.add_argument("--sse-ratio", type=float, default=1.0, help="client /status_stream per viewer")
+    parser.add_argument("--poll-ratio", type=float, default=0.1, help="tab yang polling /fall_status per viewer")
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    print(f"{'viewers':>7} {'fps':>8} {'fps_min':>8} {'gap_p95':>10} {'stat_p50':>10} {'stat_p95':>10} {'errors':>6}")
+    steps = []
+    for viewers in [int(v) for v in args.viewers.split(',')]:
+        step = asyncio.run(run_step(args, host, port, viewers))
+        print_step(step)
+        steps.append(step)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'url': args.url, 'duration': args.duration, 'quality': args.quality, 'steps': steps},
+                      f, indent=2)
+        print(f"Hasil disimpan: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
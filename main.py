@@ -2,10 +2,16 @@ from ultralytics import YOLO
 import cv2
 import time
 import os
-import pygame
 import numpy as np
 import warnings
 
+from alerts import create_dispatcher
+from capture import FrameGrabber
+from detection import draw_furniture, furniture_under, pose_arrays
+from furniture import FurnitureMap
+from posture import POSTURE_NAMES, UNKNOWN, classify_postures
+from tracker import PersonTracker
+
 warnings.filterwarnings('ignore')
 
 # Load model YOLO pose
@@ -20,8 +26,12 @@ else:
     seg_model = None
     print("Peringatan: Segmentation model not found")
 
-# Buka kamera (0 = default webcam)
-cap = cv2.VideoCapture(0)
+# Buka kamera (0 = default webcam) di thread terpisah, hanya frame terbaru yang diproses.
+# Kamera yang gagal dibuka ulang CAMERA_MAX_FAILURES kali berturut-turut menghentikan aplikasi
+CAMERA_MAX_FAILURES = 5
+grabber = FrameGrabber(0, max_failures=CAMERA_MAX_FAILURES).start()
+# ID track orang yang diamati, supaya alert dikelompokkan per orang (lihat alerts.py)
+tracker = PersonTracker()
 
 print("🔍 Sistem AI Fall Detection with Furniture Detection aktif. Tekan Q untuk berhenti.")
 print("=" * 70)
@@ -29,96 +39,62 @@ print("=" * 70)
 # Variabel pelacakan posisi dan waktu
 last_pose = None
 pose_start_time = time.time()
-# Audio / alert state
+# Alert state
 alert_playing = False
-music_loaded = False
 FALL_CONFIRM = 0.5     # detik untuk konfirmasi jatuh sebelum suara menyala
 RECOVER_CONFIRM = 0.5  # detik untuk konfirmasi recovery sebelum suara mati
 fall_start_time = None
 recover_start_time = None
+alert_track = None  # track yang membuka alert, fall_end dikirim untuk track yang sama
 
-# Path file audio peringatan
-alert_sound = os.path.join("assets", "Efek suara jatuh.mp3")
-
-# Inisialisasi pygame mixer untuk kontrol play/stop
-try:
-    pygame.mixer.init()
-    if os.path.exists(alert_sound):
-        try:
-            pygame.mixer.music.load(alert_sound)
-            music_loaded = True
-        except Exception as e:
-            print(f"[!] Gagal memuat file audio: {e}")
-    else:
-        print(f"[!] File audio tidak ditemukan: {alert_sound}")
-except Exception as e:
-    print(f"[!] Gagal inisialisasi audio: {e}")
-
-# Kelas furniture yang dicari
-BED_LIKE_CLASSES = {
-    56: 'chair',
-    57: 'couch',
-    59: 'bed',
-    60: 'dining_table'
-}
+# Alert dikirim di thread sendiri (suara, webhook, log), frame loop tidak pernah menunggu.
+# Default di sini: suara lokal + log; webhook jika ALERT_WEBHOOK diisi (lihat alerts.py)
+alerts = create_dispatcher(os.environ.get("ALERT_SINKS", "sound,log,webhook"))
+if alerts is None:
+    print("[!] Tidak ada sink alert yang aktif")
 
 while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
+    frame, _ = grabber.read(timeout=1.0)
+    if frame is None:
+        if grabber.failed:
+            print("❌ Kamera tidak bisa dibuka, aplikasi dihentikan")
+            break
+        continue
 
     # Deteksi pose
     pose_results = pose_model(frame, verbose=False)
     annotated_frame = pose_results[0].plot()
 
-    # Jika ada orang terdeteksi
-    if len(pose_results[0].keypoints) > 0:
-        person = pose_results[0].keypoints.xy[0].cpu().numpy()  # Convert to numpy
-        y_points = person[:, 1]
+    # Klasifikasi posisi semua orang sekaligus, pakai orang pertama yang kepala & kakinya terlihat
+    boxes, keypoints = pose_arrays(pose_results[0])
+    codes, _ = classify_postures(keypoints, frame.shape)
+    known = np.flatnonzero(codes != UNKNOWN)
+    matches, _ = tracker.update(boxes, keypoints[..., :2], time.time())
+    track_ids = {d: track.id for track, d in matches}
 
-        head_y = y_points[0]
-        foot_y = y_points[-1]
-        frame_height = frame.shape[0]
-        ratio = (foot_y - head_y) / frame_height
+    # Jika ada orang terdeteksi
+    if len(known) > 0:
+        person = keypoints[known[0]]
+        track_id = track_ids[known[0]]
 
         # Tentukan kondisi pose dasar
-        if ratio > 0.45:
-            body_position = "Berdiri"
-        elif 0.25 <= ratio <= 0.45:
-            body_position = "Duduk"
-        else:
-            body_position = "Jatuh"
+        body_position = POSTURE_NAMES[int(codes[known[0]])]
 
-        # Cek apakah ada furniture di bawah orang
+        # Cek apakah ada furniture di bawah orang (mask furniture vs badan orang)
         on_furniture = False
         furniture_name = None
-        person_center_x = np.mean(person[:, 0])
-        person_center_y = np.mean(person[:, 1])
 
         # Deteksi segmentasi untuk furniture
         if seg_model is not None:
             try:
                 seg_results = seg_model(frame, conf=0.3, verbose=False)
-                
-                if len(seg_results[0].boxes) > 0:
-                    for idx, box in enumerate(seg_results[0].boxes):
-                        class_id = int(box.cls[0])
-                        conf = float(box.conf[0])
-                        
-                        if class_id in BED_LIKE_CLASSES:
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            
-                            # Gambar bounding box furniture
-                            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                            cv2.putText(annotated_frame, f"{BED_LIKE_CLASSES[class_id]} ({conf:.2f})", 
-                                      (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                            
-                            # Check jika orang berada di atas furniture
-                            if x1 <= person_center_x <= x2 and y1 <= person_center_y <= y2:
-                                on_furniture = True
-                                furniture_name = BED_LIKE_CLASSES[class_id]
-                                print(f"Orang di atas: {furniture_name}")
-                                break
+                furniture = FurnitureMap.from_results(seg_results[0])
+                draw_furniture(annotated_frame, furniture)
+
+                furniture_name = furniture_under(person[None], furniture)[0]
+                if furniture_name is not None:
+                    on_furniture = True
+                    print(f"Orang di atas: {furniture_name}")
             except Exception as e:
                 print(f"Peringatan: Error segmentasi: {e}")
 
@@ -142,16 +118,15 @@ while True:
                 fall_start_time = time.time()
                 recover_start_time = None
 
-            # Jika jatuh terkonfirmasi selama lebih dari FALL_CONFIRM, nyalakan audio
+            # Jika jatuh terkonfirmasi selama lebih dari FALL_CONFIRM, kirim alert
+            # (sink suara memutar audio terus selama masih jatuh)
             if fall_start_time and (time.time() - fall_start_time) >= FALL_CONFIRM:
-                if not alert_playing and music_loaded:
-                    try:
-                        # main loop audio (ulang terus) agar terdengar selama masih jatuh
-                        pygame.mixer.music.play(loops=-1)
-                        alert_playing = True
-                        print("JATUH TERDETEKSI - Audio ON")
-                    except Exception as e:
-                        print(f"[!] Gagal memutar audio: {e}")
+                if not alert_playing:
+                    alert_playing = True
+                    alert_track = track_id
+                    if alerts is not None:
+                        alerts.send("kamera", "fall_start", track=alert_track, posture="Jatuh")
+                    print("JATUH TERDETEKSI - Alert ON")
 
             pose_start_time = time.time()  # reset timer
 
@@ -162,12 +137,10 @@ while True:
             
             # Stop alarm jika sedang aktif
             if alert_playing:
-                try:
-                    pygame.mixer.music.stop()
-                    alert_playing = False
-                    print("Tidur terdeteksi - Audio OFF")
-                except Exception as e:
-                    print(f"[!] Gagal stop audio: {e}")
+                alert_playing = False
+                if alerts is not None:
+                    alerts.send("kamera", "fall_end", track=alert_track, posture="Tidur")
+                print("Tidur terdeteksi - Alert OFF")
 
         else:
             # --- Hitung durasi pose sama (untuk duduk/berdiri) ---
@@ -187,14 +160,12 @@ while True:
             if last_pose == "Jatuh" and current_pose != "Jatuh":
                 recover_start_time = time.time()
 
-            # Jika recovery terkonfirmasi selama lebih dari RECOVER_CONFIRM, matikan audio
+            # Jika recovery terkonfirmasi selama lebih dari RECOVER_CONFIRM, matikan alert
             if recover_start_time and (time.time() - recover_start_time) >= RECOVER_CONFIRM:
                 if alert_playing:
-                    try:
-                        pygame.mixer.music.stop()
-                    except Exception as e:
-                        print(f"[!] Gagal menghentikan audio: {e}")
                     alert_playing = False
+                    if alerts is not None:
+                        alerts.send("kamera", "fall_end", track=alert_track, posture=current_pose)
 
             # --- Tampilkan pose saat ini ---
             cv2.putText(annotated_frame, f"{current_pose}", (50, 100),
@@ -208,6 +179,13 @@ while True:
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
-cap.release()
+grabber.stop()
+stats = grabber.stats()
+print(f"Frame diambil: {stats['frames_captured']}, dilewati: {stats['frames_dropped']}")
+if alerts is not None:
+    alerts.close()
+    for name, sink in alerts.stats()['sinks'].items():
+        print(f"Alert {name}: terkirim {sink['delivered']}, gagal {sink['failed']}, "
+              f"latency p95 {sink.get('latency_p95_ms', '-')} ms")
 cv2.destroyAllWindows()
 print("🛑 Sistem berhenti.")
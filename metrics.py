@@ -0,0 +1,186 @@
+"""
+Minimal Prometheus-style metrics for the frame loop.
+
+Metrics are module-level objects (like prometheus_client). Callers fetch
+their child with labels(...) once at setup and keep it, so the hot path only
+does an attribute increment or a bisect into a preallocated bucket list.
+Each child is expected to have a single writer thread, so there is no lock.
+
+render() produces the Prometheus text exposition format for /metrics.
+"""
+
+import bisect
+import math
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+ALERT_BUCKETS = (0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+_REGISTRY = []
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _REGISTRY.append(self)
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Return (creating once) the child for these label values."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self._children.pop(tuple(str(v) for v in values), None)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._sample_lines(key, child))
+        return lines
+
+    def _sample_lines(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"]
+
+
+class _Value:
+    __slots__ = ('value', '_function')
+
+    def __init__(self):
+        self.value = 0.0
+        self._function = None
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead of storing it."""
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function is not None else self.value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _sample_lines(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render():
+    """Render every registered metric in Prometheus text format."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+FRAMES_CAPTURED = Counter('falldet_frames_captured_total', 'Frames read from the camera.', ['camera'])
+FRAMES_DROPPED = Counter('falldet_frames_dropped_total', 'Frames replaced before inference picked them up.', ['camera'])
+FRAMES_PROCESSED = Counter('falldet_frames_processed_total', 'Frames that went through detection.', ['camera'])
+FRAMES_RENDERED = Counter('falldet_frames_rendered_total', 'Frames drawn and encoded for viewers or snapshots.',
+                          ['camera'])
+STREAM_FPS = Gauge('falldet_stream_fps', 'Current processed frames per second.', ['camera'])
+VIEWERS = Gauge('falldet_viewers', 'Connected /video_feed viewers.', ['camera'])
+POSE_SKIPPED = Counter('falldet_pose_skipped_total', 'Frames the motion gate let reuse the previous pose result.',
+                       ['camera'])
+FRAME_ERRORS = Counter('falldet_frame_errors_total', 'Exceptions caught in the inference loop, by stage.',
+                       ['camera', 'stage'])
+POSE_SECONDS = Histogram('falldet_pose_inference_seconds', 'Batched pose_model call latency.')
+POSE_BATCH = Histogram('falldet_pose_batch_size', 'Frames per batched pose_model call.', buckets=(1, 2, 4, 8, 16))
+SEG_SECONDS = Histogram('falldet_seg_inference_seconds', 'seg_model call latency (furniture map refresh).')
+ENCODE_SECONDS = Histogram('falldet_encode_seconds', 'cv2.imencode latency per quality profile.', ['camera', 'profile'])
+DECISION_LATENCY = Histogram('falldet_capture_to_decision_seconds', 'Time from frame capture to fall decision.', ['camera'])
+RECORDER_BYTES = Gauge('falldet_recorder_buffer_bytes', 'Bytes held in the pre-event clip ring buffer.', ['camera'])
+CLIPS_WRITTEN = Counter('falldet_clips_written_total', 'Fall clips written to disk.', ['camera'])
+CLIPS_DROPPED = Counter('falldet_clips_dropped_total', 'Fall clips dropped because the writer fell behind.', ['camera'])
+FALL_ALERTS = Counter('falldet_fall_alerts_total', 'Confirmed fall alerts.', ['camera'])
+TIME_TO_ALERT = Histogram('falldet_time_to_alert_seconds', 'Time from first fall observation to confirmed alert.',
+                          ['camera'], buckets=ALERT_BUCKETS)
+ALERTS_DELIVERED = Counter('falldet_alerts_delivered_total', 'Alerts delivered per sink.', ['sink'])
+ALERTS_FAILED = Counter('falldet_alerts_failed_total', 'Alerts given up on after all retries.', ['sink'])
+ALERTS_DROPPED = Counter('falldet_alerts_dropped_total', 'Alerts dropped because the sink queue was full.', ['sink'])
+ALERTS_DEDUPLICATED = Counter('falldet_alerts_deduplicated_total', 'Alert events swallowed by an open incident.')
+ALERT_DELIVERY_SECONDS = Histogram('falldet_alert_delivery_seconds', 'Time from detection to delivered alert.',
+                                   ['sink'], buckets=ALERT_BUCKETS)
+WORKERS_ALIVE = Gauge('falldet_inference_workers_alive', 'Pose inference worker processes running (INFERENCE_WORKERS).')
+WORKER_RESTARTS = Counter('falldet_inference_worker_restarts_total', 'Pose inference workers restarted after a crash.')
+JOBS_LOST = Counter('falldet_inference_jobs_lost_total', 'Frames whose pose job was lost to a worker crash or timeout.')
+MODEL_READY = Gauge('falldet_model_ready', '1 once the model is loaded and warmed up.', ['model'])
+STARTUP_SECONDS = Gauge('falldet_startup_seconds', 'Process start until every model was ready (0 while starting).')
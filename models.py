@@ -0,0 +1,195 @@
+"""
+Model loading with optional CPU-optimised backends.
+
+Our boxes have no GPU, so eager PyTorch is the slowest way to run the
+models. With MODEL_BACKEND=onnx (ONNX Runtime) or MODEL_BACKEND=openvino the
+.pt weights are exported once next to the original file and the export is
+reused on every later start, until the .pt file changes. The exported models
+are still loaded through ultralytics.YOLO, so the Results (boxes, keypoints,
+masks) look exactly the same to the rest of the code.
+
+    MODEL_BACKEND=onnx python app.py
+
+MODEL_INT8=1 loads the INT8 export made by `python quantize.py export`
+instead, which needs calibration frames from our own footage and is
+therefore never created automatically.
+
+ModelLoad loads and warms up a model on a background thread, so the web
+server can come up at once and report each model's progress (/readyz).
+"""
+
+import os
+import threading
+import time
+import traceback
+
+import numpy as np
+from ultralytics import YOLO
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+BACKEND = os.environ.get("MODEL_BACKEND", "torch").lower()
+EXPORT_IMGSZ = int(os.environ.get("MODEL_IMGSZ", "640"))
+INT8 = os.environ.get("MODEL_INT8", "0").lower() in ("1", "true", "yes")
+
+POSE_MODEL_PATHS = (os.path.join("models", "yolov8n-pose.pt"), "yolov8n-pose.pt")
+SEG_MODEL_PATH = os.path.join("datasets", "coco8seg_test", "weights", "best.pt")
+
+
+def weights_file(weights):
+    """The .pt file for a weights path or an ultralytics model name."""
+    return weights if weights.endswith(".pt") else weights + ".pt"
+
+
+def exported_path(weights, backend, int8=False):
+    """Where ultralytics writes the export of weights for backend."""
+    stem, _ = os.path.splitext(weights)
+    if int8:
+        stem += "_int8"
+    if backend == 'onnx':
+        return stem + ".onnx"
+    if backend == 'openvino':
+        return stem + "_openvino_model"
+    return weights
+
+
+def backend_of(path):
+    """The backend a path from resolve_model loads with; tells an export apart from a PyTorch fallback."""
+    path = str(path).rstrip(os.sep)
+    if path.endswith(".onnx"):
+        return 'onnx'
+    if path.endswith("_openvino_model"):
+        return 'openvino'
+    return 'torch'
+
+
+def _is_fresh(export, weights):
+    if not os.path.exists(export):
+        return False
+    return not os.path.exists(weights) or os.path.getmtime(export) >= os.path.getmtime(weights)
+
+
+def load_model(weights, backend=None, task=None, imgsz=EXPORT_IMGSZ, int8=None):
+    """Load weights with the given backend, exporting and caching on first use.
+
+    weights is a .pt path or an ultralytics model name ("yolov8n-pose").
+    Falls back to PyTorch if the export fails (e.g. onnxruntime or openvino
+    is not installed), so a missing optional package never stops the app.
+    With int8 the quantized export is used if quantize.py has made one,
+    otherwise the FP32 model of the same backend.
+    """
+    return YOLO(resolve_model(weights, backend, task, imgsz, int8), task=task)
+
+
+def resolve_model(weights, backend=None, task=None, imgsz=EXPORT_IMGSZ, int8=None):
+    """Export weights for backend if needed and return the path YOLO() should load.
+
+    Split from load_model so the inference workers (workers.py) can export
+    once in the parent and only load the result in each process.
+    """
+    backend = (backend or BACKEND).lower()
+    int8 = INT8 if int8 is None else int8
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, choose from {', '.join(BACKENDS)}")
+    if backend == 'torch':
+        if int8:
+            print(" INT8 hanya tersedia untuk backend onnx/openvino, pakai PyTorch FP32")
+        return weights
+
+    weights = weights_file(weights)
+    if int8:
+        quantized = exported_path(weights, backend, int8=True)
+        if _is_fresh(quantized, weights):
+            return quantized
+        print(f" Model INT8 {quantized} belum ada, jalankan dulu: python quantize.py export <rekaman> --backend {backend}")
+
+    export = exported_path(weights, backend)
+    if not _is_fresh(export, weights):
+        print(f" Export {weights} ke {backend} (sekali saja, hasil disimpan di {export})")
+        try:
+            # dynamic batch so the Ward can still batch frames of all cameras
+            export = YOLO(weights, task=task).export(format=backend, imgsz=imgsz, dynamic=True, verbose=False)
+        except Exception as e:
+            print(f" Export {backend} gagal ({e}), pakai PyTorch")
+            return weights
+    return export
+
+
+def warm_up(model, frame_shape=(480, 640, 3), batch=1):
+    """Run one dummy inference so the first real frame is not slow.
+
+    Returns the warm-up time in seconds.
+    """
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+    started = time.perf_counter()
+    model([frame] * batch, verbose=False)
+    return time.perf_counter() - started
+
+
+class ModelLoad:
+    """Load and warm up one model on a background thread, keeping its state and timings.
+
+    state goes pending -> loading -> warming -> ready, or ends in failed;
+    a model that is not configured (e.g. no segmentation weights) is
+    disabled. on_ready(model) is called once the model is warm.
+    """
+
+    def __init__(self, name, load, warm=warm_up, on_ready=None, required=True, enabled=True):
+        self.name = name
+        self.required = required
+        self.state = 'pending' if enabled else 'disabled'
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._load = load
+        self._warm = warm
+        self._on_ready = on_ready
+        self._done = threading.Event()
+        if not enabled:
+            self._done.set()
+
+    def start(self):
+        if self.state == 'pending':
+            threading.Thread(target=self._run, name=f"load-{self.name}", daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        """Wait until the model is ready, failed or disabled; False on timeout."""
+        return self._done.wait(timeout)
+
+    @property
+    def usable(self):
+        """Ready, or an optional model that will not come (disabled or failed)."""
+        return self.state == 'ready' or (not self.required and self.state in ('disabled', 'failed'))
+
+    def as_dict(self):
+        return {
+            'state': self.state,
+            'required': self.required,
+            'load_seconds': None if self.load_seconds is None else round(self.load_seconds, 2),
+            'warmup_seconds': None if self.warmup_seconds is None else round(self.warmup_seconds, 3),
+            'error': self.error
+        }
+
+    def _run(self):
+        try:
+            self.state = 'loading'
+            started = time.perf_counter()
+            model = self._load()
+            self.load_seconds = time.perf_counter() - started
+            if self._warm is not None:
+                self.state = 'warming'
+                self.warmup_seconds = self._warm(model)
+            self.model = model
+            if self._on_ready is not None:
+                self._on_ready(model)
+            self.state = 'ready'
+            print(f" Model {self.name} siap: load {self.load_seconds:.1f} s, "
+                  f"warm-up {(self.warmup_seconds or 0) * 1000:.0f} ms")
+        except Exception as e:
+            self.state = 'failed'
+            self.error = str(e)
+            print(f" Error loading model {self.name}: {e}")
+            traceback.print_exc()
+        finally:
+            self._done.set()
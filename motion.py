@@ -0,0 +1,59 @@
+"""
+Motion gate for the pose model.
+
+A patient asleep or sitting still gives hours of nearly identical frames.
+The gate compares a tiny grey thumbnail of each frame with the thumbnail of
+the last frame that went through inference; while the difference stays
+below the threshold the pipeline reuses the previous keypoints instead of
+running the pose model. Because the comparison is against the last
+inferred frame, slow changes add up until they trigger inference too, and
+max_skip bounds how long a static scene can go without a fresh pose result,
+which bounds how much a gated frame can delay a fall confirmation.
+"""
+
+import os
+import time
+
+import cv2
+
+MOTION_THUMB = (64, 48)  # (w, h) of the motion thumbnail
+MOTION_PIXEL_DIFF = 15  # grey-level difference that counts as a changed pixel
+MOTION_FRACTION = 0.005  # share of changed pixels that counts as motion
+MAX_SKIP = float(os.environ.get("MOTION_MAX_SKIP", "1.0"))  # seconds between inferences in a static scene
+
+
+class MotionGate:
+    """Decide per frame whether the pose model has to run."""
+
+    def __init__(self, change_fraction=MOTION_FRACTION, max_skip=MAX_SKIP):
+        self.change_fraction = change_fraction
+        self.max_skip = max_skip
+        self.passed = 0
+        self.skipped = 0
+        self._ref_thumb = None
+        self._ref_time = None
+
+    def check(self, frame, now=None, force=False):
+        """True if frame should go through inference, False if the last result can be reused."""
+        now = time.time() if now is None else now
+        thumb = cv2.cvtColor(cv2.resize(frame, MOTION_THUMB, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+        if not (force or self._ref_thumb is None or now - self._ref_time >= self.max_skip
+                or self._moved(thumb)):
+            self.skipped += 1
+            return False
+
+        self.passed += 1
+        self._ref_thumb = thumb
+        self._ref_time = now
+        return True
+
+    def _moved(self, thumb):
+        changed = cv2.absdiff(thumb, self._ref_thumb) > MOTION_PIXEL_DIFF
+        return changed.mean() > self.change_fraction
+
+    def stats(self):
+        return {
+            'pose_runs': self.passed,
+            'pose_skipped': self.skipped
+        }
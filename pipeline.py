@@ -0,0 +1,592 @@
+"""
+Shared capture-and-inference pipeline for the web app.
+
+A Ward owns the models and one inference thread for every camera in this
+process. Each tick it takes the freshest frame from every camera, runs a
+single batched pose_model call, and hands each result to that camera's
+CameraPipeline, which keeps the authoritative fall/sleep state and
+broadcasts the encoded JPEG to every /video_feed viewer. Frames are only
+drawn and encoded while someone watches (or asks for a snapshot), so an
+unwatched room costs detection only. Cameras whose room
+is static skip the pose model (see motion.py) and reuse their last result;
+with POSE_ROI=1, cameras with tracked people run pose on a crop around them
+(see roi.py) instead of joining the full-frame batch. The pose_model may also
+be a PoseWorkerPool (workers.py) that runs inference in other processes.
+
+Viewers either block on the pipeline's conditions (frames(),
+status_events(), used by the Flask app) or register a listener that the
+frame loop calls after every publish (used by the asyncio server in
+asgi_app.py, which must not park a thread per viewer).
+"""
+
+import re
+import threading
+import time
+import traceback
+
+import cv2
+
+import metrics
+from capture import FrameGrabber
+from detection import FallState, draw_furniture, draw_state, furniture_under, pose_arrays
+from furniture import FurnitureCache
+from motion import MotionGate
+from posture import POSTURE_NAMES, classify_postures
+from recorder import RECORDING, ClipRecorder
+from roi import ROI_ENABLED, RoiPlanner, crop_imgsz, to_frame
+from stream import DEFAULT_PROFILE, QUALITY_PROFILES, EncodedFrame, mjpeg_part, sse_message
+from tracker import PersonTracker
+
+ERROR_STAGES = ('prepare', 'pose', 'handle')
+ERROR_LOG_INTERVAL = 10.0  # seconds between log lines of the same failing camera and stage
+
+
+class CameraPipeline:
+    """Capture, fall state and frame broadcast for one camera.
+
+    Inference is driven by the Ward, which batches the pose model across all
+    cameras; a pipeline only owns what is specific to its room.
+    """
+
+    def __init__(self, name, source=0, seg_model=None, frame_ready=None, roi=False, record=False, event_store=None,
+                 alerts=None):
+        self.name = name
+        self.source = source
+        self.grabber = FrameGrabber(source, on_frame=frame_ready)
+        self.furniture_cache = None
+        self.set_seg_model(seg_model)
+        self.tracker = PersonTracker()
+        self.motion_gate = MotionGate()
+        self.roi = RoiPlanner() if roi else None
+        self.recorder = ClipRecorder(name) if record else None
+        self.event_store = event_store
+        self.alerts = alerts  # AlertDispatcher for fall_start/fall_end/track_lost, see alerts.py
+        self.state = FallState()  # state of the primary track, kept when nobody is in view
+        self.lost_fall_track = None  # id of the last fallen track lost from view, until a fall starts or ends
+        self.viewers = 0
+        self.frames_processed = 0
+        self.frames_rendered = 0
+        self.last_latency = 0.0  # capture -> decision, seconds
+        self.fps = 0.0
+        self.running = False
+        self._last_handled = None
+        self._last_pose_result = None
+        self._drawable = None
+        self.errors = dict.fromkeys(ERROR_STAGES, 0)  # exceptions the Ward caught for this camera, per stage
+
+        # metric children are created once here; the frame loop only updates them
+        metrics.FRAMES_CAPTURED.labels(name).set_function(lambda: self.grabber.buffer.frames_in)
+        metrics.FRAMES_DROPPED.labels(name).set_function(lambda: self.grabber.buffer.frames_dropped)
+        metrics.FRAMES_PROCESSED.labels(name).set_function(lambda: self.frames_processed)
+        metrics.FRAMES_RENDERED.labels(name).set_function(lambda: self.frames_rendered)
+        metrics.STREAM_FPS.labels(name).set_function(lambda: round(self.fps, 2))
+        metrics.VIEWERS.labels(name).set_function(lambda: self.viewers)
+        metrics.POSE_SKIPPED.labels(name).set_function(lambda: self.motion_gate.skipped)
+        if self.recorder is not None:
+            metrics.RECORDER_BYTES.labels(name).set_function(lambda: self.recorder.buffer_bytes)
+            metrics.CLIPS_WRITTEN.labels(name).set_function(lambda: self.recorder.clips_written)
+            metrics.CLIPS_DROPPED.labels(name).set_function(lambda: self.recorder.clips_dropped)
+        self._encode_seconds = {profile: metrics.ENCODE_SECONDS.labels(name, profile) for profile in QUALITY_PROFILES}
+        self._decision_latency = metrics.DECISION_LATENCY.labels(name)
+        self._fall_alerts = metrics.FALL_ALERTS.labels(name)
+        self._time_to_alert = metrics.TIME_TO_ALERT.labels(name)
+        self.error_metrics = {stage: metrics.FRAME_ERRORS.labels(name, stage) for stage in ERROR_STAGES}
+
+        self._state_lock = threading.Lock()
+        self._frame_cond = threading.Condition()
+        self._frame = None  # EncodedFrame
+        self._seq = 0
+        self._status_cond = threading.Condition()
+        self._status = None
+        self._status_events = []
+        self._status_seq = 0
+        self._listeners = []
+
+    def set_seg_model(self, seg_model):
+        """Use seg_model for the furniture map from now on (None: pose only)."""
+        self.furniture_cache = FurnitureCache(seg_model) if seg_model is not None else None
+
+    def add_listener(self, callback):
+        """Call callback('frame') or callback('status') from the frame loop after every publish.
+
+        The callback runs on the inference thread, so it must only hand the
+        notification off (e.g. loop.call_soon_threadsafe) and never block.
+        """
+        self._listeners.append(callback)
+
+    def start(self):
+        self.running = True
+        self.grabber.start()
+
+    def stop(self):
+        with self._frame_cond:
+            self.running = False
+            self._frame_cond.notify_all()
+        with self._status_cond:
+            self._status_cond.notify_all()
+        self._notify('frame')
+        self._notify('status')
+        self.grabber.stop()
+
+    def status(self):
+        """Status of the primary track, with every track listed under 'tracks'.
+
+        fall_detected/alert_playing are true if any tracked person has fallen;
+        lost_fall_track is the id of a fallen person the tracker lost (track_lost)
+        who has not been seen falling or getting up since, or None.
+        """
+        with self._state_lock:
+            status = self.state.as_dict()
+            tracks = [track.as_dict() for track in self.tracker.tracks]
+        status['fall_detected'] = status['fall_detected'] or any(t['fall_detected'] for t in tracks)
+        status['alert_playing'] = status['alert_playing'] or any(t['alert_playing'] for t in tracks)
+        status['tracks'] = tracks
+        status['lost_fall_track'] = self.lost_fall_track
+        return status
+
+    def acknowledge(self):
+        """A nurse checked the room: clear lost_fall_track and close the open alert incident.
+
+        Returns False if no alert incident was open (see AlertDispatcher.acknowledge).
+        """
+        self.lost_fall_track = None
+        return self.alerts is not None and self.alerts.acknowledge(self.name)
+
+    def stats(self):
+        stats = self.grabber.stats()
+        stats['frames_processed'] = self.frames_processed
+        stats['frames_rendered'] = self.frames_rendered
+        stats['latency_seconds'] = round(self.last_latency, 4)
+        stats['viewers'] = self.viewers
+        stats['errors'] = dict(self.errors)
+        stats.update(self.motion_gate.stats())
+        if self.roi is not None:
+            stats.update(self.roi.stats())
+        if self.recorder is not None:
+            stats.update(self.recorder.stats())
+        if self.furniture_cache is not None:
+            stats.update(self.furniture_cache.stats())
+        return stats
+
+    def latest_frame(self, profile=DEFAULT_PROFILE):
+        """Return the newest frame as JPEG in the given quality profile, or None before the first frame.
+
+        Served from the same encode-once cache as the stream. While nobody
+        watches the stream the loop does not render, so the last processed
+        frame is rendered here on demand (once per processed frame).
+        """
+        frame = self._frame
+        if self.viewers == 0 and (frame is None or frame.processed != self.frames_processed):
+            processed = self.frames_processed
+            image = self._render()
+            if image is None:
+                return None
+            frame = EncodedFrame(image, processed, self._encode_seconds)
+            with self._frame_cond:
+                self._frame = frame
+        return frame.jpeg(profile) if frame is not None else None
+
+    def frames(self, profile=DEFAULT_PROFILE):
+        """Yield multipart MJPEG chunks for one viewer.
+
+        Viewers only wait on the shared frame; they never touch the camera or
+        the models, and each frame is encoded once per profile however many
+        viewers share it. A slow viewer always jumps to the newest frame.
+        """
+        last_seq = self.viewer_joined()
+        try:
+            while self.running:
+                with self._frame_cond:
+                    self._frame_cond.wait_for(lambda: self._seq != last_seq or not self.running, timeout=1.0)
+                    if self._seq == last_seq or self._frame is None:
+                        continue
+                    last_seq = self._seq
+                    frame = self._frame
+                jpeg = frame.jpeg(profile)
+                if jpeg is None:
+                    continue
+                yield mjpeg_part(jpeg)
+        finally:
+            self.viewer_left()
+
+    def viewer_joined(self):
+        """Count a new stream viewer; returns the frame sequence number it should start after."""
+        with self._frame_cond:
+            # the first viewer waits for a fresh frame instead of whatever was rendered last time
+            last_seq = self._seq if self.viewers == 0 else None
+            self.viewers += 1
+        return last_seq
+
+    def viewer_left(self):
+        with self._frame_cond:
+            self.viewers -= 1
+
+    def newest_frame(self):
+        """(sequence number, EncodedFrame or None) of the last published frame."""
+        with self._frame_cond:
+            return self._seq, self._frame
+
+    def newest_status(self):
+        """(sequence number, status, events) of the last published status; status is None before the first frame."""
+        with self._status_cond:
+            return self._status_seq, self._status, self._status_events
+
+    def status_events(self, heartbeat=15.0):
+        """Yield Server-Sent Events with the status whenever it changes.
+
+        Changes are coalesced: a slow client only gets the newest status, with
+        the detector events ("fall_start", "posture_change", "track_lost", ...) that
+        produced it. A heartbeat event is sent every heartbeat seconds so
+        proxies keep the connection open and the UI knows the server is alive.
+        """
+        last_seq, current, _ = self.newest_status()
+        if current is None:
+            current = self.status()
+        yield sse_message('status', dict(current, events=[]), retry=2000)
+
+        while self.running:
+            with self._status_cond:
+                changed = self._status_cond.wait_for(lambda: self._status_seq != last_seq or not self.running,
+                                                     timeout=heartbeat)
+                if not self.running:
+                    break
+                if not changed:
+                    payload = None
+                else:
+                    last_seq = self._status_seq
+                    payload = dict(self._status, events=self._status_events)
+            if payload is None:
+                yield sse_message('heartbeat', {})
+            else:
+                yield sse_message('status', payload)
+
+    def needs_inference(self, frame, now=None):
+        """Ask the motion gate whether frame needs a fresh pose result.
+
+        A person lying on the floor keeps the camera at full rate, so fall
+        and recovery confirmation never wait for a gated frame.
+        """
+        with self._state_lock:
+            watching_fall = any(track.state.last_pose == "Jatuh" for track in self.tracker.tracks)
+        return self.motion_gate.check(frame, now, force=watching_fall or self._last_pose_result is None)
+
+    def pose_crop(self, frame, now):
+        """(x0, y0, x1, y1) crop to run pose on in ROI mode, or None for a full-frame pass."""
+        if self.roi is None:
+            return None
+        with self._state_lock:
+            boxes = [track.box for track in self.tracker.tracks]
+        return self.roi.plan(frame.shape, boxes, now)
+
+    def handle(self, frame, pose_result, captured_at):
+        """Run the per-camera part of the loop on one frame and its pose result.
+
+        pose_result None reuses the last result (the motion gate skipped
+        inference). The frame is only drawn and encoded while someone is
+        watching /video_feed; detection and status run either way.
+        """
+        if pose_result is None:
+            if self._last_pose_result is None:
+                return  # nothing to reuse yet (first job lost to a crashed worker)
+            events = self._process(frame, self._last_pose_result, reused=True)
+        else:
+            self._last_pose_result = pose_result
+            events = self._process(frame, pose_result)
+        now = time.time()
+        self.frames_processed += 1
+        self.last_latency = now - captured_at
+        self._decision_latency.observe(self.last_latency)
+        if self._last_handled is not None and now > self._last_handled:
+            self.fps = 0.9 * self.fps + 0.1 / (now - self._last_handled)
+        self._last_handled = now
+
+        for track, event in events:
+            if self.event_store is not None:
+                self.event_store.record(self.name, event, captured_at, track.id, track.state.current_posture,
+                                        track.state.current_furniture or None, pose=track.state.last_pose)
+            if self.alerts is not None:
+                self.alerts.send(self.name, event, captured_at, track.id, posture=track.state.current_posture)
+            if event == "track_lost":
+                self.lost_fall_track = track.id
+            elif event in ("fall_start", "fall_end"):
+                self.lost_fall_track = None
+            if event == "fall_start":
+                self._fall_alerts.inc()
+                if track.state.fall_start_time is not None:
+                    self._time_to_alert.observe(now - track.state.fall_start_time)
+                if self.recorder is not None:
+                    self.recorder.trigger(captured_at, f"jatuh_track{track.id}")
+        if self.recorder is not None:
+            self.recorder.add(frame, captured_at)
+
+        self._publish_status(events)
+
+        if self.viewers > 0:
+            image = self._render()
+            if image is not None:
+                # encoded lazily by the viewers, once per quality profile
+                self._publish(EncodedFrame(image, self.frames_processed, self._encode_seconds))
+
+    def _publish_status(self, events):
+        # push only on change; activity_duration ticks at most once a second
+        status = self.status()
+        if status == self._status and not events:
+            return
+        with self._status_cond:
+            self._status = status
+            self._status_events = [{'track': track.id, 'event': event} for track, event in events]
+            self._status_seq += 1
+            self._status_cond.notify_all()
+        self._notify('status')
+
+    def _publish(self, frame):
+        with self._frame_cond:
+            self._frame = frame
+            self._seq += 1
+            self._frame_cond.notify_all()
+        self._notify('frame')
+
+    def _notify(self, kind):
+        for callback in self._listeners:
+            callback(kind)
+
+    def _process(self, frame, pose_result, reused=False):
+        now = time.time()
+        boxes, keypoints = pose_arrays(pose_result)
+        codes, _ = classify_postures(keypoints, frame.shape)
+
+        furniture = None
+        if self.furniture_cache is not None:
+            # cheap cache lookup every frame, so the map is built on the empty room at startup
+            furniture = self.furniture_cache.get(frame, boxes)
+
+        furniture_names = furniture_under(keypoints, furniture)
+        labels = []
+        with self._state_lock:
+            matches, lost = self.tracker.update(boxes, keypoints[..., :2], now)
+            # a fallen person the tracker gave up on was never seen getting up: say so explicitly
+            events = [(track, "track_lost") for track in lost if track.state.fall_detected]
+            for track, index in matches:
+                body_position = POSTURE_NAMES[int(codes[index])]
+                # head or feet not visible: hold the track's state instead of guessing
+                if body_position is not None:
+                    changes = track.state.update(body_position, furniture_names[index], now,
+                                                 keypoints[index], frame.shape[0])
+                    events.extend((track, event) for event in changes)
+                labels.append((track.box, f"#{track.id} {track.state.last_pose}"))
+
+            primary = self.tracker.primary()
+            if primary is not None:
+                self.state = primary.state
+            # everything _render needs, so drawing can be skipped while nobody watches
+            self._drawable = (frame, pose_result, reused, furniture, labels, primary is not None and len(boxes) > 0)
+
+        return events
+
+    def _render(self):
+        """Draw the last processed frame: skeletons, furniture, track labels and the primary state."""
+        with self._state_lock:
+            if self._drawable is None:
+                return None
+            frame, pose_result, reused, furniture, labels, show_state = self._drawable
+
+        # a reused result still draws on the current frame
+        annotated_frame = pose_result.plot(img=frame) if reused else pose_result.plot()
+        if furniture is not None:
+            draw_furniture(annotated_frame, furniture)
+        for box, label in labels:
+            x1, y1 = int(box[0]), int(box[1])
+            cv2.putText(annotated_frame, label, (x1, max(y1 - 10, 20)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+        if show_state:
+            draw_state(annotated_frame, self.state)
+        self.frames_rendered += 1
+        return annotated_frame
+
+
+def parse_sources(spec):
+    """Parse a CAMERA_SOURCES string into [(name, source), ...].
+
+    Entries are comma separated and either a bare source ("0", "rtsp://...")
+    or "name=source". Unnamed cameras are named by their position, and
+    numeric sources are treated as local device indices.
+    """
+    sources = []
+    for index, item in enumerate(i.strip() for i in spec.split(',')):
+        if not item:
+            continue
+        name, sep, source = item.partition('=')
+        if not sep or not re.fullmatch(r'[\w-]+', name):
+            name, source = str(index), item
+        sources.append((name, int(source) if source.isdigit() else source))
+    return sources
+
+
+class Ward:
+    """All cameras served by this process, sharing one set of models.
+
+    The models may arrive after start() (set_pose_model/set_seg_model, as
+    they finish loading in the background); until the pose model is there
+    frames are captured and discarded.
+    """
+
+    def __init__(self, pose_model=None, seg_model=None, sources=((0, 0),), roi=ROI_ENABLED, record=RECORDING,
+                 event_store=None, alerts=None):
+        self.pose_model = pose_model
+        self.seg_model = seg_model
+        self.cameras = {}
+        self._frame_ready = threading.Event()
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._pose_seconds = metrics.POSE_SECONDS.labels()
+        self._pose_batch = metrics.POSE_BATCH.labels()
+        self._error_logged = {}  # (camera, stage): monotonic time of the last log line
+
+        for name, source in sources:
+            self.cameras[str(name)] = CameraPipeline(str(name), source, seg_model,
+                                                     frame_ready=self._frame_ready.set, roi=roi, record=record,
+                                                     event_store=event_store, alerts=alerts)
+
+    @property
+    def default(self):
+        return next(iter(self.cameras.values()))
+
+    def get(self, name):
+        return self.cameras.get(name)
+
+    @property
+    def running(self):
+        """True while the inference thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def crashed(self):
+        """True if the inference thread died while it should be running.
+
+        Exceptions of one camera (inference, detection, drawing, recording)
+        are caught, logged and counted per camera in stats()['errors'] and
+        falldet_frame_errors_total, so they never end the thread.
+        """
+        return self._running and not self.running
+
+    def set_pose_model(self, pose_model):
+        self.pose_model = pose_model
+
+    def set_seg_model(self, seg_model):
+        self.seg_model = seg_model
+        for cam in self.cameras.values():
+            cam.set_seg_model(seg_model)
+
+    def start(self):
+        """Start capture and the shared inference loop (no-op if running)."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for cam in self.cameras.values():
+                cam.start()
+            self._thread = threading.Thread(target=self._run, name="ward-inference", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        for cam in self.cameras.values():
+            cam.stop()
+
+    def status(self):
+        return {name: cam.status() for name, cam in self.cameras.items()}
+
+    def stats(self):
+        return {name: cam.stats() for name, cam in self.cameras.items()}
+
+    def _run(self):
+        while self._running:
+            if not self._frame_ready.wait(timeout=1.0):
+                continue
+            # clear before collecting so a frame arriving meanwhile wakes the next tick
+            self._frame_ready.clear()
+            if self.pose_model is None:
+                for cam in self.cameras.values():
+                    cam.grabber.read(timeout=0)  # still loading
+                continue
+
+            batch = []
+            reused = []
+            cropped = []
+            for cam in self.cameras.values():
+                frame, captured_at = cam.grabber.read(timeout=0)
+                if frame is None:
+                    continue
+                try:
+                    if not cam.needs_inference(frame, captured_at):
+                        reused.append((cam, frame, captured_at))
+                        continue
+                    crop = cam.pose_crop(frame, captured_at)
+                except Exception as e:
+                    self._failed(cam, 'prepare', e)
+                    continue
+                if crop is None:
+                    batch.append((cam, frame, captured_at))
+                else:
+                    cropped.append((cam, frame, captured_at, crop))
+
+            for cam, frame, captured_at in reused:
+                self._handle(cam, frame, None, captured_at)
+            for cam, frame, captured_at, crop in cropped:
+                try:
+                    pose_result = self._infer_crop(cam, frame, crop)
+                except Exception as e:
+                    self._failed(cam, 'pose', e)
+                    continue
+                self._handle(cam, frame, pose_result, captured_at)
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                pose_results = self.pose_model([frame for _, frame, _ in batch], verbose=False)
+            except Exception as e:
+                for cam, _, _ in batch:
+                    self._failed(cam, 'pose', e)
+                continue
+            self._pose_seconds.observe(time.perf_counter() - started)
+            self._pose_batch.observe(len(batch))
+            # a None result (inference worker crashed) reuses the camera's previous one
+            for (cam, frame, captured_at), pose_result in zip(batch, pose_results):
+                self._handle(cam, frame, pose_result, captured_at)
+
+    def _handle(self, cam, frame, pose_result, captured_at):
+        # one camera failing (bad frame, drawing, recorder) must not stop detection in the other rooms
+        try:
+            cam.handle(frame, pose_result, captured_at)
+        except Exception as e:
+            self._failed(cam, 'handle', e)
+
+    def _failed(self, cam, stage, error):
+        """Count an exception of the inference loop; log it at most every ERROR_LOG_INTERVAL per camera and stage."""
+        cam.errors[stage] += 1
+        cam.error_metrics[stage].inc()
+        now = time.monotonic()
+        key = (cam.name, stage)
+        if now - self._error_logged.get(key, -ERROR_LOG_INTERVAL) >= ERROR_LOG_INTERVAL:
+            self._error_logged[key] = now
+            print(f"[!] Kamera {cam.name}: error di tahap {stage} ({cam.errors[stage]}x): "
+                  f"{type(error).__name__}: {error}")
+            if cam.errors[stage] == 1:
+                traceback.print_exception(type(error), error, error.__traceback__)
+
+    def _infer_crop(self, cam, frame, crop):
+        # crops differ in size per camera, so they are not batched
+        x0, y0, x1, y1 = crop
+        started = time.perf_counter()
+        result = self.pose_model(frame[y0:y1, x0:x1], imgsz=crop_imgsz(crop), verbose=False)[0]
+        self._pose_seconds.observe(time.perf_counter() - started)
+        self._pose_batch.observe(1)
+        if result is None:
+            return None
+        cam.roi.found(len(result.boxes))
+        return to_frame(result, frame, x0, y0)
@@ -0,0 +1,141 @@
+"""
+Vectorized posture classification.
+
+Takes the keypoints of every detected person as one (persons, 17, 3) array
+(x, y, confidence in COCO order, as in Results.keypoints.data) and returns a
+posture code and confidence per person in a single NumPy pass. This is the
+head/foot ratio rule that used to be copied into app.py, main.py and
+simple_test.py:
+
+    ratio = (foot_y - head_y) / frame_height
+    ratio > 0.45          -> Berdiri
+    0.25 <= ratio <= 0.45 -> Duduk
+    ratio < 0.25          -> Jatuh
+
+Missing or low-confidence keypoints no longer turn into (0, 0) coordinates:
+the head falls back from the nose to the other face keypoints, the foot from
+the right to the left ankle, and a person without a usable head or foot gets
+UNKNOWN instead of a made-up posture.
+
+Run `python posture.py` for a micro-benchmark against the old per-person loop.
+"""
+
+import numpy as np
+
+BERDIRI, DUDUK, JATUH, UNKNOWN = 0, 1, 2, -1
+POSTURE_NAMES = {BERDIRI: "Berdiri", DUDUK: "Duduk", JATUH: "Jatuh", UNKNOWN: None}
+
+STAND_RATIO = 0.45
+SIT_RATIO = 0.25
+MIN_KEYPOINT_CONF = 0.5
+THRESHOLD_MARGIN = 0.05  # ratio distance from a threshold that counts as a clear decision
+
+# COCO keypoint indices, in order of preference
+HEAD_KEYPOINTS = np.array([0, 1, 2, 3, 4])  # nose, eyes, ears
+FOOT_KEYPOINTS = np.array([16, 15])  # right ankle (the old y_points[-1]), left ankle
+
+
+def _first_confident(y, conf, rows, indices, min_conf):
+    """Per person, the y and confidence of the first keypoint in indices above min_conf."""
+    ok = conf[:, indices] >= min_conf
+    first = ok.argmax(axis=1)
+    cols = indices[first]
+    found = ok[rows, first]
+    return y[rows, cols], conf[rows, cols] * found, found
+
+
+def classify_postures(keypoints, frame_shape, min_conf=MIN_KEYPOINT_CONF):
+    """Classify every person at once.
+
+    keypoints: (N, 17, 3) array of x, y, confidence. A (N, 17, 2) array is
+    accepted too; keypoints at (0, 0) are then treated as missing.
+    frame_shape: shape of the full frame the coordinates refer to.
+
+    Returns (codes, confidences): (N,) int codes (BERDIRI, DUDUK, JATUH or
+    UNKNOWN) and (N,) float confidences in [0, 1].
+    """
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if keypoints.ndim == 2:
+        keypoints = keypoints[None]
+    n = keypoints.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.float32)
+
+    y = keypoints[..., 1]
+    if keypoints.shape[-1] >= 3:
+        conf = keypoints[..., 2]
+    else:
+        conf = (keypoints[..., :2] != 0).any(-1).astype(np.float32)
+
+    rows = np.arange(n)
+    head_y, head_conf, has_head = _first_confident(y, conf, rows, HEAD_KEYPOINTS, min_conf)
+    foot_y, foot_conf, has_foot = _first_confident(y, conf, rows, FOOT_KEYPOINTS, min_conf)
+
+    ratio = (foot_y - head_y) / float(frame_shape[0])
+    codes = np.where(ratio > STAND_RATIO, BERDIRI, np.where(ratio >= SIT_RATIO, DUDUK, JATUH)).astype(np.int8)
+
+    # confidence: keypoint confidence, halved when the ratio sits on a threshold
+    margin = np.minimum(np.abs(ratio - STAND_RATIO), np.abs(ratio - SIT_RATIO))
+    clarity = 0.5 + 0.5 * np.clip(margin / THRESHOLD_MARGIN, 0.0, 1.0)
+    confidences = (np.minimum(head_conf, foot_conf) * clarity).astype(np.float32)
+
+    known = has_head & has_foot
+    codes[~known] = UNKNOWN
+    confidences[~known] = 0.0
+    return codes, confidences
+
+
+def _scalar_reference(persons, frame_height):
+    """The old per-person loop from app.py, kept for the micro-benchmark.
+
+    persons may be a torch tensor, in which case each person is copied to the
+    host separately, as app.py did with keypoints.xy[i].cpu().numpy().
+    """
+    labels = []
+    for i in range(len(persons)):
+        person = persons[i].cpu().numpy() if hasattr(persons[i], 'cpu') else persons[i]
+        y_points = person[:, 1]
+        ratio = (y_points[-1] - y_points[0]) / frame_height
+        if ratio > 0.45:
+            labels.append(BERDIRI)
+        elif 0.25 <= ratio <= 0.45:
+            labels.append(DUDUK)
+        else:
+            labels.append(JATUH)
+    return labels
+
+
+def _synthetic_keypoints(n, frame_height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    heights = rng.uniform(0.05, 0.9, n) * frame_height
+    top = rng.uniform(0, frame_height * 0.1, n)
+    y = top[:, None] + heights[:, None] * np.linspace(0, 1, 17)[None]
+    x = rng.uniform(50, 600, n)[:, None] + rng.normal(0, 10, (n, 17))
+    conf = rng.uniform(0.6, 1.0, (n, 17))
+    return np.stack([x, y, conf], axis=-1).astype(np.float32)
+
+
+if __name__ == '__main__':
+    import timeit
+
+    try:
+        import torch
+    except ImportError:
+        torch = None
+
+    frame_shape = (480, 640, 3)
+    repeat = 2000
+    print("Per-call time in microseconds; 'tensor' columns start from a torch keypoint tensor like Results.keypoints.data")
+    print(f"{'persons':>8s} {'numpy loop':>11s} {'vectorized':>11s} {'tensor loop':>12s} {'tensor vec':>11s}")
+    for n in (1, 2, 5, 10, 32):
+        kps = _synthetic_keypoints(n)
+        codes, _ = classify_postures(kps, frame_shape)
+        assert list(codes) == _scalar_reference(kps, frame_shape[0])
+
+        row = [timeit.timeit(lambda: _scalar_reference(kps, frame_shape[0]), number=repeat),
+               timeit.timeit(lambda: classify_postures(kps, frame_shape), number=repeat)]
+        if torch is not None:
+            tensor = torch.from_numpy(kps)
+            row += [timeit.timeit(lambda: _scalar_reference(tensor, frame_shape[0]), number=repeat),
+                    timeit.timeit(lambda: classify_postures(tensor.cpu().numpy(), frame_shape), number=repeat)]
+        print(f"{n:8d} " + " ".join(f"{t / repeat * 1e6:11.1f}" for t in row))
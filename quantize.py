@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+INT8 quantization of the pose and furniture models, and an accuracy check.
+
+`export` grabs calibration frames from our own footage and writes INT8
+versions of both models for the ONNX Runtime or OpenVINO backend, next to the
+FP32 exports (see models.py). `compare` runs FP32 and INT8 side by side on
+the same clips and reports what the quantization costs us:
+
+    python quantize.py export rekaman/ --backend openvino
+    python quantize.py compare rekaman/ --backend openvino --json int8.json
+
+Reported per clip and overall: person detection agreement, keypoint drift
+(pixels), posture label agreement with the posture.py thresholds, furniture
+agreement, fall events found by both, and the pose/seg speedup. Run
+`MODEL_INT8=1 MODEL_BACKEND=openvino python app.py` once the numbers are
+acceptable for the deployment.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import yaml
+
+from batch_process import find_videos
+from detection import furniture_under, pose_arrays
+from furniture import FurnitureMap
+from models import BACKEND, EXPORT_IMGSZ, POSE_MODEL_PATHS, SEG_MODEL_PATH, exported_path, load_model, weights_file
+from posture import MIN_KEYPOINT_CONF, POSTURE_NAMES, UNKNOWN, classify_postures
+from tracker import PersonTracker, box_iou
+
+CALIBRATION_DIR = os.path.join("datasets", "calibration")
+MATCH_IOU = 0.5  # FP32 and INT8 boxes above this IoU are the same person
+
+
+def collect_calibration_frames(inputs, out_dir=CALIBRATION_DIR, every=30, max_frames=300):
+    """Save every Nth frame of the clips as JPEG for INT8 calibration; returns the count."""
+    image_dir = os.path.join(out_dir, "images")
+    os.makedirs(image_dir, exist_ok=True)
+    saved = 0
+    for path in find_videos(inputs):
+        cap = cv2.VideoCapture(path)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        index = 0
+        while saved < max_frames:
+            if index % every:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            cv2.imwrite(os.path.join(image_dir, f"{stem}_{index:06d}.jpg"), frame)
+            saved += 1
+            index += 1
+        cap.release()
+    return saved
+
+
+def write_dataset_yaml(model, task, out_dir=CALIBRATION_DIR):
+    """Dataset file pointing ultralytics at the (unlabelled) calibration images."""
+    data = {
+        'path': os.path.abspath(out_dir),
+        'train': "images",
+        'val': "images",
+        'names': dict(model.names)
+    }
+    if task == "pose":
+        data['kpt_shape'] = list(model.model.yaml.get('kpt_shape', [17, 3]))
+    path = os.path.join(out_dir, f"{task}.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(data, f)
+    return path
+
+
+def export_int8(weights, backend, task, out_dir=CALIBRATION_DIR, imgsz=EXPORT_IMGSZ):
+    """Quantize weights to INT8 for backend, calibrated on the frames in out_dir."""
+    from ultralytics import YOLO
+
+    model = YOLO(weights, task=task)
+    data = write_dataset_yaml(model, task, out_dir)
+    # dynamic batch so the Ward can still batch frames of all cameras
+    return model.export(format=backend, int8=True, data=data, imgsz=imgsz, dynamic=True, verbose=False)
+
+
+class Lane:
+    """One model variant (FP32 or INT8) running the detection logic on a clip."""
+
+    def __init__(self, pose_model, seg_model=None):
+        self.pose_model = pose_model
+        self.seg_model = seg_model
+        self.tracker = PersonTracker()
+        self.furniture = None
+        self.falls = []  # timestamps of fall_start events
+        self.pose_seconds = []
+        self.seg_seconds = []
+
+    def step(self, frame, timestamp, refresh_furniture):
+        started = time.perf_counter()
+        pose_result = self.pose_model(frame, verbose=False)[0]
+        self.pose_seconds.append(time.perf_counter() - started)
+
+        if self.seg_model is not None and refresh_furniture:
+            started = time.perf_counter()
+            self.furniture = FurnitureMap.from_results(self.seg_model(frame, conf=0.3, verbose=False)[0])
+            self.seg_seconds.append(time.perf_counter() - started)
+
+        boxes, keypoints = pose_arrays(pose_result)
+        codes, _ = classify_postures(keypoints, frame.shape)
+        names = furniture_under(keypoints, self.furniture)
+        for track, d in self.tracker.update(boxes, keypoints[..., :2], timestamp)[0]:
+            body_position = POSTURE_NAMES[int(codes[d])]
+            if body_position is None:
+                continue
+            if "fall_start" in track.state.update(body_position, names[d], timestamp, keypoints[d], frame.shape[0]):
+                self.falls.append(timestamp)
+        return boxes, keypoints, codes, names
+
+
+class Agreement:
+    """Running comparison of the INT8 lane against the FP32 lane."""
+
+    def __init__(self):
+        self.persons = 0  # persons found by FP32
+        self.matched = 0
+        self.extra = 0  # persons only found by INT8
+        self.drift = []  # per matched person, mean keypoint distance in pixels
+        self.postures = 0
+        self.postures_same = 0
+        self.furniture_same = 0
+
+    def add(self, reference, quantized):
+        boxes, keypoints, codes, names = reference
+        q_boxes, q_keypoints, q_codes, q_names = quantized
+        self.persons += len(boxes)
+        if not len(boxes) or not len(q_boxes):
+            self.extra += len(q_boxes)
+            return
+
+        iou = box_iou(boxes, q_boxes)
+        pairs = []
+        for flat in np.argsort(-iou, axis=None):
+            i, j = divmod(int(flat), len(q_boxes))
+            if iou[i, j] < MATCH_IOU:
+                break
+            if all(i != a and j != b for a, b in pairs):
+                pairs.append((i, j))
+        self.matched += len(pairs)
+        self.extra += len(q_boxes) - len(pairs)
+
+        for i, j in pairs:
+            visible = (keypoints[i, :, 2] >= MIN_KEYPOINT_CONF) & (q_keypoints[j, :, 2] >= MIN_KEYPOINT_CONF)
+            if visible.any():
+                distance = np.linalg.norm(keypoints[i, visible, :2] - q_keypoints[j, visible, :2], axis=1)
+                self.drift.append(float(distance.mean()))
+            if codes[i] != UNKNOWN:
+                self.postures += 1
+                self.postures_same += int(codes[i] == q_codes[j])
+            self.furniture_same += int(names[i] == q_names[j])
+
+    def merge(self, other):
+        for name in ('persons', 'matched', 'extra', 'postures', 'postures_same', 'furniture_same'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.drift += other.drift
+
+    def report(self):
+        drift = np.asarray(self.drift) if self.drift else np.zeros(1)
+        return {
+            'persons_fp32': self.persons,
+            'person_recall': round(self.matched / self.persons, 4) if self.persons else None,
+            'persons_only_int8': self.extra,
+            'keypoint_drift_px_mean': round(float(drift.mean()), 2),
+            'keypoint_drift_px_p95': round(float(np.percentile(drift, 95)), 2),
+            'posture_agreement': round(self.postures_same / self.postures, 4) if self.postures else None,
+            'furniture_agreement': round(self.furniture_same / self.matched, 4) if self.matched else None
+        }
+
+
+def match_falls(reference, quantized, tolerance):
+    """Pair FP32 and INT8 fall_start times that lie within tolerance seconds.
+
+    Returns (delays of the matched INT8 falls, number of unmatched INT8 falls).
+    """
+    unused = list(quantized)
+    delays = []
+    for t in reference:
+        near = [q for q in unused if abs(q - t) <= tolerance]
+        if near:
+            q = min(near, key=lambda q: abs(q - t))
+            unused.remove(q)
+            delays.append(q - t)
+    return delays, len(unused)
+
+
+def compare_clip(path, fp32, int8, agreement, stride=1, seg_every=30):
+    """Run both lanes on one clip, frame by frame on the same decoded frames."""
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    index = 0
+    while True:
+        if index % stride:
+            if not cap.grab():
+                break
+            index += 1
+            continue
+        ok, frame = cap.read()
+        if not ok:
+            break
+        timestamp = index / fps
+        refresh = index % seg_every == 0
+        agreement.add(fp32.step(frame, timestamp, refresh), int8.step(frame, timestamp, refresh))
+        index += 1
+    cap.release()
+
+
+def summarize(agreement, lanes, tolerance):
+    """Report for one Agreement and its [(fp32_lane, int8_lane), ...] (one pair per clip)."""
+    result = agreement.report()
+
+    delays, extra, falls_fp32, falls_int8 = [], 0, 0, 0
+    for fp32, int8 in lanes:
+        clip_delays, clip_extra = match_falls(fp32.falls, int8.falls, tolerance)
+        delays += clip_delays
+        extra += clip_extra
+        falls_fp32 += len(fp32.falls)
+        falls_int8 += len(int8.falls)
+    result.update({
+        'falls_fp32': falls_fp32,
+        'falls_int8': falls_int8,
+        'falls_matched': len(delays),
+        'falls_missed': falls_fp32 - len(delays),
+        'falls_extra': extra,
+        'fall_delay_s_mean': round(float(np.mean(delays)), 3) if delays else None
+    })
+
+    for stage in ('pose', 'seg'):
+        reference = [t for fp32, _ in lanes for t in getattr(fp32, stage + '_seconds')]
+        quantized = [t for _, int8 in lanes for t in getattr(int8, stage + '_seconds')]
+        if reference and quantized:
+            result[stage + '_ms_fp32'] = round(float(np.mean(reference)) * 1000, 2)
+            result[stage + '_ms_int8'] = round(float(np.mean(quantized)) * 1000, 2)
+            result[stage + '_speedup'] = round(float(np.mean(reference) / np.mean(quantized)), 2)
+    return result
+
+
+def print_result(title, result):
+    print(f"\n{title}")
+    for key, value in result.items():
+        print(f"  {key:26s} {value}")
+
+
+def default_pose_model():
+    return next((p for p in POSE_MODEL_PATHS if os.path.exists(p)), "yolov8n-pose.pt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model INT8 untuk PC bangsal: export dan cek akurasi.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("export", "compare"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("inputs", nargs="+", help="file video atau folder berisi video")
+        cmd.add_argument("--backend", choices=("onnx", "openvino"),
+                         default=BACKEND if BACKEND != "torch" else "openvino")
+        cmd.add_argument("--pose-model", default=default_pose_model())
+        cmd.add_argument("--seg-model", default=SEG_MODEL_PATH)
+    export = sub.choices["export"]
+    export.add_argument("--every", type=int, default=30, help="ambil 1 frame kalibrasi setiap N frame")
+    export.add_argument("--max-frames", type=int, default=300)
+    export.add_argument("--calibration-dir", default=CALIBRATION_DIR)
+    compare = sub.choices["compare"]
+    compare.add_argument("--stride", type=int, default=1, help="proses setiap N frame")
+    compare.add_argument("--seg-every", type=int, default=30, help="segmentasi furniture setiap N frame")
+    compare.add_argument("--tolerance", type=float, default=1.0, help="selisih waktu (detik) event jatuh yang dianggap sama")
+    compare.add_argument("--json", help="simpan laporan ke file JSON")
+    args = parser.parse_args()
+
+    models = [(args.pose_model, "pose")]
+    if os.path.exists(args.seg_model):
+        models.append((args.seg_model, "segment"))
+
+    if args.command == "export":
+        count = collect_calibration_frames(args.inputs, args.calibration_dir, args.every, args.max_frames)
+        if count == 0:
+            print("Tidak ada frame kalibrasi, cek path rekaman")
+            return
+        print(f"{count} frame kalibrasi disimpan di {args.calibration_dir}")
+        for weights, task in models:
+            path = export_int8(weights, args.backend, task, args.calibration_dir)
+            print(f"INT8 {task}: {path}")
+        return
+
+    if not os.path.exists(exported_path(weights_file(args.pose_model), args.backend, int8=True)):
+        print("Model INT8 belum ada, jalankan dulu: python quantize.py export <rekaman>")
+        return
+    seg_fp32 = seg_int8 = None
+    pose_fp32 = load_model(args.pose_model, args.backend, task="pose", int8=False)
+    pose_int8 = load_model(args.pose_model, args.backend, task="pose", int8=True)
+    if len(models) > 1:
+        seg_fp32 = load_model(args.seg_model, args.backend, task="segment", int8=False)
+        seg_int8 = load_model(args.seg_model, args.backend, task="segment", int8=True)
+
+    report = {'backend': args.backend, 'clips': {}}
+    total = Agreement()
+    all_lanes = []
+    for path in find_videos(args.inputs):
+        agreement = Agreement()
+        lanes = [(Lane(pose_fp32, seg_fp32), Lane(pose_int8, seg_int8))]
+        compare_clip(path, *lanes[0], agreement, args.stride, args.seg_every)
+        total.merge(agreement)
+        all_lanes += lanes
+        report['clips'][path] = summarize(agreement, lanes, args.tolerance)
+        print_result(path, report['clips'][path])
+
+    report['overall'] = summarize(total, all_lanes, args.tolerance)
+    print_result("Total", report['overall'])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nLaporan disimpan ke {args.json}")
+
+
+if __name__ == '__main__':
+    main()
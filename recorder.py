@@ -0,0 +1,155 @@
+"""
+Pre/post-event clip recording.
+
+Each camera keeps a ring buffer of its recent frames as small JPEGs
+(RECORD_FPS frames per second, RECORD_SCALE of the frame size) so the
+memory used is capped at RECORD_MAX_MB per camera no matter how long the
+app runs. When a fall is confirmed the recorder waits RECORD_POST seconds,
+takes the frames from RECORD_PRE seconds before the fall to RECORD_POST
+seconds after it, and hands them to a background writer thread that
+decodes them into a video under RECORD_DIR/<camera>/.
+
+The frame loop only downscales a due frame and queues it: JPEG encoding
+and the ring buffer live on an encoder thread per camera, so an unwatched
+camera still costs little more than detection, and the loop never waits
+on the disk. If the encoder or the writer falls behind, frames or clips
+are dropped (and counted) instead.
+"""
+
+import collections
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+RECORDING = os.environ.get("RECORDING", "1").lower() in ("1", "true", "yes")
+RECORD_DIR = os.environ.get("RECORD_DIR", "recordings")
+RECORD_PRE = float(os.environ.get("RECORD_PRE", "10"))  # seconds before the fall
+RECORD_POST = float(os.environ.get("RECORD_POST", "10"))  # seconds after the fall
+RECORD_FPS = float(os.environ.get("RECORD_FPS", "5"))
+RECORD_SCALE = 0.5
+RECORD_QUALITY = 70
+RECORD_MAX_MB = float(os.environ.get("RECORD_MAX_MB", "32"))  # ring buffer cap per camera
+WRITE_QUEUE = 4  # clips waiting for the writer before new ones are dropped
+ENCODE_QUEUE = 8  # downscaled frames waiting for the encoder before new ones are dropped
+
+
+class ClipRecorder:
+    """Ring buffer of recent JPEG frames for one camera, written out around falls."""
+
+    def __init__(self, camera, out_dir=RECORD_DIR, pre=RECORD_PRE, post=RECORD_POST, fps=RECORD_FPS,
+                 max_bytes=int(RECORD_MAX_MB * 1024 * 1024)):
+        self.camera = camera
+        self.out_dir = os.path.join(out_dir, camera)
+        self.pre = pre
+        self.post = post
+        self.fps = fps
+        self.max_bytes = max_bytes
+        self.buffer_bytes = 0
+        self.clips_written = 0
+        self.clips_dropped = 0
+        self.frames_dropped = 0
+
+        self._frames = collections.deque()  # (timestamp, jpeg bytes), only touched by the encoder thread
+        self._pending = []  # (event time, label) waiting for their post-event frames
+        self._pending_lock = threading.Lock()
+        self._last_added = None
+        self._incoming = queue.Queue(maxsize=ENCODE_QUEUE)
+        self._encoder = None
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE)
+        self._writer = None
+
+    def add(self, frame, timestamp):
+        """Queue frame for the ring buffer if it is due at RECORD_FPS; never encodes or waits."""
+        if self._last_added is not None and timestamp - self._last_added < 1.0 / self.fps:
+            return
+        self._last_added = timestamp
+        # the downscaled copy is the encoder's own: the loop may draw on frame afterwards
+        small = cv2.resize(frame, None, fx=RECORD_SCALE, fy=RECORD_SCALE, interpolation=cv2.INTER_AREA)
+        if self._encoder is None:
+            self._encoder = threading.Thread(target=self._encode_loop, name=f"clip-encoder-{self.camera}",
+                                             daemon=True)
+            self._encoder.start()
+        try:
+            self._incoming.put_nowait((timestamp, small))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def trigger(self, event_time, label="fall"):
+        """Record a clip around event_time once its post-event frames have arrived."""
+        with self._pending_lock:
+            self._pending.append((event_time, label))
+
+    def stats(self):
+        return {
+            'recorder_buffer_frames': len(self._frames),
+            'recorder_buffer_bytes': self.buffer_bytes,
+            'recorder_frames_dropped': self.frames_dropped,
+            'clips_written': self.clips_written,
+            'clips_dropped': self.clips_dropped
+        }
+
+    def _encode_loop(self):
+        while True:
+            timestamp, small = self._incoming.get()
+            ret, buffer = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, RECORD_QUALITY])
+            if ret:
+                jpeg = buffer.tobytes()
+                self._frames.append((timestamp, jpeg))
+                self.buffer_bytes += len(jpeg)
+            with self._pending_lock:
+                self._evict(timestamp)
+                finished = [p for p in self._pending if timestamp - p[0] >= self.post]
+                self._pending = [p for p in self._pending if timestamp - p[0] < self.post]
+            for event_time, label in finished:
+                self._finish(event_time, label)
+
+    def _evict(self, now):
+        # with self._pending_lock held; a pending clip still needs its pre-event frames
+        keep_from = min([now - self.pre - self.post] + [t - self.pre for t, _ in self._pending])
+        while self._frames and (self._frames[0][0] < keep_from or self.buffer_bytes > self.max_bytes):
+            _, jpeg = self._frames.popleft()
+            self.buffer_bytes -= len(jpeg)
+
+    def _finish(self, event_time, label):
+        frames = [(t, jpeg) for t, jpeg in self._frames if event_time - self.pre <= t <= event_time + self.post]
+        if not frames:
+            return
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name=f"clip-writer-{self.camera}", daemon=True)
+            self._writer.start()
+        try:
+            self._queue.put_nowait((event_time, label, frames))
+        except queue.Full:
+            self.clips_dropped += 1
+            print(f"[!] Clip {self.camera} dilewati, penulisan ke disk tertinggal")
+
+    def _write_loop(self):
+        while True:
+            event_time, label, frames = self._queue.get()
+            try:
+                path = self._write(event_time, label, frames)
+                self.clips_written += 1
+                print(f" Clip {label} disimpan: {path}")
+            except Exception as e:
+                print(f"[!] Gagal menyimpan clip {self.camera}: {e}")
+
+    def _write(self, event_time, label, frames):
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(event_time))
+        path = os.path.join(self.out_dir, f"{stamp}_{label}.avi")
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        height, width = first.shape[:2]
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), self.fps, (width, height))
+        try:
+            for _, jpeg in frames:
+                image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if image.shape[:2] != (height, width):
+                    image = cv2.resize(image, (width, height))
+                writer.write(image)
+        finally:
+            writer.release()
+        return path
@@ -0,0 +1,96 @@
+"""
+Region-of-interest pose inference.
+
+Once people are tracked, the pose model only needs to look at the part of
+the frame around them. The RoiPlanner proposes a padded crop around the
+union of the tracked boxes; the crop is run at its own size (rounded to the
+model stride, never above the model's native size), so a person filling a
+third of the frame costs roughly a third of a full-frame pass. Results are
+shifted back to frame coordinates with to_frame(), so the tracker, the
+posture ratio (which divides by the full frame height) and the drawing code
+never see the crop.
+
+A full-frame pass still runs every FULL_FRAME_INTERVAL seconds to find
+people entering the room, and immediately when a crop finds fewer people
+than were tracked.
+"""
+
+import os
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+ROI_ENABLED = os.environ.get("POSE_ROI", "0").lower() in ("1", "true", "yes")
+ROI_PAD = 0.3  # crop padding on each side, as a share of the tracked box size
+ROI_MAX_FRACTION = 0.5  # crops covering more of the frame than this run full frame instead
+FULL_FRAME_INTERVAL = float(os.environ.get("POSE_ROI_FULL_INTERVAL", "1.0"))  # seconds between full-frame passes
+MODEL_STRIDE = 32
+MIN_IMGSZ = 160
+MAX_IMGSZ = 640  # the pose model's native input size
+
+
+def crop_imgsz(crop):
+    """Inference size for a (x0, y0, x1, y1) crop: its long side rounded up to the model stride."""
+    long_side = max(crop[2] - crop[0], crop[3] - crop[1])
+    return int(min(max(-(-long_side // MODEL_STRIDE) * MODEL_STRIDE, MIN_IMGSZ), MAX_IMGSZ))
+
+
+def to_frame(result, frame, x0, y0):
+    """Copy of a pose Results on a crop, with boxes and keypoints in frame coordinates."""
+    boxes = result.boxes.data.clone()
+    boxes[:, :4] += torch.tensor([x0, y0, x0, y0], dtype=boxes.dtype, device=boxes.device)
+    keypoints = result.keypoints.data.clone()
+    keypoints[..., :2] += torch.tensor([x0, y0], dtype=keypoints.dtype, device=keypoints.device)
+    return Results(frame, path=result.path, names=result.names, boxes=boxes, keypoints=keypoints)
+
+
+class RoiPlanner:
+    """Choose between a full-frame pass and a crop around the tracked people."""
+
+    def __init__(self, pad=ROI_PAD, max_fraction=ROI_MAX_FRACTION, full_frame_interval=FULL_FRAME_INTERVAL):
+        self.pad = pad
+        self.max_fraction = max_fraction
+        self.full_frame_interval = full_frame_interval
+        self.full_passes = 0
+        self.roi_passes = 0
+        self._last_full = None
+        self._expected = 0
+        self._force_full = True
+
+    def plan(self, frame_shape, boxes, now):
+        """Return the (x0, y0, x1, y1) crop to run pose on, or None for a full-frame pass.
+
+        boxes are the (N, 4) xyxy boxes of the people currently tracked.
+        """
+        height, width = frame_shape[:2]
+        crop = None
+        if len(boxes) and not self._force_full and now - self._last_full < self.full_frame_interval:
+            boxes = np.asarray(boxes, dtype=np.float32)
+            top_left = boxes[:, :2].min(0)
+            bottom_right = boxes[:, 2:].max(0)
+            pad = (bottom_right - top_left) * self.pad
+            x0, y0 = np.maximum(top_left - pad, 0).astype(int)
+            x1, y1 = np.minimum(bottom_right + pad, (width, height)).astype(int)
+            if x1 > x0 and y1 > y0 and (x1 - x0) * (y1 - y0) <= self.max_fraction * width * height:
+                crop = (int(x0), int(y0), int(x1), int(y1))
+
+        if crop is None:
+            self.full_passes += 1
+            self._last_full = now
+            self._force_full = False
+        else:
+            self.roi_passes += 1
+            self._expected = len(boxes)
+        return crop
+
+    def found(self, count):
+        """Report how many people the last crop found; a lost person forces a full-frame pass."""
+        if count < self._expected:
+            self._force_full = True
+
+    def stats(self):
+        return {
+            'pose_full_passes': self.full_passes,
+            'pose_roi_passes': self.roi_passes
+        }
@@ -9,6 +9,10 @@ import numpy as np
 import os
 import warnings
 
+from detection import furniture_under
+from furniture import FurnitureMap
+from posture import POSTURE_NAMES, UNKNOWN, classify_postures
+
 warnings.filterwarnings('ignore')
 
 # Load models
@@ -62,36 +66,20 @@ while True:
                 cv2.putText(pose_frame, f"{class_name} ({conf:.2f})", (x1, y1-10),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
     
-    # Cek pose
-    if len(pose_results[0].keypoints) > 0:
-        person = pose_results[0].keypoints.xy[0]
-        y_points = person[:, 1]
-        
-        head_y = y_points[0]
-        foot_y = y_points[-1]
-        frame_height = frame.shape[0]
-        ratio = (foot_y - head_y) / frame_height
-        
-        if ratio > 0.45:
-            pose_text = "Berdiri"
-        elif 0.25 <= ratio <= 0.45:
-            pose_text = "Duduk"
-        else:
+    # Cek pose (semua orang sekaligus, pakai orang pertama yang kepala & kakinya terlihat)
+    keypoints = pose_results[0].keypoints.data.cpu().numpy()
+    codes, _ = classify_postures(keypoints, frame.shape)
+    known = np.flatnonzero(codes != UNKNOWN)
+
+    if len(known) > 0:
+        person = keypoints[known[0]]
+        pose_text = POSTURE_NAMES[int(codes[known[0]])]
+        if pose_text == "Jatuh":
             pose_text = "Jatuh/Tidur"
         
-        # Cek jika ada furniture di bawah orang
-        person_center_x = np.mean(person[:, 0])
-        person_center_y = np.mean(person[:, 1])
-        
-        furniture_detected = False
-        for idx, box in enumerate(seg_results[0].boxes):
-            class_id = int(box.cls[0])
-            if class_id in BED_LIKE_CLASSES:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                if x1 <= person_center_x <= x2 and y1 <= person_center_y <= y2:
-                    furniture_detected = True
-                    furniture_name = BED_LIKE_CLASSES[class_id]
-                    break
+        # Cek jika ada furniture di bawah orang (mask furniture vs badan orang)
+        furniture_name = furniture_under(person[None], FurnitureMap.from_results(seg_results[0]))[0]
+        furniture_detected = furniture_name is not None
         
         # Display pose
         cv2.putText(pose_frame, f"Pose: {pose_text}", (20, 40),
@@ -0,0 +1,68 @@
+"""
+Encode-once JPEG cache for the MJPEG stream and snapshots.
+
+Every annotated frame is wrapped in an EncodedFrame, which encodes it lazily
+and at most once per quality profile, no matter how many viewers or
+snapshot requests share that profile. Viewers always take the newest frame,
+so a slow tablet skips frames instead of building up a backlog.
+
+The wire formats (MJPEG parts, Server-Sent Events) live here too, so the
+Flask app and the ASGI app (asgi_app.py) send exactly the same bytes.
+"""
+
+import json
+import threading
+import time
+
+import cv2
+
+# name: (scale, JPEG quality)
+QUALITY_PROFILES = {
+    'full': (1.0, 80),
+    'half': (0.5, 70),
+    'thumb': (0.25, 60)
+}
+DEFAULT_PROFILE = 'full'
+
+
+def mjpeg_part(jpeg):
+    """One part of a multipart/x-mixed-replace; boundary=frame stream."""
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+
+
+def sse_message(event, data, retry=None):
+    """One Server-Sent Event with a JSON payload."""
+    return (f"retry: {retry}\n" if retry else "") + f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EncodedFrame:
+    """One annotated frame and its JPEG bytes per quality profile."""
+
+    def __init__(self, image, processed, encode_seconds=None):
+        self.image = image
+        self.processed = processed  # CameraPipeline.frames_processed when this frame was rendered
+        self._encode_seconds = encode_seconds  # {profile: histogram child} or None
+        self._jpegs = {}
+        self._lock = threading.Lock()
+
+    def jpeg(self, profile=DEFAULT_PROFILE):
+        """JPEG bytes for profile, encoding on first use; None if encoding fails."""
+        with self._lock:
+            if profile not in self._jpegs:
+                self._jpegs[profile] = self._encode(profile)
+            return self._jpegs[profile]
+
+    def cached(self, profile=DEFAULT_PROFILE):
+        """JPEG bytes for profile if already encoded, else None (never encodes)."""
+        return self._jpegs.get(profile)
+
+    def _encode(self, profile):
+        scale, quality = QUALITY_PROFILES[profile]
+        started = time.perf_counter()
+        image = self.image
+        if scale != 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if self._encode_seconds is not None:
+            self._encode_seconds[profile].observe(time.perf_counter() - started)
+        return buffer.tobytes() if ret else None
@@ -0,0 +1,112 @@
+"""AlertDispatcher incidents against the local stand-in webhook of `python alerts.py --demo`."""
+
+import time
+
+import pytest
+
+from alerts import AlertDispatcher, SoundSink, WebhookSink, stand_in_webhook
+
+
+@pytest.fixture
+def webhook():
+    server, url, received = stand_in_webhook()
+    yield url, received
+    server.shutdown()
+
+
+class Speaker:
+    """Stands in for pygame.mixer.music."""
+
+    playing = False
+
+    def play(self, loops=0):
+        self.playing = True
+
+    def stop(self):
+        self.playing = False
+
+
+@pytest.fixture
+def sound():
+    return SoundSink(music=Speaker())
+
+
+def delivered(dispatcher, received):
+    dispatcher.close()
+    return [(alert['event'], alert['track']) for alert in received]
+
+
+def test_fall_and_recovery(webhook):
+    url, received = webhook
+    dispatcher = AlertDispatcher([WebhookSink(url)], backoff=0.01)
+    now = time.time()
+    assert dispatcher.send('cam', 'fall_start', now, 1)
+    assert not dispatcher.send('cam', 'fall_start', now + 1, 2)  # re-found as track 2
+    assert not dispatcher.send('cam', 'fall_end', now + 2, 1)  # track 2 still down
+    assert dispatcher.send('cam', 'fall_end', now + 3, 2)
+    assert delivered(dispatcher, received) == [('fall_start', 1), ('fall_end', 2)]
+
+
+def test_new_incident_takes_over_the_fallen(webhook, sound):
+    url, received = webhook
+    dispatcher = AlertDispatcher([WebhookSink(url), sound], backoff=0.01, dedupe=120)
+    now = time.time()
+    assert dispatcher.send('cam', 'fall_start', now, 1)
+    assert dispatcher.send('cam', 'fall_start', now + 600, 2)  # second patient, after the dedupe window
+    assert not dispatcher.send('cam', 'fall_end', now + 605, 2)  # patient 1 is still down
+    assert dispatcher.open_incidents()['cam']['tracks'] == [1]
+    assert delivered(dispatcher, received) == [('fall_start', 1), ('fall_start', 2)]
+    assert received[1]['replaces'] == received[0]['incident']
+    assert sound._music.playing
+
+
+def test_track_lost_keeps_the_incident_open(webhook, sound):
+    url, received = webhook
+    dispatcher = AlertDispatcher([WebhookSink(url), sound], backoff=0.01)
+    now = time.time()
+    assert dispatcher.send('cam', 'fall_start', now, 1)
+    assert dispatcher.send('cam', 'track_lost', now + 10, 1)
+    assert not dispatcher.send('cam', 'track_lost', now + 11, 1)
+    assert not dispatcher.send('cam', 'fall_start', now + 20, 2)  # re-found: same incident
+    incident = dispatcher.open_incidents()['cam']
+    assert (incident['tracks'], incident['lost']) == ([2], [1])
+    assert not dispatcher.send('cam', 'fall_end', now + 30, 2)  # nobody saw patient 1 get up
+    assert delivered(dispatcher, received) == [('fall_start', 1), ('track_lost', 1)]
+    assert sound._music.playing
+
+
+def test_acknowledge_closes_the_incident(webhook, sound):
+    url, received = webhook
+    dispatcher = AlertDispatcher([WebhookSink(url), sound], backoff=0.01)
+    now = time.time()
+    dispatcher.send('cam', 'fall_start', now, 1)
+    dispatcher.send('cam', 'track_lost', now + 10, 1)
+    assert dispatcher.acknowledge('cam', now + 60)
+    assert not dispatcher.acknowledge('cam', now + 61)
+    assert dispatcher.open_incidents() == {}
+    assert dispatcher.send('cam', 'fall_start', now + 70, 2)  # a new fall alerts again
+    assert delivered(dispatcher, received) == [('fall_start', 1), ('track_lost', 1), ('acknowledged', None),
+                                               ('fall_start', 2)]
+    assert sound._music.playing  # for the new fall
+
+
+def test_acknowledge_stops_the_sound(sound):
+    dispatcher = AlertDispatcher([sound])
+    dispatcher.send('cam', 'fall_start', track=1)
+    dispatcher.send('cam', 'track_lost', track=1)
+    dispatcher.acknowledge('cam')
+    dispatcher.close()
+    assert not sound._music.playing
+
+
+def test_track_lost_waits_for_the_others(webhook, sound):
+    url, received = webhook
+    dispatcher = AlertDispatcher([WebhookSink(url), sound], backoff=0.01)
+    now = time.time()
+    dispatcher.send('cam', 'fall_start', now, 1)
+    dispatcher.send('cam', 'fall_start', now + 1, 2)
+    assert dispatcher.send('cam', 'track_lost', now + 10, 1)
+    assert not dispatcher.send('cam', 'track_lost', now + 11, 3)  # never part of the incident
+    assert not dispatcher.send('cam', 'fall_end', now + 12, 2)  # patient 1 was lost, not seen getting up
+    assert delivered(dispatcher, received) == [('fall_start', 1), ('track_lost', 1)]
+    assert sound._music.playing
@@ -0,0 +1,52 @@
+"""furniture_under with segmentation masks that the person on the furniture occludes."""
+
+import numpy as np
+
+from detection import furniture_under
+from furniture import MASK_SCALE, FurnitureMap
+
+FRAME_SHAPE = (480, 640)
+BED_BOX = (100, 200, 500, 400)
+
+
+def lying(y, x1=150, x2=450):
+    """Synthetic keypoints of a person lying horizontally at height y from x1 (head) to x2 (feet)."""
+    keypoints = np.zeros((17, 3), dtype=np.float32)
+    keypoints[:, 0] = np.linspace(x1, x2, 17)
+    keypoints[:, 1] = y + np.tile([-8, 8], 9)[:17]
+    keypoints[:, 2] = 0.9
+    return keypoints
+
+
+def bed_map(cut=None):
+    """A bed as the seg model masks it, with the cells of the cut (x1, y1, x2, y2) box not visible."""
+    h, w = (-(-n // MASK_SCALE) for n in FRAME_SHAPE)
+    mask = np.zeros((1, h, w), dtype=bool)
+    x1, y1, x2, y2 = (v // MASK_SCALE for v in BED_BOX)
+    mask[0, y1:y2, x1:x2] = True
+    if cut is not None:
+        x1, y1, x2, y2 = (v // MASK_SCALE for v in cut)
+        mask[0, y1:y2, x1:x2] = False
+    return FurnitureMap(np.array([59]), np.array([0.9], dtype=np.float32),
+                        np.array([BED_BOX], dtype=np.float32), mask)
+
+
+def test_unoccluded_bed():
+    assert furniture_under(lying(300)[None], bed_map()) == ['bed']
+
+
+def test_bed_mask_with_the_body_cut_out():
+    # segmented while the patient lay on it: the body is a hole in the mask
+    person = lying(300)
+    assert furniture_under(person[None], bed_map(cut=(140, 280, 460, 320))) == ['bed']
+
+
+def test_bed_mask_bitten_at_the_edge():
+    # patient lying along the head end of the bed, covering its top edge
+    person = lying(210)
+    assert furniture_under(person[None], bed_map(cut=(140, 190, 460, 230))) == ['bed']
+
+
+def test_floor_next_to_the_bed():
+    person = lying(450)
+    assert furniture_under(person[None], bed_map(cut=(140, 280, 460, 320))) == [None]
@@ -0,0 +1,112 @@
+"""classify_postures on fixed keypoint arrays (frame height 100, so y is the ratio in percent)."""
+
+import numpy as np
+import pytest
+
+from posture import BERDIRI, DUDUK, JATUH, UNKNOWN, classify_postures
+
+FRAME_SHAPE = (100, 200, 3)
+
+# a synthetic standing person in the pose model's layout: x, y, confidence in COCO order
+STANDING = np.array([
+    [100, 10, 0.95], [102, 9, 0.93], [98, 9, 0.92], [104, 10, 0.81], [96, 10, 0.84],  # nose, eyes, ears
+    [110, 22, 0.97], [90, 22, 0.96], [114, 34, 0.9], [86, 34, 0.91], [114, 44, 0.88], [86, 44, 0.87],
+    [106, 50, 0.95], [94, 50, 0.94], [106, 70, 0.92], [94, 70, 0.93],  # shoulders to knees
+    [106, 88, 0.9], [94, 89, 0.91],  # left ankle, right ankle
+], dtype=np.float32)
+
+
+def person(head_y, foot_y, conf=0.9):
+    """Keypoints with every face keypoint at head_y and both ankles at foot_y."""
+    keypoints = np.zeros((17, 3), dtype=np.float32)
+    keypoints[:, 0] = 100
+    keypoints[:, 1] = np.linspace(head_y, foot_y, 17)
+    keypoints[:5, 1] = head_y
+    keypoints[15:, 1] = foot_y
+    keypoints[:, 2] = conf
+    return keypoints
+
+
+def classify(*persons, **kwargs):
+    return classify_postures(np.stack(persons), FRAME_SHAPE, **kwargs)
+
+
+def test_standing_person():
+    codes, confidences = classify_postures(STANDING[None], FRAME_SHAPE)
+    # nose y=10, right ankle y=89: ratio 0.79
+    assert codes.tolist() == [BERDIRI]
+    assert confidences[0] == pytest.approx(0.91)
+
+
+@pytest.mark.parametrize("foot_y, expected", [
+    (56, BERDIRI),  # ratio 0.46
+    (55, DUDUK),  # exactly 0.45 is not above the standing threshold
+    (54, DUDUK),
+    (35, DUDUK),  # exactly 0.25 is still sitting
+    (34, JATUH),  # ratio 0.24
+    (10, JATUH),  # head and feet at the same height
+])
+def test_threshold_boundaries(foot_y, expected):
+    codes, _ = classify(person(10, foot_y))
+    assert codes.tolist() == [expected]
+
+
+def test_confidence_halved_on_a_threshold():
+    _, confidences = classify(person(10, 55), person(10, 80))
+    assert confidences[0] == pytest.approx(0.45)
+    assert confidences[1] == pytest.approx(0.9)
+
+
+def test_head_falls_back_from_nose_to_eyes():
+    keypoints = person(10, 80)
+    keypoints[0] = [100, 70, 0.1]  # low-confidence nose far down the body
+    keypoints[1, 1] = 12
+    codes, confidences = classify(keypoints)
+    # left eye y=12: ratio 0.68, not the nose's 0.1
+    assert codes.tolist() == [BERDIRI]
+    assert confidences[0] == pytest.approx(0.9)
+
+
+def test_foot_falls_back_from_right_to_left_ankle():
+    keypoints = person(10, 80)
+    keypoints[16] = [100, 20, 0.2]  # right ankle missed
+    keypoints[15, 1] = 45  # left ankle: ratio 0.35
+    codes, _ = classify(keypoints)
+    assert codes.tolist() == [DUDUK]
+
+
+@pytest.mark.parametrize("missing", [slice(0, 5), slice(15, 17)], ids=["head", "feet"])
+def test_unknown_without_head_or_feet(missing):
+    keypoints = person(10, 80)
+    keypoints[missing, 2] = 0.3
+    codes, confidences = classify(keypoints, person(10, 80))
+    assert codes.tolist() == [UNKNOWN, BERDIRI]
+    assert confidences[0] == 0.0
+
+
+def test_min_conf_decides_what_is_missing():
+    keypoints = person(10, 80, conf=0.4)
+    assert classify(keypoints)[0].tolist() == [UNKNOWN]
+    assert classify(keypoints, min_conf=0.3)[0].tolist() == [BERDIRI]
+
+
+def test_two_column_keypoints_treat_origin_as_missing():
+    standing = person(10, 80)[:, :2]
+    no_nose = person(10, 30)[:, :2]
+    no_nose[0] = 0  # nose not found: falls back to the eyes at y=10
+    no_feet = person(10, 80)[:, :2]
+    no_feet[15:] = 0
+    codes, confidences = classify_postures(np.stack([standing, no_nose, no_feet]), FRAME_SHAPE)
+    assert codes.tolist() == [BERDIRI, JATUH, UNKNOWN]
+    assert confidences[0] == pytest.approx(1.0)
+
+
+def test_single_person_array():
+    codes, _ = classify_postures(person(10, 30), FRAME_SHAPE)
+    assert codes.tolist() == [JATUH]
+
+
+def test_no_persons():
+    codes, confidences = classify_postures(np.zeros((0, 17, 3), dtype=np.float32), FRAME_SHAPE)
+    assert codes.shape == (0,) and codes.dtype == np.int8
+    assert confidences.shape == (0,) and confidences.dtype == np.float32
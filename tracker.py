@@ -0,0 +1,122 @@
+"""
+Multi-person tracking with a fall state machine per track.
+
+Detections are associated to existing tracks with a vectorized similarity
+matrix (box IoU plus normalised keypoint distance), so five people cost about
+the same as one. Every track owns its own FallState, which means a visitor
+standing next to a fallen patient no longer hides the fall and detection
+order changes between frames no longer flip the state.
+"""
+
+import numpy as np
+
+from detection import FallState
+
+MIN_SIMILARITY = 0.3  # below this a detection starts a new track
+MAX_AGE = 2.0  # seconds a track survives without detections
+FALLEN_MAX_AGE = 10.0  # fallen people are often occluded, keep their alert alive longer
+
+
+def box_iou(a, b):
+    """IoU matrix between (T, 4) and (N, 4) xyxy boxes."""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def keypoint_similarity(ka, kb, boxes_a):
+    """Similarity in [0, 1] between (T, 17, 2) and (N, 17, 2) keypoint sets.
+
+    Keypoints the model did not find are reported as (0, 0) and ignored.
+    Distances are normalised by the size of the track's box.
+    """
+    valid = (ka > 0).all(-1)[:, None, :] & (kb > 0).all(-1)[None, :, :]
+    dist = np.linalg.norm(ka[:, None] - kb[None], axis=-1)
+    n_valid = valid.sum(-1)
+    mean_dist = (dist * valid).sum(-1) / np.maximum(n_valid, 1)
+    scale = np.sqrt(np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)) + 1e-9
+    return np.where(n_valid > 0, np.exp(-mean_dist / (0.25 * scale[:, None])), 0.0)
+
+
+class Track:
+    """One tracked person and their posture/fall state."""
+
+    def __init__(self, track_id, box, keypoints, now):
+        self.id = track_id
+        self.box = box
+        self.keypoints = keypoints
+        self.state = FallState(now=now)
+        self.first_seen = now
+        self.last_seen = now
+
+    def as_dict(self):
+        status = self.state.as_dict()
+        status['id'] = self.id
+        return status
+
+
+class PersonTracker:
+    """Associate per-frame detections to stable track IDs."""
+
+    def __init__(self, min_similarity=MIN_SIMILARITY, max_age=MAX_AGE, fallen_max_age=FALLEN_MAX_AGE):
+        self.min_similarity = min_similarity
+        self.max_age = max_age
+        self.fallen_max_age = fallen_max_age
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, boxes, keypoints, now):
+        """Match (N, 4) boxes and (N, 17, 2) keypoints to tracks.
+
+        Returns (matches, lost): matches is [(track, detection_index), ...]
+        for every detection, new tracks being created for unmatched
+        detections; lost are the stale tracks dropped by this update. A lost
+        track with state.fall_detected disappeared while still down (no
+        fall_end was seen), which callers must report themselves.
+        """
+        matches = []
+        unmatched = set(range(len(boxes)))
+
+        if self.tracks and len(boxes):
+            track_boxes = np.stack([t.box for t in self.tracks])
+            track_kps = np.stack([t.keypoints for t in self.tracks])
+            similarity = 0.5 * (box_iou(track_boxes, boxes) + keypoint_similarity(track_kps, keypoints, track_boxes))
+
+            used_tracks = set()
+            for flat in np.argsort(-similarity, axis=None):
+                t, d = divmod(int(flat), len(boxes))
+                if similarity[t, d] < self.min_similarity:
+                    break
+                if t in used_tracks or d not in unmatched:
+                    continue
+                used_tracks.add(t)
+                unmatched.discard(d)
+                matches.append((self.tracks[t], d))
+
+        for track, d in matches:
+            track.box = boxes[d]
+            track.keypoints = keypoints[d]
+            track.last_seen = now
+
+        for d in sorted(unmatched):
+            track = Track(self._next_id, boxes[d], keypoints[d], now)
+            self._next_id += 1
+            self.tracks.append(track)
+            matches.append((track, d))
+
+        kept, lost = [], []
+        for t in self.tracks:
+            alive = now - t.last_seen <= (self.fallen_max_age if t.state.fall_detected else self.max_age)
+            (kept if alive else lost).append(t)
+        self.tracks = kept
+        return matches, lost
+
+    def primary(self):
+        """The track whose state matters most: fallen first, then lying, then sleeping."""
+        if not self.tracks:
+            return None
+        return max(self.tracks, key=lambda t: (t.state.fall_detected, t.state.current_posture == "Jatuh",
+                                               t.state.sleep_detected, -t.id))
@@ -1,44 +1,208 @@
-from ultralytics import YOLO
+#!/usr/bin/env python3
+"""
+Training of the sleep-posture detection model (Lateral, Objects, Prone, Supine).
+
+Made for our training box, which has no GPU:
+
+- the device is detected (CUDA, Apple MPS, otherwise CPU) instead of
+  hardcoding GPU 0; TRAIN_DEVICE or --device overrides it
+- images are decoded and resized once and cached (--cache ram, or disk as
+  .npy next to the images when RAM is short) instead of re-decoding every
+  image every epoch
+- data loading runs in --workers processes (TRAIN_WORKERS); on CPU the
+  default leaves most cores to the training itself
+- an interrupted run (Ctrl+C, crash, power cut) resumes from its last.pt
+  when the script is started again; --fresh starts a new run instead
+- the time of every epoch (train and validation) is printed and saved to
+  epoch_times.json in the run folder
+- at the end the best weights are exported to the formats app.py loads
+  with MODEL_BACKEND (see models.py), so the model can be used directly
+
+    python train_model.py                                   # datasets/data.yaml
+    python train_model.py --data path/to/data.yaml --epochs 100 --workers 2
+    python train_model.py --cache disk --export onnx
+"""
+
+import argparse
+import glob
+import json
 import os
+import time
+
+import torch
+from ultralytics import YOLO
+
+from models import BACKENDS, resolve_model
+
+TRAIN_DATA = os.environ.get("TRAIN_DATA", os.path.join("datasets", "data.yaml"))
+TRAIN_DEVICE = os.environ.get("TRAIN_DEVICE", "")  # empty = detect
+TRAIN_WORKERS = os.environ.get("TRAIN_WORKERS", "")  # empty = depends on the device
+PROJECT = os.path.abspath(os.path.join("runs", "detect"))  # ultralytics puts relative paths under its own runs_dir
+NAME = "sleep_pose_model"
+EXPORT_FORMATS = "onnx,openvino"
+
+
+def detect_device():
+    """"0" (first GPU), "mps" or "cpu", whichever is available."""
+    if torch.cuda.is_available():
+        return "0"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def default_workers(device):
+    """Data loader processes: 8 with a GPU; on CPU a quarter of the cores, the rest train."""
+    if device != "cpu":
+        return 8
+    return min((os.cpu_count() or 1) // 4, 8)
+
+
+def find_resumable(project=PROJECT, name=NAME):
+    """last.pt of the newest run that was interrupted, or None.
+
+    ultralytics marks a finished checkpoint with epoch -1, so only runs
+    that stopped half-way are resumed.
+    """
+    candidates = glob.glob(os.path.join(project, name + "*", "weights", "last.pt"))
+    for last in sorted(candidates, key=os.path.getmtime, reverse=True):
+        try:
+            checkpoint = torch.load(last, map_location="cpu", weights_only=False)
+        except Exception as e:
+            print(f"[!] Checkpoint {last} tidak bisa dibaca: {e}")
+            continue
+        if checkpoint.get("epoch", -1) >= 0:
+            return last
+        return None  # the newest run finished: start a new one
+    return None
+
+
+class EpochTimer:
+    """Measures train and validation time of every epoch through ultralytics callbacks."""
+
+    def __init__(self):
+        self.epochs = []
+        self._started = None
+        self._trained = None
+
+    def attach(self, model):
+        model.add_callback("on_train_epoch_start", self._on_start)
+        model.add_callback("on_train_epoch_end", self._on_train_end)
+        model.add_callback("on_fit_epoch_end", self._on_end)
+
+    def summary(self):
+        """Mean epoch time; without the first epoch, which also fills the cache."""
+        times = [e['seconds'] for e in self.epochs]
+        steady = times[1:] or times
+        return {
+            'epochs': len(times),
+            'first_epoch_seconds': round(times[0], 2) if times else None,
+            'mean_epoch_seconds': round(sum(steady) / len(steady), 2) if steady else None,
+            'total_seconds': round(sum(times), 2)
+        }
+
+    def _on_start(self, trainer):
+        self._started = time.perf_counter()
+
+    def _on_train_end(self, trainer):
+        self._trained = time.perf_counter()
+
+    def _on_end(self, trainer):
+        if self._started is None:
+            return
+        now = time.perf_counter()
+        trained = self._trained or now
+        epoch = {'epoch': trainer.epoch + 1, 'seconds': now - self._started,
+                 'train_seconds': trained - self._started, 'val_seconds': now - trained}
+        self.epochs.append(epoch)
+        print(f" Epoch {epoch['epoch']}/{trainer.epochs}: {epoch['seconds']:.1f} s "
+              f"(train {epoch['train_seconds']:.1f} s, validasi {epoch['val_seconds']:.1f} s)")
+        self._started = None
+
+
+def export_best(best, formats, imgsz):
+    """Export best.pt to each backend in formats (same export cache as the app); returns {format: path}."""
+    exported = {}
+    for backend in formats:
+        path = resolve_model(best, backend, task="detect", imgsz=imgsz)
+        if path != best:
+            exported[backend] = path
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training model deteksi pose tidur (CPU/GPU, bisa dilanjutkan).")
+    parser.add_argument("--data", default=TRAIN_DATA, help="data.yaml dataset")
+    parser.add_argument("--model", default="yolov8n.pt", help="bobot awal atau .yaml arsitektur")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--patience", type=int, default=20, help="early stopping")
+    parser.add_argument("--device", default=TRAIN_DEVICE, help="0, 0,1, mps atau cpu (default deteksi otomatis)")
+    parser.add_argument("--workers", type=int, default=int(TRAIN_WORKERS) if TRAIN_WORKERS else None,
+                        help="proses data loader (default 8 dengan GPU, 1/4 core di CPU)")
+    parser.add_argument("--cache", default="ram", choices=("ram", "disk", "none"),
+                        help="cache gambar yang sudah di-decode dan di-resize")
+    parser.add_argument("--fresh", action="store_true", help="mulai run baru walau ada run yang terputus")
+    parser.add_argument("--export", default=EXPORT_FORMATS,
+                        help=f"format export bobot terbaik, dipisah koma ({', '.join(BACKENDS[1:])}) atau none")
+    args = parser.parse_args()
+
+    device = args.device or detect_device()
+    workers = default_workers(device) if args.workers is None else args.workers
+    cache = False if args.cache == "none" else args.cache
+    settings = dict(device=device, workers=workers, cache=cache)
+
+    print("🎯 Memulai training model deteksi pose tidur...")
+    print("=" * 50)
+    print(f"Device: {device}, data loader workers: {workers}, cache gambar: {args.cache}")
+
+    resume_from = None if args.fresh else find_resumable()
+    if resume_from is not None:
+        print(f"Melanjutkan training yang terputus: {resume_from}")
+        model = YOLO(resume_from)
+        settings['resume'] = True
+    else:
+        if not os.path.exists(args.data):
+            print(f"❌ File dataset tidak ditemukan: {args.data} (atur dengan --data atau TRAIN_DATA)")
+            raise SystemExit(1)
+        print(f"Dataset ditemukan: {args.data}")
+        print("Kelas yang akan dideteksi:")
+        print("  1. Lateral (tidur miring)")
+        print("  2. Objects (ada benda)")
+        print("  3. Prone (tidur tengkurap)")
+        print("  4. Supine (tidur terlentang)")
+        model = YOLO(args.model)
+        settings.update(data=args.data, epochs=args.epochs, imgsz=args.imgsz, batch=args.batch,
+                        patience=args.patience, save=True, project=PROJECT, name=NAME)
+
+    timer = EpochTimer()
+    timer.attach(model)
+    print("\n📚 Memulai training...\n")
+    model.train(**settings)
+
+    trainer = model.trainer
+    summary = timer.summary()
+    summary.update(device=device, workers=workers, cache=args.cache)
+    with open(os.path.join(trainer.save_dir, "epoch_times.json"), 'w') as f:
+        json.dump({'summary': summary, 'epochs': timer.epochs}, f, indent=2)
+
+    best = str(trainer.best)
+    print("\n" + "=" * 50)
+    print("Training selesai!")
+    if summary['epochs']:
+        print(f"Waktu per epoch: {summary['mean_epoch_seconds']} s rata-rata "
+              f"(epoch pertama {summary['first_epoch_seconds']} s, total {summary['total_seconds']} s)")
+    print(f"Model tersimpan di: {best}")
+
+    formats = [f.strip() for f in args.export.split(',') if f.strip() and f.strip() != "none"]
+    exported = export_best(best, formats, trainer.args.imgsz) if os.path.exists(best) else {}
+    for backend, path in exported.items():
+        print(f"Export {backend}: {path} (dipakai dengan MODEL_BACKEND={backend})")
+
+    print("\nUntuk menggunakan model yang sudah dilatih, update app.py dengan:")
+    print(f'    model = YOLO("{best}")')
+
 
-print("🎯 Memulai training model deteksi pose tidur...")
-print("=" * 50)
-
-# Path dataset
-dataset_path = os.path.join("Datasets", "data.yaml")
-
-if not os.path.exists(dataset_path):
-    print(f"❌ File dataset tidak ditemukan: {dataset_path}")
-    exit(1)
-
-print(f"Dataset ditemukan: {dataset_path}")
-
-# Load model YOLOv8 (gunakan model detection untuk klasifikasi pose)
-model = YOLO("yolov8n.pt")
-
-print("\n📚 Memulai training dengan dataset pose tidur...")
-print("Kelas yang akan dideteksi:")
-print("  1. Lateral (tidur miring)")
-print("  2. Objects (ada benda)")
-print("  3. Prone (tidur tengkurap)")
-print("  4. Supine (tidur terlentang)")
-print("\n")
-
-# Training model
-results = model.train(
-    data=dataset_path,
-    epochs=50,              # Jumlah epoch (iterasi training)
-    imgsz=640,              # Ukuran gambar
-    batch=16,               # Batch size
-    patience=20,            # Early stopping
-    device=0,               # GPU device (0 untuk GPU pertama, atau 'cpu' untuk CPU)
-    save=True,              # Simpan model
-    project="runs/detect",  # Folder untuk menyimpan hasil
-    name="sleep_pose_model" # Nama proyek
-)
-
-print("\n" + "=" * 50)
-print("Training selesai!")
-print("Model tersimpan di: runs/detect/sleep_pose_model/weights/best.pt")
-print("\nUntuk menggunakan model yang sudah dilatih, update app.py dengan:")
-print('    model = YOLO("runs/detect/sleep_pose_model/weights/best.pt")')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+Out-of-process pose inference.
+
+In-process, the pose model, its Python post-processing, the capture threads
+and the web server all share one interpreter and one GIL, so the endpoints
+stutter under load. With INFERENCE_WORKERS=N the pose model runs in N worker
+processes instead; the Ward calls the PoseWorkerPool exactly like a model.
+
+Frames travel through a multiprocessing.shared_memory ring of 2*N slots:
+the parent copies a frame into a free slot once, and the worker wraps that
+slot in an ndarray without copying. Only the slot number goes to the
+worker, and only compact box/keypoint arrays come back, which the parent
+wraps in an ultralytics Results so the rest of the pipeline (tracker,
+drawing) cannot tell the difference. A frame larger than WORKER_MAX_FRAME
+is downscaled to fit its slot and the results scaled back. Frames of different cameras are
+inferred in parallel, one frame per job.
+
+Every worker has its own pipe to the parent and the parent hands out the
+jobs, so a worker that dies can never leave a shared queue lock held.
+Workers are forked by a small supervisor process that is started before any
+model runs in the parent and never runs one itself, so forking from it is
+safe. It restarts a worker that crashed (after RESTART_DELAY seconds); a
+worker stuck on a job for JOB_TIMEOUT seconds is killed and restarted the
+same way. The frame it was on is reported lost and the Ward reuses that
+camera's previous result, just as when the motion gate skips a frame. Fork
+is needed, so on Windows the pool is not available and the app infers
+in-process.
+"""
+
+import atexit
+import collections
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import TimeoutError as FutureTimeoutError  # not the builtin TimeoutError before 3.11
+from multiprocessing import connection, shared_memory
+
+import cv2
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+import metrics
+from models import EXPORT_IMGSZ, resolve_model
+
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))  # 0 = infer in the app process
+WORKER_MAX_FRAME = os.environ.get("WORKER_MAX_FRAME", "1920x1080")  # largest frame a slot holds
+JOB_TIMEOUT = 10.0  # seconds before a job is given up on and its worker restarted
+RESTART_DELAY = 1.0  # seconds before a crashed worker is restarted
+READY_TIMEOUT = 300.0  # seconds to wait for the workers to load (includes ONNX/OpenVINO start-up)
+
+
+def workers_supported():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+class PoseWorkerPool:
+    """Pose model in worker processes, callable like the model itself.
+
+        pool = PoseWorkerPool(4).load("yolov8n-pose.pt")
+
+    pool(frames) returns one Results per frame, or None for a frame whose
+    worker crashed or timed out.
+    """
+
+    def __init__(self, workers=INFERENCE_WORKERS, max_frame=WORKER_MAX_FRAME, job_timeout=JOB_TIMEOUT):
+        """Fork the supervisor; the workers start once load() names the model.
+
+        Create the pool before the parent runs any model (and before other
+        threads start loading one), so the fork copies a clean process.
+        """
+        if not workers_supported():
+            raise RuntimeError("Inference workers butuh start method 'fork' (tidak tersedia di Windows)")
+        width, height = (int(v) for v in max_frame.lower().split('x'))
+        self.workers = workers
+        self.max_frame = max_frame
+        self.job_timeout = job_timeout
+        self.slot_bytes = width * height * 3
+        self.jobs_done = 0
+        self.jobs_lost = 0
+        self.restarts = 0
+        self.names = None
+        self._downscaled = set()  # frame sizes already reported as too large for a slot
+
+        ctx = multiprocessing.get_context('fork')
+        self._shm = shared_memory.SharedMemory(create=True, size=2 * workers * self.slot_bytes)
+        self._free = queue.Queue()
+        for slot in range(2 * workers):
+            self._free.put(slot)
+        pipes = [ctx.Pipe() for _ in range(workers)]
+        self._conns = [parent for parent, _ in pipes]
+        self._pids = [None] * workers  # None until the worker reported ready
+        self._busy = [None] * workers  # job id each worker is on
+        self._queued = collections.deque()  # job ids waiting for an idle worker
+        self._jobs = {}  # job id: (Future, slot, frame shape, imgsz)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()  # set once every worker has loaded the model
+        self._closed = False
+        self._stop = ctx.Event()
+        self._control, control = ctx.Pipe()  # parent <-> supervisor
+
+        self._supervisor = ctx.Process(target=_supervise, name="pose-supervisor",
+                                       args=(ctx, [child for _, child in pipes], self._shm, self.slot_bytes,
+                                             control, self._stop))
+        self._supervisor.start()
+        self._reader = threading.Thread(target=self._read_results, name="pose-results", daemon=True)
+        self._reader.start()
+        atexit.register(self.close)
+
+        metrics.WORKERS_ALIVE.labels().set_function(lambda: sum(pid is not None for pid in self._pids))
+        metrics.WORKER_RESTARTS.labels().set_function(lambda: self.restarts)
+        metrics.JOBS_LOST.labels().set_function(lambda: self.jobs_lost)
+
+    def load(self, weights, task="pose", backend=None, imgsz=EXPORT_IMGSZ, int8=None, timeout=READY_TIMEOUT):
+        """Export weights if needed (here, once) and start the workers on it; returns the ready pool."""
+        model_path = resolve_model(weights, backend, task, imgsz, int8)
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._control.send((model_path, task, threads))
+        if not self._ready.wait(timeout):
+            raise RuntimeError("Inference worker tidak siap")
+        return self
+
+    def __call__(self, source, imgsz=None, verbose=False):
+        frames = source if isinstance(source, list) else [source]
+        jobs = [self._submit(frame, imgsz) for frame in frames]
+        results = []
+        for frame, (job_id, future, scale) in zip(frames, jobs):
+            try:
+                arrays = future.result(timeout=self.job_timeout)
+            except FutureTimeoutError:
+                self._give_up(job_id)
+                arrays = None
+            results.append(None if arrays is None else self._to_results(frame, *arrays, scale))
+        return results
+
+    def stats(self):
+        return {
+            'inference_workers': self.workers,
+            'inference_workers_alive': sum(pid is not None for pid in self._pids),
+            'inference_jobs_done': self.jobs_done,
+            'inference_jobs_lost': self.jobs_lost,
+            'inference_worker_restarts': self.restarts
+        }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        self._supervisor.join(timeout=5)
+        if self._supervisor.is_alive():
+            self._supervisor.terminate()
+        self._shm.close()
+        self._shm.unlink()
+
+    def _submit(self, frame, imgsz):
+        """Copy frame into a free slot and queue it; returns (job id, Future, (x, y) scale back to frame)."""
+        frame, scale = self._fit(np.ascontiguousarray(frame, dtype=np.uint8))
+        slot = self._free.get()
+        np.ndarray(frame.shape, np.uint8, buffer=self._shm.buf, offset=slot * self.slot_bytes)[...] = frame
+
+        job_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            self._jobs[job_id] = (future, slot, frame.shape, imgsz)
+            self._queued.append(job_id)
+            self._dispatch()
+        return job_id, future, scale
+
+    def _fit(self, frame):
+        """frame, downscaled if it does not fit a slot, and the (x, y) factors back to its size.
+
+        The model letterboxes to imgsz (640) anyway, so a 4K camera only
+        loses pixels inference never sees; one such camera must not stop
+        the Ward.
+        """
+        if frame.nbytes <= self.slot_bytes:
+            return frame, None
+        height, width = frame.shape[:2]
+        factor = (self.slot_bytes / frame.nbytes) ** 0.5
+        size = (max(int(width * factor), 1), max(int(height * factor), 1))
+        if frame.shape[:2] not in self._downscaled:
+            self._downscaled.add(frame.shape[:2])
+            print(f"[!] Frame {width}x{height} lebih besar dari slot worker ({self.max_frame}), "
+                  f"diperkecil ke {size[0]}x{size[1]} untuk inferensi (naikkan WORKER_MAX_FRAME untuk resolusi penuh)")
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), (width / size[0], height / size[1])
+
+    def _dispatch(self):
+        # with self._lock held: hand queued jobs to idle workers
+        for index, conn in enumerate(self._conns):
+            if not self._queued:
+                return
+            if self._pids[index] is None or self._busy[index] is not None:
+                continue
+            job_id = self._queued.popleft()
+            _, slot, shape, imgsz = self._jobs[job_id]
+            self._busy[index] = job_id
+            conn.send((job_id, slot, shape, imgsz))
+
+    def _finish(self, job_id, arrays):
+        # with self._lock held: resolve a job and free its slot
+        entry = self._jobs.pop(job_id, None)
+        if entry is None:
+            return
+        future, slot = entry[0], entry[1]
+        self._free.put(slot)
+        if arrays is None:
+            self.jobs_lost += 1
+        try:
+            future.set_result(arrays)
+        except InvalidStateError:
+            pass
+
+    def _give_up(self, job_id):
+        with self._lock:
+            if job_id in self._queued:
+                self._queued.remove(job_id)
+            for index, busy in enumerate(self._busy):
+                if busy == job_id and self._pids[index] is not None:
+                    # stuck worker: kill it, the supervisor starts a fresh one
+                    print(f"[!] Inference worker {index} tidak merespon, dihentikan")
+                    os.kill(self._pids[index], signal.SIGKILL)
+            self._finish(job_id, None)
+
+    def _to_results(self, frame, boxes, keypoints, scale=None):
+        if scale is not None:
+            # inferred on a downscaled copy: back to the coordinates of frame
+            boxes[:, [0, 2]] *= scale[0]
+            boxes[:, [1, 3]] *= scale[1]
+            keypoints[..., 0] *= scale[0]
+            keypoints[..., 1] *= scale[1]
+        return Results(frame, path='', names=self.names, boxes=torch.from_numpy(boxes),
+                       keypoints=torch.from_numpy(keypoints))
+
+    def _read_results(self):
+        conns = self._conns + [self._control]
+        while not self._closed:
+            for conn in connection.wait(conns, timeout=1.0):
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                with self._lock:
+                    self._handle(message)
+                    self._dispatch()
+
+    def _handle(self, message):
+        kind, index = message[0], message[1]
+        if kind == 'ready':
+            self.names = message[3]
+            self._pids[index] = message[2]
+            self._busy[index] = None
+            if all(pid is not None for pid in self._pids):
+                self._ready.set()
+        elif kind == 'result':
+            _, _, job_id, boxes, keypoints = message
+            if self._busy[index] == job_id:
+                self._busy[index] = None
+            if job_id in self._jobs:
+                self.jobs_done += 1
+                self._finish(job_id, (boxes, keypoints))
+        elif kind == 'crashed':
+            self.restarts += 1
+            self._pids[index] = None
+            job_id, self._busy[index] = self._busy[index], None
+            print(f"[!] Inference worker {index} berhenti (exit {message[2]}), dijalankan ulang")
+            if job_id is not None:
+                self._finish(job_id, None)
+
+
+def _supervise(ctx, conns, shm, slot_bytes, control, stop):
+    """Keep one worker per pipe running until stop is set or the app exits."""
+    parent = os.getppid()
+    while not control.poll(1.0):
+        if stop.is_set() or os.getppid() != parent:
+            return
+    model_path, task, threads = control.recv()
+    args = (model_path, task, threads, shm, slot_bytes)
+    procs = [_start_worker(ctx, index, conn, args) for index, conn in enumerate(conns)]
+    while not stop.is_set() and os.getppid() == parent:
+        connection.wait([proc.sentinel for proc in procs], timeout=1.0)
+        for index, proc in enumerate(procs):
+            if proc.is_alive() or stop.is_set():
+                continue
+            control.send(('crashed', index, proc.exitcode))
+            time.sleep(RESTART_DELAY)
+            procs[index] = _start_worker(ctx, index, conns[index], args)
+    for proc in procs:
+        proc.terminate()
+        proc.join(timeout=2)
+
+
+def _start_worker(ctx, index, conn, args):
+    proc = ctx.Process(target=_work, name=f"pose-worker-{index}", args=(index, conn) + args, daemon=True)
+    proc.start()
+    return proc
+
+
+def _work(index, conn, model_path, task, threads, shm, slot_bytes):
+    from ultralytics import YOLO
+
+    torch.set_num_threads(threads)
+    model = YOLO(model_path, task=task)
+    # the first inference is slow (lazy init); do it before taking real frames
+    model(np.zeros((480, 640, 3), dtype=np.uint8), verbose=False)
+    conn.send(('ready', index, os.getpid(), model.names))
+    supervisor = os.getppid()
+    while os.getppid() == supervisor:
+        if not conn.poll(1.0):
+            continue
+        job_id, slot, shape, imgsz = conn.recv()
+        frame = np.ndarray(shape, np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+        kwargs = {'imgsz': imgsz} if imgsz else {}
+        result = model(frame, verbose=False, **kwargs)[0]
+        conn.send(('result', index, job_id, result.boxes.data.cpu().numpy(), result.keypoints.data.cpu().numpy()))